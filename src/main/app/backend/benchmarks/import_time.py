@@ -0,0 +1,82 @@
+"""
+Report how long each module takes to import when the backend starts.
+
+A fresh interpreter imports the target module with -X importtime and the slowest modules are printed,
+along with the total cost of each top-level package.
+
+Run from the backend directory:
+    python3 -m benchmarks.import_time
+    python3 -m benchmarks.import_time --module tools.llm --top 30
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def measure_imports(module: str) -> List[Tuple[str, int, int, int]]:
+    """
+    Import the module in a new interpreter and return (module, self us, cumulative us, depth) for every import.
+    """
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Unable to import {module}.\n{result.stderr[-2000:]}")
+
+    imports = list()
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is not None:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+
+    return imports
+
+
+def summarize_packages(imports: List[Tuple[str, int, int, int]]) -> Dict[str, int]:
+    """
+    Sum the self import time of every module under each top-level package.
+    """
+
+    packages: Dict[str, int] = defaultdict(int)
+    for name, self_us, _, _ in imports:
+        packages[name.split(".")[0]] += self_us
+
+    return dict(packages)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Report the import cost of the backend.")
+    parser.add_argument("--module", default="main", help="The module to import.")
+    parser.add_argument("--top", type=int, default=20, help="The number of rows to print.")
+    args = parser.parse_args(argv)
+
+    imports = measure_imports(args.module)
+    total_us = max(cumulative_us for _, _, cumulative_us, depth in imports if depth == 0)
+
+    print(f"importing {args.module} took {round(total_us / 1000, 1)} ms.\n")
+
+    print(f"{'package':<40}{'self ms':>10}")
+    for package, self_us in sorted(
+        summarize_packages(imports).items(), key=lambda item: item[1], reverse=True
+    )[: args.top]:
+        print(f"{package:<40}{round(self_us / 1000, 1):>10}")
+
+    print(f"\n{'module':<60}{'cumulative ms':>15}")
+    for name, _, cumulative_us, _ in sorted(
+        imports, key=lambda i: i[2], reverse=True
+    )[: args.top]:
+        print(f"{name:<60}{round(cumulative_us / 1000, 1):>15}")
+
+
+if __name__ == "__main__":
+    main()
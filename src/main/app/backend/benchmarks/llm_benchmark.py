@@ -0,0 +1,310 @@
+"""
+Offline load test of the /llm request path.
+
+The FastAPI app is served in-process with a fake LLM, fake embeddings and an in-memory graph,
+so this runs on a laptop with no network. Simulated latencies stand in for Vertex AI, Neo4j and the LLM.
+
+Modes:
+    async     the request path as deployed, with non-blocking stubs
+    sync      blocking stubs that hold the event loop, like the synchronous driver and SDK calls did
+    cached    repeated questions served by the embedding cache and the semantic answer cache
+    stream    the /llm/stream endpoint
+
+Request latency includes the conversation logging that runs after the response is sent.
+
+Run from the backend directory:
+    python3 -m benchmarks.llm_benchmark --requests 500 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+import httpx
+from langchain_community.chat_models import FakeListChatModel
+
+from main import app
+from objects.context import ContextDocument, ContextSet
+from routers.llm import (
+    get_embedding_service,
+    get_llm,
+    get_local_vector_index,
+    get_log_queue,
+    get_reader,
+    get_semantic_cache,
+    get_writer,
+)
+from tools.embedding import CachedEmbeddingService, FakeEmbeddingService
+from tools.llm import LLM, get_llm_client_registry
+from tools.metrics import add_span_listener, percentile, remove_span_listener
+from tools.semantic_cache import SemanticCache
+
+os.environ["LANGCHAIN_TRACING_V2"] = "false"
+
+MODES = ["async", "sync", "cached", "stream"]
+
+RESPONSE = "GDS is cool."
+
+QUESTIONS = [
+    "What is GDS?",
+    "How do I create a vector index in Neo4j?",
+    "Which centrality algorithms does Neo4j support?",
+    "How does Node2Vec work?",
+    "What is the difference between Cypher and SQL?",
+]
+
+
+async def simulate_latency(milliseconds: float, blocking: bool) -> None:
+    if blocking:
+        time.sleep(milliseconds / 1000)
+    else:
+        await asyncio.sleep(milliseconds / 1000)
+
+
+class InMemoryGraphReader:
+    def __init__(
+        self, latency_ms: float, blocking: bool, cached_answers: bool, corpus_size: int = 200
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.blocking = blocking
+        self.cached_answers = cached_answers
+        self.corpus = [
+            ContextDocument(
+                url=f"https://neo4j.com/docs/{i}",
+                text=f"Document {i} about graph data science. " * 20,
+                index=str(i),
+                score=None,
+            )
+            for i in range(corpus_size)
+        ]
+
+    async def retrieve_context_documents(
+        self, question_embedding: List[float], number_of_context_documents: int = 10
+    ) -> ContextSet:
+        await simulate_latency(self.latency_ms, self.blocking)
+        return ContextSet(random.sample(self.corpus, number_of_context_documents))
+
+    async def retrieve_context_documents_by_topic(
+        self,
+        question_embedding: List[float],
+        number_of_topics: int = 3,
+        documents_per_topic: int = 4,
+    ) -> ContextSet:
+        await simulate_latency(self.latency_ms, self.blocking)
+        return ContextSet(random.sample(self.corpus, number_of_topics * documents_per_topic))
+
+    async def retrieve_cached_answer(
+        self,
+        question_embedding: List[float],
+        llm_type: str,
+        similarity_threshold: float,
+        number_of_candidates: int = 5,
+    ) -> Optional[Dict[str, Any]]:
+        await simulate_latency(self.latency_ms, self.blocking)
+        if not self.cached_answers:
+            return None
+
+        return {
+            "message_id": "llm-cached",
+            "content": "GDS is a graph data science library.",
+            "score": 0.99,
+            "context_ids": ["1", "2"],
+        }
+
+
+class InMemoryGraphWriter:
+    def __init__(self, latency_ms: float, blocking: bool) -> None:
+        self.latency_ms = latency_ms
+        self.blocking = blocking
+        self.messages = 0
+
+    async def log_new_conversation(self, message, llm_type: str, temperature: float) -> None:
+        await simulate_latency(self.latency_ms, self.blocking)
+        self.messages += 1
+
+    async def log_user(self, message, previous_message_id: str) -> None:
+        await simulate_latency(self.latency_ms, self.blocking)
+        self.messages += 1
+
+    async def log_assistant(
+        self, message, previous_message_id: str, context_ids: List[str], memory=None
+    ) -> None:
+        await simulate_latency(self.latency_ms, self.blocking)
+        self.messages += 1
+
+
+class SlowEmbeddingService(FakeEmbeddingService):
+    def __init__(self, latency_ms: float, blocking: bool) -> None:
+        self.latency_ms = latency_ms
+        self.blocking = blocking
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        await simulate_latency(self.latency_ms, self.blocking)
+        return self.get_embedding(text)
+
+
+class SlowFakeChatModel(FakeListChatModel):
+    """
+    A fake chat model that takes latency seconds to answer.
+    A blocking model answers on the event loop, otherwise the answer is computed on a worker thread.
+    """
+
+    latency: float = 0.0
+    blocking: bool = False
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs) -> str:
+        time.sleep(self.latency)
+        return super()._call(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.blocking:
+            return self._generate(messages, stop=stop, **kwargs)
+        return await super()._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p95_ms": round(percentile(values, 95) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+    }
+
+
+def configure_app(mode: str, args: argparse.Namespace) -> None:
+    blocking = mode == "sync"
+    reader = InMemoryGraphReader(args.neo4j_ms, blocking, cached_answers=mode == "cached")
+    writer = InMemoryGraphWriter(args.neo4j_ms, blocking)
+    embedding_service = SlowEmbeddingService(args.embedding_ms, blocking)
+    if mode == "cached":
+        embedding_service = CachedEmbeddingService(embedding_service)
+    semantic_cache = SemanticCache()
+
+    get_llm_client_registry().register_client(
+        "fake",
+        0.0,
+        SlowFakeChatModel(
+            responses=[RESPONSE],
+            latency=args.llm_ms / 1000,
+            # streamed responses take the same time in total, one character at a time
+            sleep=args.llm_ms / 1000 / len(RESPONSE),
+            blocking=blocking,
+        ),
+    )
+
+    app.dependency_overrides[get_reader] = lambda: reader
+    app.dependency_overrides[get_writer] = lambda: writer
+    app.dependency_overrides[get_embedding_service] = lambda: embedding_service
+    app.dependency_overrides[get_semantic_cache] = lambda: semantic_cache
+    app.dependency_overrides[get_llm] = lambda: LLM(llm_type="fake", temperature=0.0)
+    app.dependency_overrides[get_log_queue] = lambda: None
+    app.dependency_overrides[get_local_vector_index] = lambda: None
+
+
+async def run_mode(mode: str, args: argparse.Namespace) -> Dict[str, Any]:
+    configure_app(mode, args)
+
+    stage_timings: Dict[str, List[float]] = defaultdict(list)
+    request_timings: List[float] = list()
+    errors = 0
+    remaining = iter(range(args.requests))
+
+    def record_span(stage: str, duration: float, request_id: str) -> None:
+        stage_timings[stage].append(duration)
+
+    async def client_stream(client: httpx.AsyncClient, stream_id: int) -> None:
+        nonlocal errors
+        for i in remaining:
+            question = {
+                "session_id": f"s-bench-{stream_id}",
+                "conversation_id": f"conv-bench-{stream_id}-{i}",
+                "question": (
+                    random.choice(QUESTIONS)
+                    if mode == "cached"
+                    else f"{random.choice(QUESTIONS)} ({i})"
+                ),
+                "llm_type": "gpt-4 8k",
+                "use_cache": mode == "cached",
+            }
+            start = time.perf_counter()
+            resp = await client.post(
+                "/llm/stream" if mode == "stream" else "/llm", json=question
+            )
+            request_timings.append(time.perf_counter() - start)
+            if resp.status_code != 200:
+                errors += 1
+
+    add_span_listener(record_span)
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            start = time.perf_counter()
+            # the routes print every stage, which would dominate the timings
+            with contextlib.redirect_stdout(io.StringIO()):
+                await asyncio.gather(
+                    *[client_stream(client, s) for s in range(args.concurrency)]
+                )
+            elapsed = time.perf_counter() - start
+    finally:
+        remove_span_listener(record_span)
+        app.dependency_overrides.clear()
+
+    return {
+        "mode": mode,
+        "requests": len(request_timings),
+        "errors": errors,
+        "requests_per_second": round(len(request_timings) / elapsed, 2),
+        "latency": summarize(request_timings),
+        "stages": {stage: summarize(t) for stage, t in sorted(stage_timings.items())},
+    }
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    for result in results:
+        print(
+            f"\n{result['mode']}: {result['requests']} requests, {result['errors']} errors, "
+            f"{result['requests_per_second']} requests/sec"
+        )
+        print(f"    {'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, timings in [("request", result["latency"])] + list(
+            result["stages"].items()
+        ):
+            print(
+                f"    {stage:<20}{timings['p50_ms']:>10}{timings['p95_ms']:>10}{timings['p99_ms']:>10}"
+            )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline load test of the /llm request path.")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per mode.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent client streams.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--embedding-ms", type=float, default=20, help="Simulated embedding latency.")
+    parser.add_argument("--neo4j-ms", type=float, default=15, help="Simulated Neo4j latency.")
+    parser.add_argument("--llm-ms", type=float, default=200, help="Simulated LLM latency.")
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file.")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    args = parse_args(argv)
+    results = [asyncio.run(run_mode(mode, args)) for mode in args.modes]
+
+    print_report(results)
+    if args.json_path is not None:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+from typing import Any, Dict, List, Optional
+
+from neo4j import READ_ACCESS, WRITE_ACCESS, AsyncDriver, AsyncSession, Bookmarks
+from neo4j.exceptions import ConstraintError
+
+from database import drivers, queries
+from database.profiler import aprofiled
+from database.communicator import get_connection_settings
+from tools.secret_manager import SecretManager
+from objects.context import ContextSet
+from objects.memory import ConversationMemory
+from objects.nodes import UserMessage, AssistantMessage
+from objects.rating import Rating
+from objects.turn import ConversationTurn
+from tools.metrics import span
+from tools.retrieval_cache import RetrievalCache, get_retrieval_key
+
+
+async def init_shared_async_driver(
+    secret_manager: Optional[SecretManager] = None,
+) -> AsyncDriver:
+    """
+    Initiate the process-wide async Neo4j Driver that AsyncGraphReader and AsyncGraphWriter borrow sessions from.
+    """
+
+    settings = get_connection_settings(secret_manager)
+
+    return await drivers.init_shared_async_driver(
+        uri=settings["uri"],
+        username=settings["username"],
+        password=settings["password"],
+        database=settings["database"],
+    )
+
+
+class AsyncCommunicator:
+    """
+    Base class for the async graph reader and writer.
+    Sessions are borrowed from the provided async driver's connection pool.
+    On a routing (neo4j://) driver, read sessions are served by followers and read replicas
+    and write sessions by the leader.
+    """
+
+    def __init__(self, driver: AsyncDriver, database_name: Optional[str] = None) -> None:
+        self.driver = driver
+        self.database_name = database_name
+
+    def _read_session(self, bookmarks: Optional[Bookmarks] = None) -> AsyncSession:
+        """
+        Open a READ session. A read given the bookmarks of a write waits until the serving member has applied it.
+        """
+
+        return self.driver.session(
+            database=self.database_name,
+            default_access_mode=READ_ACCESS,
+            bookmarks=bookmarks,
+        )
+
+    def _write_session(self) -> AsyncSession:
+        return self.driver.session(
+            database=self.database_name, default_access_mode=WRITE_ACCESS
+        )
+
+
+class AsyncGraphWriter(AsyncCommunicator):
+
+    def __init__(self, driver: AsyncDriver, database_name: Optional[str] = None) -> None:
+        super().__init__(driver, database_name)
+
+    async def log_new_conversation(
+        self, message: UserMessage, llm_type: str, temperature: float
+    ) -> None:
+        """
+        This method creates a new conversation node and logs the
+        initial user message in the neo4j database.
+        Appropriate relationships are created.
+        """
+
+        print("logging new conversation...")
+
+        print("convId: ", message.conversation_id)
+
+        async def log(tx):
+            await tx.run(
+                queries.LOG_NEW_CONVERSATION,
+                sessionId=message.session_id,
+                convId=message.conversation_id,
+                messId=message.message_id,
+                llm=llm_type,
+                temperature=temperature,
+                content=message.content,
+                embedding=message.embedding,
+                role="user",
+                public=message.public,
+                postTime=_format_post_time(message),
+            )
+
+        try:
+            async with self._write_session() as session:
+                await session.execute_write(aprofiled(log))
+
+        except ConstraintError as err:
+            print(err)
+
+    async def log_user(self, message: UserMessage, previous_message_id: str) -> None:
+        """
+        This method logs a new user message to the neo4j database and
+        creates appropriate relationships.
+        """
+
+        print("logging user message...")
+
+        async def log(tx):
+            await tx.run(
+                queries.LOG_USER,
+                prevMessId=previous_message_id,
+                messId=message.message_id,
+                content=message.content,
+                embedding=message.embedding,
+                role="user",
+                public=message.public,
+                postTime=_format_post_time(message),
+            )
+
+        try:
+            async with self._write_session() as session:
+                await session.execute_write(aprofiled(log))
+
+        except ConstraintError as err:
+            print(err)
+
+    async def log_assistant(
+        self,
+        message: AssistantMessage,
+        previous_message_id: str,
+        context_ids: List[str],
+        memory: Optional[ConversationMemory] = None,
+    ) -> None:
+        """
+        This method logs a new assistant message to the neo4j database and
+        creates appropriate relationships.
+        If provided, the conversation memory is updated in the same transaction.
+        """
+
+        print("logging llm message...")
+
+        mem = memory.summary if memory is not None else "None"
+
+        async def log(tx):
+            await tx.run(
+                queries.LOG_ASSISTANT,
+                prevMessId=previous_message_id,
+                messId=message.message_id,
+                content=message.content,
+                role="assistant",
+                contextIndices=context_ids,
+                numDocs=message.number_of_documents,
+                prompt=message.prompt,
+                resultingSummary=mem,
+                public=message.public,
+                cachedFrom=message.cached_from,
+                llm=message.llm_type,
+            )
+            if memory is not None:
+                await tx.run(
+                    queries.UPDATE_CONVERSATION_MEMORY_BATCH,
+                    memories=[_format_memory(message.conversation_id, memory)],
+                )
+
+        try:
+            async with self._write_session() as session:
+                await session.execute_write(aprofiled(log))
+
+        except ConstraintError as err:
+            print(err)
+
+    async def log_conversation_turns(self, turns: List[ConversationTurn]) -> None:
+        """
+        Log many conversation turns in a single write transaction.
+        Every message node is written before the FIRST and NEXT relationships are created,
+        so turns from the same conversation may share a batch in any order.
+        If any turn fails, for example on a constraint, then the whole batch is rolled back and the error is raised.
+        """
+
+        print(f"logging {len(turns)} conversation turns...")
+
+        conversations = [
+            {
+                "convId": t.user_message.conversation_id,
+                "sessionId": t.user_message.session_id,
+                "llm": t.llm_type,
+                "temperature": t.temperature,
+                "public": t.user_message.public,
+            }
+            for t in turns
+            if t.previous_message_id is None
+        ]
+        user_messages = [
+            {
+                "messId": t.user_message.message_id,
+                "content": t.user_message.content,
+                "embedding": t.user_message.embedding,
+                "public": t.user_message.public,
+                "postTime": (
+                    t.user_message.post_time or t.assistant_post_time
+                ).isoformat(),
+            }
+            for t in turns
+        ]
+        assistant_messages = [
+            {
+                "messId": t.assistant_message.message_id,
+                "content": t.assistant_message.content,
+                "numDocs": t.assistant_message.number_of_documents,
+                "prompt": t.assistant_message.prompt,
+                "public": t.assistant_message.public,
+                "resultingSummary": (
+                    t.memory.summary if t.memory is not None else "None"
+                ),
+                "cachedFrom": t.assistant_message.cached_from,
+                "llm": t.assistant_message.llm_type,
+                "contextIndices": t.context_ids,
+                "postTime": t.assistant_post_time.isoformat(),
+            }
+            for t in turns
+        ]
+        memories = [
+            _format_memory(t.user_message.conversation_id, t.memory)
+            for t in turns
+            if t.memory is not None
+        ]
+        first_links = [
+            {
+                "convId": t.user_message.conversation_id,
+                "messId": t.user_message.message_id,
+            }
+            for t in turns
+            if t.previous_message_id is None
+        ]
+        next_links = [
+            {"prevMessId": t.previous_message_id, "messId": t.user_message.message_id}
+            for t in turns
+            if t.previous_message_id is not None
+        ] + [
+            {
+                "prevMessId": t.user_message.message_id,
+                "messId": t.assistant_message.message_id,
+            }
+            for t in turns
+        ]
+
+        async def log(tx):
+            await tx.run(queries.LOG_CONVERSATIONS_BATCH, conversations=conversations)
+            await tx.run(queries.LOG_USER_MESSAGES_BATCH, messages=user_messages)
+            await tx.run(
+                queries.LOG_ASSISTANT_MESSAGES_BATCH, messages=assistant_messages
+            )
+            await tx.run(queries.LOG_FIRST_BATCH, links=first_links)
+            await tx.run(queries.LOG_NEXT_BATCH, links=next_links)
+            # a conversation's memory is only replaced by the memory of a later turn
+            await tx.run(queries.UPDATE_CONVERSATION_MEMORY_BATCH, memories=memories)
+
+        # errors are raised so the log queue can retry the batch or isolate the turn that failed
+        async with self._write_session() as session:
+            await session.execute_write(aprofiled(log))
+
+    async def rate_message(self, rating: Rating) -> Optional[Bookmarks]:
+        """
+        Rate an LLM message given a rating and uploads
+        the rating to the database.
+        Returns the bookmarks of the write, so a following read can be guaranteed to see the rating.
+        """
+
+        print("rating llm message...")
+
+        async def rate(tx):
+            await tx.run(
+                queries.RATE_MESSAGE,
+                rating=rating.value,
+                message=rating.message,
+                messId=rating.message_id,
+            )
+
+        try:
+            async with self._write_session() as session:
+                await session.execute_write(aprofiled(rate))
+                return await session.last_bookmarks()
+
+        except ConstraintError as err:
+            print(err)
+
+
+class AsyncGraphReader(AsyncCommunicator):
+    """
+    Reads context, cached answers and ratings from the graph.
+    If a retrieval cache is provided, then context retrieval is served from it where possible.
+    """
+
+    def __init__(
+        self,
+        driver: AsyncDriver,
+        database_name: Optional[str] = None,
+        retrieval_cache: Optional[RetrievalCache] = None,
+    ) -> None:
+        super().__init__(driver, database_name)
+        self.retrieval_cache = retrieval_cache
+
+    async def retrieve_context_documents(
+        self, question_embedding: List[float], number_of_context_documents: int = 10
+    ) -> ContextSet:
+        """
+        Run vector similarity search on the document embeddings against the question embedding.
+        The top n documents with their URLs are returned as context.
+        """
+
+        if self.retrieval_cache is None:
+            return await self._retrieve_context_documents(
+                question_embedding, number_of_context_documents
+            )
+
+        return await self.retrieval_cache.get_or_retrieve(
+            key=get_retrieval_key(
+                question_embedding, "vector", k=number_of_context_documents
+            ),
+            retrieve=lambda: self._retrieve_context_documents(
+                question_embedding, number_of_context_documents
+            ),
+            get_epoch=self.get_ingestion_epoch,
+        )
+
+    async def _retrieve_context_documents(
+        self, question_embedding: List[float], number_of_context_documents: int
+    ) -> ContextSet:
+
+        async def neo4j_vector_index_search(tx):
+            result = await tx.run(
+                queries.VECTOR_INDEX_SEARCH,
+                questionEmbedding=question_embedding,
+                k=number_of_context_documents,
+            )
+            return await result.values()
+
+        # get documents from Neo4j database. errors are raised so the caller may fall back
+        with span("neo4j_vector_search"):
+            async with self._read_session() as session:
+                docs = await session.execute_read(aprofiled(neo4j_vector_index_search))
+
+        return ContextSet.from_records(docs)
+
+    async def retrieve_context_documents_by_topic(
+        self,
+        question_embedding: List[float],
+        number_of_topics: int = 3,
+        documents_per_topic: int = 4,
+    ) -> ContextSet:
+        """
+        Run vector similarity search on the topic summaries against the question embedding.
+        The most relevant documents for each topic are returned as context.
+        """
+
+        if self.retrieval_cache is None:
+            return await self._retrieve_context_documents_by_topic(
+                question_embedding, number_of_topics, documents_per_topic
+            )
+
+        return await self.retrieval_cache.get_or_retrieve(
+            key=get_retrieval_key(
+                question_embedding,
+                "topic",
+                k=number_of_topics,
+                documents_per_topic=documents_per_topic,
+            ),
+            retrieve=lambda: self._retrieve_context_documents_by_topic(
+                question_embedding, number_of_topics, documents_per_topic
+            ),
+            get_epoch=self.get_ingestion_epoch,
+        )
+
+    async def _retrieve_context_documents_by_topic(
+        self,
+        question_embedding: List[float],
+        number_of_topics: int,
+        documents_per_topic: int,
+    ) -> ContextSet:
+
+        async def topical_neo4j_vector_index_search(tx):
+            result = await tx.run(
+                queries.TOPIC_VECTOR_INDEX_SEARCH,
+                questionEmbedding=question_embedding,
+                k=number_of_topics,
+                documents_per_topic=documents_per_topic,
+            )
+            return await result.values()
+
+        # get documents from Neo4j database. errors are raised so the caller may fall back
+        with span("neo4j_topic_search"):
+            async with self._read_session() as session:
+                docs = await session.execute_read(aprofiled(topical_neo4j_vector_index_search))
+
+        return ContextSet.from_records(docs)
+
+    async def get_ingestion_epoch(self) -> int:
+        """
+        Retrieve the ingestion epoch, which is incremented after each document load. 0 if none has been recorded.
+        """
+
+        async def get(tx):
+            result = await tx.run(queries.GET_INGESTION_EPOCH)
+            record = await result.single()
+            return record["epoch"]
+
+        async with self._read_session() as session:
+            return await session.execute_read(aprofiled(get))
+
+    async def retrieve_cached_answer(
+        self,
+        question_embedding: List[float],
+        llm_type: str,
+        similarity_threshold: float,
+        number_of_candidates: int = 5,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find the assistant reply to the most similar past question that opened a conversation,
+        was answered by the same LLM and was rated 'Good'. Replies logged without their LLM are attributed
+        to the conversation's LLM. Only questions at or above the similarity threshold are considered.
+        Returns None if no such reply exists.
+        """
+
+        async def semantic_cache_lookup(tx):
+            result = await tx.run(
+                queries.SEMANTIC_CACHE_LOOKUP,
+                questionEmbedding=question_embedding,
+                k=number_of_candidates,
+                threshold=similarity_threshold,
+                llm=llm_type,
+            )
+            return await result.data()
+
+        async with self._read_session() as session:
+            res = await session.execute_read(aprofiled(semantic_cache_lookup))
+
+        return res[0] if len(res) > 0 else None
+
+    async def retrieve_document_embeddings(
+        self, created_after: int = 0, after_index: str = "", limit: int = 1_000
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve a page of Document embeddings ordered by createTime (epoch millis) and index.
+        Only Documents after the (created_after, after_index) key are returned.
+        """
+
+        async def get(tx):
+            result = await tx.run(
+                queries.GET_DOCUMENT_EMBEDDINGS,
+                createdAfter=created_after,
+                afterIndex=after_index,
+                limit=limit,
+            )
+            return await result.data()
+
+        async with self._read_session() as session:
+            return await session.execute_read(aprofiled(get))
+
+    async def get_conversation_memory(self, conversation_id: str) -> ConversationMemory:
+        """
+        Retrieve the rolling summary and recent messages stored on a Conversation node.
+        This is a single lookup by conversation ID, so its cost does not grow with the conversation.
+        An empty memory is returned for an unknown conversation.
+        """
+
+        async def get(tx):
+            result = await tx.run(queries.GET_CONVERSATION_MEMORY, convId=conversation_id)
+            return await result.single()
+
+        async with self._read_session() as session:
+            record = await session.execute_read(aprofiled(get))
+
+        if record is None:
+            return ConversationMemory()
+
+        return ConversationMemory(
+            summary=record["summary"] or "",
+            recent_messages=record["recent_messages"] or [],
+            turn_count=record["turn_count"] or 0,
+        )
+
+    async def get_message_rating(
+        self, assistant_message_id: str, bookmarks: Optional[Bookmarks] = None
+    ) -> List[str]:
+        """
+        Retrieve a message rating.
+        Pass the bookmarks returned by rate_message to read a rating that was just written.
+        """
+
+        async def get(tx):
+            result = await tx.run(queries.GET_MESSAGE_RATING, id=assistant_message_id)
+            return await result.values()
+
+        async with self._read_session(bookmarks=bookmarks) as session:
+            res = await session.execute_read(aprofiled(get))
+
+        return res[0]
+
+
+def _format_memory(conversation_id: str, memory: ConversationMemory) -> Dict[str, Any]:
+    return {
+        "convId": conversation_id,
+        "summary": memory.summary,
+        "recentMessages": memory.recent_messages,
+        "turnCount": memory.turn_count,
+    }
+
+
+def _format_post_time(message: UserMessage) -> Optional[str]:
+    return message.post_time.isoformat() if message.post_time is not None else None
@@ -1,66 +1,140 @@
 import os
 import time
-from typing import List, Optional, Union
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Union
 
+from neo4j import READ_ACCESS, WRITE_ACCESS, Bookmarks, Driver, Session
 from neo4j.exceptions import ConstraintError
-import openai
-import pandas as pd
 
-from database import drivers
+from database import drivers, queries
+from database.profiler import profiled
 from tools.secret_manager import SecretManager
+from objects.context import ContextSet
 from objects.nodes import UserMessage, AssistantMessage
 from objects.rating import Rating
 
+# the columns that a message inherits from its conversation during an export
+CONVERSATION_FIELDS = ("conversation_id", "session_id", "conversation_llm", "temperature")
+# the number of conversations whose latest message is remembered during an export
+EXPORT_CONVERSATION_CACHE_SIZE = 100_000
+
+
+def get_connection_settings(secret_manager: Optional[SecretManager]) -> Dict[str, str]:
+    """
+    Gather the Neo4j connection settings.
+    Secrets are read from GCP if a secret manager is provided, otherwise from environment variables.
+    OpenAI credentials are read when an OpenAI client is first created.
+    """
+
+    if secret_manager is not None:
+        print("Grabbing secrets from GCP.")
+        return {
+            "uri": secret_manager.access_secret_version(
+                f"neo4j_{os.environ.get('DATABASE_TYPE')}_uri"
+            ),
+            "username": secret_manager.access_secret_version("neo4j_username"),
+            "password": secret_manager.access_secret_version(
+                f"neo4j_{os.environ.get('DATABASE_TYPE')}_password"
+            ),
+            "database": secret_manager.access_secret_version("neo4j_database"),
+            "project": os.getenv("GCP_PROJECT_ID"),
+            "region": secret_manager.access_secret_version("gcp_region"),
+        }
+
+    else:
+        print("Grabbing secrets from environment variables.")
+        return {
+            "uri": os.environ.get("NEO4J_URI"),
+            "username": os.environ.get("NEO4J_USERNAME"),
+            "password": os.environ.get("NEO4J_PASSWORD"),
+            "database": os.environ.get("NEO4J_DATABASE"),
+            "project": os.environ.get("GCP_PROJECT_ID"),
+            "region": os.environ.get("GCP_REGION"),
+        }
+
+
+def init_shared_driver(secret_manager: Optional[SecretManager] = None) -> Driver:
+    """
+    Initiate the process-wide Neo4j Driver that GraphReader and GraphWriter borrow sessions from.
+    """
+
+    settings = get_connection_settings(secret_manager)
+
+    return drivers.init_shared_driver(
+        uri=settings["uri"],
+        username=settings["username"],
+        password=settings["password"],
+        database=settings["database"],
+    )
+
 
 class Communicator:
     """
     Base class for graph reader and writer.
+    If a driver is provided, then sessions are borrowed from its connection pool
+    and the driver is not closed by this object.
+    On a routing (neo4j://) driver, read sessions are served by followers and read replicas
+    and write sessions by the leader.
     """
 
-    def __init__(self, secret_manager: Optional[SecretManager]) -> None:
+    def __init__(
+        self,
+        secret_manager: Optional[SecretManager] = None,
+        driver: Optional[Driver] = None,
+        database_name: Optional[str] = None,
+    ) -> None:
+
+        if driver is not None:
+            self.driver = driver
+            self.database_name = database_name
+            self._owns_driver = False
 
-        if secret_manager is not None:
-            print("Grabbing secrets from GCP.")
-            # AUTHENTICATE OPENAI
-            openai.api_key = secret_manager.access_secret_version("openai_key")
-            openai.api_version = secret_manager.access_secret_version("openai_version")
-            self.driver = drivers.init_driver(
-                uri=secret_manager.access_secret_version(
-                    f"neo4j_{os.environ.get('DATABASE_TYPE')}_uri"
-                ),
-                username=secret_manager.access_secret_version("neo4j_username"),
-                password=secret_manager.access_secret_version(
-                    f"neo4j_{os.environ.get('DATABASE_TYPE')}_password"
-                ),
-            )
-            self.database_name = secret_manager.access_secret_version("neo4j_database")
-            self.project = os.getenv("GCP_PROJECT_ID")
-            self.region = secret_manager.access_secret_version("gcp_region")
         else:
-            print("Grabbing secrets from environment variables.")
-            openai.api_key = os.environ.get("OPENAI_API_KEY")
-            openai.api_version = os.environ.get("OPENAI_VERSION")
+            settings = get_connection_settings(secret_manager)
             self.driver = drivers.init_driver(
-                uri=os.environ.get("NEO4J_URI"),
-                username=os.environ.get("NEO4J_USERNAME"),
-                password=os.environ.get("NEO4J_PASSWORD"),
+                uri=settings["uri"],
+                username=settings["username"],
+                password=settings["password"],
             )
-            self.database_name = os.environ.get("NEO4J_DATABASE")
-            self.project = os.environ.get("GCP_PROJECT_ID")
-            self.region = os.environ.get("GCP_REGION")
+            self.database_name = settings["database"]
+            self.project = settings["project"]
+            self.region = settings["region"]
+            self._owns_driver = True
+
+    def _read_session(self, bookmarks: Optional[Bookmarks] = None) -> Session:
+        """
+        Open a READ session. A read given the bookmarks of a write waits until the serving member has applied it.
+        """
+
+        return self.driver.session(
+            database=self.database_name,
+            default_access_mode=READ_ACCESS,
+            bookmarks=bookmarks,
+        )
+
+    def _write_session(self) -> Session:
+        return self.driver.session(
+            database=self.database_name, default_access_mode=WRITE_ACCESS
+        )
 
     def close_driver(self) -> None:
         """
-        Close the driver.
+        Close the driver. A borrowed driver is left open for other requests.
         """
 
-        self.driver.close()
+        if self._owns_driver:
+            self.driver.close()
 
 
 class GraphWriter(Communicator):
 
-    def __init__(self, secret_manager: Optional[SecretManager] = None) -> None:
-        super().__init__(secret_manager)
+    def __init__(
+        self,
+        secret_manager: Optional[SecretManager] = None,
+        driver: Optional[Driver] = None,
+        database_name: Optional[str] = None,
+    ) -> None:
+        super().__init__(secret_manager, driver, database_name)
 
     def log_new_conversation(
         self, message: UserMessage, llm_type: str, temperature: float
@@ -77,25 +151,7 @@ class GraphWriter(Communicator):
 
         def log(tx):
             tx.run(
-                """
-            create (c:Conversation)-[:FIRST]->(m:Message)
-            set c.id = $convId, 
-                c.llm = $llm,
-                c.temperature = $temperature,
-                c.public = toBoolean($public),
-                m.id = $messId, 
-                m.content = $content,
-                m.role = $role, 
-                m.postTime = datetime(),
-                m.public = toBoolean($public)
-
-            with c, m
-            call db.create.setNodeVectorProperty(m, 'embedding', $embedding)
-            
-            merge (s:Session {id: $sessionId})
-            on create set s.createTime = datetime()
-            merge (s)-[:HAS_CONVERSATION]->(c)
-                      """,
+                queries.LOG_NEW_CONVERSATION,
                 sessionId=message.session_id,
                 convId=message.conversation_id,
                 messId=message.message_id,
@@ -105,11 +161,12 @@ class GraphWriter(Communicator):
                 embedding=message.embedding,
                 role="user",
                 public=message.public,
+                postTime=_format_post_time(message),
             )
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                session.execute_write(log)
+            with self._write_session() as session:
+                session.execute_write(profiled(log))
 
         except ConstraintError as err:
             print(err)
@@ -125,30 +182,19 @@ class GraphWriter(Communicator):
 
         def log(tx):
             tx.run(
-                """
-            match (pm:Message {id: $prevMessId})
-            merge (m:Message {id: $messId})
-            set m.content = $content,
-                m.role = $role, 
-                m.postTime = datetime(),
-                m.public = toBoolean($public)
-            
-            with m, pm
-            call db.create.setNodeVectorProperty(m, 'embedding', $embedding)
-
-            merge (pm)-[:NEXT]->(m)
-                      """,
+                queries.LOG_USER,
                 prevMessId=previous_message_id,
                 messId=message.message_id,
                 content=message.content,
                 embedding=message.embedding,
                 role="user",
                 public=message.public,
+                postTime=_format_post_time(message),
             )
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                session.execute_write(log)
+            with self._write_session() as session:
+                session.execute_write(profiled(log))
 
         except ConstraintError as err:
             print(err)
@@ -171,28 +217,7 @@ class GraphWriter(Communicator):
 
         def log(tx):
             tx.run(
-                """
-            match (pm:Message {id: $prevMessId})
-            merge (m:Message {id: $messId})
-            set m.content = $content,
-                m.role = $role, 
-                m.postTime = datetime(),
-                m.numDocs = $numDocs,
-                m.vectorIndexSearch = true,
-                m.prompt = $prompt,
-                m.public = toBoolean($public),
-                m.resultingSummary = $resultingSummary
-                   
-            merge (pm)-[:NEXT]->(m)
-
-            with m
-            unwind $contextIndices as contextIdx
-            match (d:Document)
-            where d.index = contextIdx
-
-            with m, d
-            merge (m)-[:HAS_CONTEXT]->(d)
-                    """,
+                queries.LOG_ASSISTANT,
                 prevMessId=previous_message_id,
                 messId=message.message_id,
                 content=message.content,
@@ -202,85 +227,74 @@ class GraphWriter(Communicator):
                 prompt=message.prompt,
                 resultingSummary=mem,
                 public=message.public,
+                cachedFrom=message.cached_from,
+                llm=message.llm_type,
             )
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                session.execute_write(log)
+            with self._write_session() as session:
+                session.execute_write(profiled(log))
 
         except ConstraintError as err:
             print(err)
             session.close()
 
-    def rate_message(self, rating: Rating):
+    def rate_message(self, rating: Rating) -> Optional[Bookmarks]:
         """
         Rate an LLM message given a rating and uploads
         the rating to the database.
+        Returns the bookmarks of the write, so a following read can be guaranteed to see the rating.
         """
 
         print("rating llm message...")
 
         def rate(tx):
             tx.run(
-                """
-            match (m:Message {id: $messId})
-
-            set m.rating = $rating,
-                m.ratingMessage = $message
-                    """,
+                queries.RATE_MESSAGE,
                 rating=rating.value,
                 message=rating.message,
                 messId=rating.message_id,
             )
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                session.execute_write(rate)
+            with self._write_session() as session:
+                session.execute_write(profiled(rate))
+                return session.last_bookmarks()
 
         except ConstraintError as err:
             print(err)
             session.close()
 
-    def delete_by_id(self, ids: List[str]) -> None:
+    def delete_nodes(self, nodes: Dict[str, List[str]], batch_size: int = 10_000) -> None:
         """
-        Delete nodes and relationships based on provided ids.
+        Delete nodes and their relationships, given a map of label to ids.
+        Each label is matched on its indexed key, so no label scans are run.
+        Up to batch_size ids are deleted in a single transaction.
+        Larger purges are committed in batches of batch_size with CALL {} IN TRANSACTIONS.
         """
 
-        def delete_nodes_and_rels(tx):
-            tx.run(
-                """
-                unwind $ids as id
-                match (n {id: id})-[r]-()
-                detach delete n, r
-                """,
-                ids=ids,
-            )
-
-        def delete_nodes(tx):
-            tx.run(
-                """
-                unwind $ids as id
-                match (n {id: id})
-                delete n
-                """,
-                ids=ids,
-            )
+        nodes = {label: ids for label, ids in nodes.items() if len(ids) > 0}
+        number_of_ids = sum(len(ids) for ids in nodes.values())
 
-        def delete_document_nodes(tx):
-            tx.run(
-                """
-                unwind $ids as id
-                match (n {index: id})
-                delete n
-                """,
-                ids=ids,
-            )
+        def delete(tx):
+            for label, ids in nodes.items():
+                tx.run(_format_node_query(queries.DELETE_NODES_BY_KEY, label), ids=ids)
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                session.execute_write(delete_nodes_and_rels)
-                session.execute_write(delete_nodes)
-                session.execute_write(delete_document_nodes)
+            with self._write_session() as session:
+                if number_of_ids <= batch_size:
+                    session.execute_write(profiled(delete))
+
+                else:
+                    # CALL {} IN TRANSACTIONS must run in an auto-commit transaction
+                    for label, ids in nodes.items():
+                        session.run(
+                            _format_node_query(
+                                queries.DELETE_NODES_BY_KEY_IN_TRANSACTIONS, label
+                            ),
+                            ids=ids,
+                            batchSize=batch_size,
+                        ).consume()
 
         except ConstraintError as err:
             print(err)
@@ -292,17 +306,11 @@ class GraphWriter(Communicator):
         """
 
         def write_node(tx):
-            prompt = (
-                "merge (n:" + label + "{id: $id})"
-                if not label == "Document"
-                else "merge (n:" + label + "{index: $id})"
-            )
-            tx.run(prompt, id=id)
-            print(prompt)
+            tx.run(_format_node_query(queries.WRITE_NODE_BY_KEY, label), id=id)
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                session.execute_write(write_node)
+            with self._write_session() as session:
+                session.execute_write(profiled(write_node))
 
         except ConstraintError as err:
             print(err)
@@ -311,12 +319,17 @@ class GraphWriter(Communicator):
 
 class GraphReader(Communicator):
 
-    def __init__(self, secret_manager: Optional[SecretManager] = None) -> None:
-        super().__init__(secret_manager)
+    def __init__(
+        self,
+        secret_manager: Optional[SecretManager] = None,
+        driver: Optional[Driver] = None,
+        database_name: Optional[str] = None,
+    ) -> None:
+        super().__init__(secret_manager, driver, database_name)
 
     def retrieve_context_documents(
         self, question_embedding: List[float], number_of_context_documents: int = 10
-    ) -> pd.DataFrame:
+    ) -> ContextSet:
         """
         This function takes the user question and creates an embedding of it
         using a vertexai model.
@@ -332,24 +345,20 @@ class GraphReader(Communicator):
             """
 
             return tx.run(
-                """
-                            CALL db.index.vector.queryNodes('document-embeddings', toInteger($k), $questionEmbedding)
-                            YIELD node AS vDocs, score
-                            return vDocs.url as url, vDocs.text as text, vDocs.index as index
-                            """,
+                queries.VECTOR_INDEX_SEARCH,
                 questionEmbedding=question_embedding,
                 k=number_of_context_documents,
             ).values()
 
-        # get documents from Neo4j database
+        # get documents from Neo4j database. no context is returned if the query fails
         neo4j_timer_start = time.perf_counter()
+        docs = list()
         try:
-            with self.driver.session(database=self.database_name) as session:
-                docs = session.execute_read(neo4j_vector_index_search)
+            with self._read_session() as session:
+                docs = session.execute_read(profiled(neo4j_vector_index_search))
 
         except Exception as err:
             print(err)
-            session.close()
 
         print(
             "Neo4j retrieval time: "
@@ -357,14 +366,14 @@ class GraphReader(Communicator):
             + " seconds."
         )
 
-        return pd.DataFrame(docs, columns=["url", "text", "index"])
+        return ContextSet.from_records(docs)
 
     def retrieve_context_documents_by_topic(
         self,
         question_embedding: List[float],
         number_of_topics: int = 3,
         documents_per_topic: int = 4,
-    ) -> pd.DataFrame:
+    ) -> ContextSet:
         """
         This function takes the user question and creates an embedding of it
         using a vertexai model.
@@ -380,27 +389,21 @@ class GraphReader(Communicator):
             """
 
             return tx.run(
-                """
-                            CALL db.index.vector.queryNodes('topic_group_summary_embeddings', toInteger($k), $questionEmbedding)
-                            YIELD node AS g, score
-                            MATCH (g)<-[:IN_GROUP]-()<-[h:HAS_TOPIC]-(vDocs)
-                            WHERE h.rankAlpha50 <= toInteger($documents_per_topic)
-                            return vDocs.url as url, vDocs.text as text, vDocs.index as index
-                            """,
+                queries.TOPIC_VECTOR_INDEX_SEARCH,
                 questionEmbedding=question_embedding,
                 k=number_of_topics,
                 documents_per_topic=documents_per_topic,
             ).values()
 
-        # get documents from Neo4j database
+        # get documents from Neo4j database. no context is returned if the query fails
         neo4j_timer_start = time.perf_counter()
+        docs = list()
         try:
-            with self.driver.session(database=self.database_name) as session:
-                docs = session.execute_read(topical_neo4j_vector_index_search)
+            with self._read_session() as session:
+                docs = session.execute_read(profiled(topical_neo4j_vector_index_search))
 
         except Exception as err:
             print(err)
-            session.close()
 
         print(
             "Neo4j retrieval time: "
@@ -408,74 +411,210 @@ class GraphReader(Communicator):
             + " seconds."
         )
 
-        return pd.DataFrame(docs, columns=["url", "text", "index"])
+        return ContextSet.from_records(docs)
 
-    def match_by_id(self, ids: List[str]) -> int:
+    def count_nodes(self, nodes: Dict[str, List[str]]) -> Dict[str, int]:
         """
-        Match nodes based on provided ids and return count.
+        Count the nodes that exist, given a map of label to ids.
+        Each label is matched on its indexed key in a single read transaction.
         """
 
-        def match_nodes(tx):
-            return (
-                tx.run(
-                    """
-                unwind $ids as id
-                match (n {id: id})
-                return count(distinct n)
-                """,
-                    ids=ids,
+        def count(tx):
+            return {
+                label: tx.run(
+                    _format_node_query(queries.COUNT_NODES_BY_KEY, label), ids=ids
                 )
                 .single()
                 .value()
-            )
+                for label, ids in nodes.items()
+            }
 
-        def match_document_nodes(tx):
-            return (
-                tx.run(
-                    """
-                unwind $ids as id
-                match (n {index: id})
-                return count(distinct n)
-                """,
-                    ids=ids,
-                )
-                .single()
-                .value()
-            )
+        with self._read_session() as session:
+            return session.execute_read(profiled(count))
 
-        try:
-            with self.driver.session(database=self.database_name) as session:
-                num_messages = session.execute_read(match_nodes)
-                print(f"messages {num_messages}")
-                num_documents = session.execute_read(match_document_nodes)
-                print(f"docs {num_documents}")
+    def stream_messages(
+        self,
+        after_time: str = "1970-01-01T00:00:00Z",
+        after_id: str = "",
+        until: Optional[str] = None,
+        page_size: int = 10_000,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every message posted after the (after_time, after_id) cursor and before until, ordered by postTime and id.
+        Each message carries its conversation, session, LLM settings, context document indices and rating.
+        Messages are read one page at a time, each in its own read transaction,
+        so memory is bounded by the page size however many messages there are.
+        """
 
-        except ConstraintError as err:
-            print(err)
-            session.close()
+        # the conversation of the latest message seen in each conversation, which its reply inherits
+        conversations: OrderedDict = OrderedDict()
+
+        for page in self._stream_pages(
+            queries.EXPORT_MESSAGES_PAGE,
+            time_key="post_time",
+            after_time=after_time,
+            after_id=after_id,
+            until=until,
+            page_size=page_size,
+        ):
+            self._attach_conversations(page, conversations)
+            yield from page
+
+    def stream_ratings(
+        self,
+        after_time: str = "1970-01-01T00:00:00Z",
+        after_id: str = "",
+        until: Optional[str] = None,
+        page_size: int = 10_000,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream every rating given after the (after_time, after_id) cursor and before until, ordered by ratedAt and id.
+        """
+
+        for page in self._stream_pages(
+            queries.EXPORT_RATINGS_PAGE,
+            time_key="rated_at",
+            after_time=after_time,
+            after_id=after_id,
+            until=until,
+            page_size=page_size,
+        ):
+            yield from page
+
+    def _stream_pages(
+        self,
+        query: str,
+        time_key: str,
+        after_time: str,
+        after_id: str,
+        until: Optional[str],
+        page_size: int,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Read a keyset paginated query one page at a time, each in its own read transaction.
+        Each page starts after the (time_key, message_id) of the last row of the previous page.
+        """
+
+        while True:
+
+            def get_page(tx):
+                return tx.run(
+                    query,
+                    afterTime=after_time,
+                    afterId=after_id,
+                    until=until,
+                    limit=page_size,
+                ).data()
+
+            with self._read_session() as session:
+                page = session.execute_read(profiled(get_page))
+
+            yield page
 
-        return num_documents + num_messages
+            if len(page) < page_size:
+                return
+            after_time, after_id = page[-1][time_key], page[-1]["message_id"]
+
+    def _attach_conversations(
+        self, page: List[Dict[str, Any]], conversations: OrderedDict
+    ) -> None:
+        """
+        Set the conversation, session and LLM settings of each message in a page.
+        A message inherits its conversation from its previous message, so the path back to the first message
+        is only walked for messages whose previous message has not been seen, in one query per page.
+        conversations maps the latest message seen in each conversation to the conversation and is updated.
+        """
 
-    def get_message_rating(self, assistant_message_id: str) -> str:
+        by_id = {row["message_id"]: row for row in page}
+        # the earliest message in the page of each message's conversation
+        roots: Dict[str, str] = dict()
+        for row in page:
+            path = list()
+            while row["message_id"] not in roots:
+                path.append(row["message_id"])
+                previous = by_id.get(row["previous_message_id"])
+                if row["conversation_id"] is not None or previous is None:
+                    roots[row["message_id"]] = row["message_id"]
+                    break
+                row = previous
+            for message_id in path:
+                roots[message_id] = roots[row["message_id"]]
+
+        found: Dict[str, Dict[str, Any]] = dict()
+        for message_id in set(roots.values()):
+            root = by_id[message_id]
+            if root["conversation_id"] is not None:
+                found[message_id] = {k: root[k] for k in CONVERSATION_FIELDS}
+            elif root["previous_message_id"] in conversations:
+                found[message_id] = conversations[root["previous_message_id"]]
+
+        unresolved = [
+            message_id
+            for message_id in set(roots.values())
+            if message_id not in found and by_id[message_id]["previous_message_id"] is not None
+        ]
+        if len(unresolved) > 0:
+
+            def get_conversations(tx):
+                return tx.run(
+                    queries.EXPORT_MESSAGE_CONVERSATIONS, messageIds=unresolved
+                ).data()
+
+            with self._read_session() as session:
+                for conversation in session.execute_read(profiled(get_conversations)):
+                    found[conversation.pop("message_id")] = conversation
+
+        empty = {k: None for k in CONVERSATION_FIELDS}
+        for row in page:
+            conversation = found.get(roots[row["message_id"]], empty)
+            row.update(conversation)
+            conversation_llm = row.pop("conversation_llm")
+            row["llm"] = row["llm"] or conversation_llm
+
+            if conversation is not empty:
+                conversations.pop(row["previous_message_id"], None)
+                conversations[row["message_id"]] = conversation
+        while len(conversations) > EXPORT_CONVERSATION_CACHE_SIZE:
+            conversations.popitem(last=False)
+
+    def get_message_rating(
+        self, assistant_message_id: str, bookmarks: Optional[Bookmarks] = None
+    ) -> str:
         """
         Retrieve a message rating.
+        Pass the bookmarks returned by rate_message to read a rating that was just written.
         """
 
         def get(tx):
             return tx.run(
-                """
-                match (n:Message {id: $id})
-                return n.id as id, n.rating as rating, n.ratingMessage as rating_message
-                """,
+                queries.GET_MESSAGE_RATING,
                 id=assistant_message_id,
             ).values()
 
         try:
-            with self.driver.session(database=self.database_name) as session:
-                res = session.execute_read(get)[0]
+            with self._read_session(bookmarks=bookmarks) as session:
+                res = session.execute_read(profiled(get))[0]
 
         except ConstraintError as err:
             print(err)
             session.close()
 
         return res
+
+
+def _format_node_query(query: str, label: str) -> str:
+    """
+    Format a query template with a label and its indexed key.
+    Only labels in NODE_KEYS are accepted, since labels can not be passed as parameters.
+    """
+
+    if label not in queries.NODE_KEYS:
+        raise ValueError(
+            f"label must be one of the following: {list(queries.NODE_KEYS)}."
+        )
+
+    return query.format(label=label, key=queries.NODE_KEYS[label])
+
+
+def _format_post_time(message: UserMessage) -> Optional[str]:
+    return message.post_time.isoformat() if message.post_time is not None else None
@@ -1,12 +1,176 @@
-from neo4j import GraphDatabase, Driver
+import os
+from typing import Any, Dict, Optional
 
+from neo4j import AsyncDriver, AsyncGraphDatabase, GraphDatabase, Driver
 
-def init_driver(uri, username, password) -> Driver:
+_shared_driver: Optional[Driver] = None
+_shared_database: Optional[str] = None
+_shared_async_driver: Optional[AsyncDriver] = None
+
+
+def get_pool_config() -> Dict[str, Any]:
+    """
+    Gather the connection pool settings for the Neo4j Driver.
+    Each setting may be tuned with an environment variable.
+    """
+
+    return {
+        "max_connection_pool_size": int(
+            os.environ.get("NEO4J_MAX_CONNECTION_POOL_SIZE", 100)
+        ),
+        "connection_acquisition_timeout": float(
+            os.environ.get("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", 60.0)
+        ),
+        "max_connection_lifetime": float(
+            os.environ.get("NEO4J_MAX_CONNECTION_LIFETIME", 3600.0)
+        ),
+        "liveness_check_timeout": float(
+            os.environ.get("NEO4J_LIVENESS_CHECK_TIMEOUT", 300.0)
+        ),
+    }
+
+
+def get_routing_uri(uri: str) -> str:
+    """
+    Use the routing scheme, so READ sessions are spread over followers and read replicas
+    and WRITE sessions go to the leader. A single instance serves both.
+    Set NEO4J_ROUTING to false to connect directly to the given server.
+    """
+
+    if os.environ.get("NEO4J_ROUTING", "true").lower() == "false":
+        return uri
+
+    for scheme in ["bolt+ssc://", "bolt+s://", "bolt://"]:
+        if uri.startswith(scheme):
+            return "neo4j" + uri[len("bolt") :]
+
+    return uri
+
+
+def init_driver(uri, username, password, **pool_config) -> Driver:
     """
     Initiate the Neo4j Driver.
     """
-    d = GraphDatabase.driver(uri, auth=(username, password))
+
+    d = GraphDatabase.driver(
+        get_routing_uri(uri), auth=(username, password), **pool_config
+    )
     d.verify_connectivity()
     d.verify_authentication()
     print("driver created. connection verified. auth verified.")
     return d
+
+
+def init_shared_driver(uri, username, password, database: str) -> Driver:
+    """
+    Initiate the process-wide Neo4j Driver and its connection pool.
+    This should be called once per process, for example in the app lifespan.
+    """
+
+    global _shared_driver, _shared_database
+
+    if _shared_driver is not None:
+        return _shared_driver
+
+    _shared_driver = init_driver(uri, username, password, **get_pool_config())
+    _shared_database = database
+
+    return _shared_driver
+
+
+def get_shared_driver() -> Driver:
+    """
+    Retrieve the process-wide Neo4j Driver.
+    """
+
+    if _shared_driver is None:
+        raise RuntimeError(
+            "The shared Neo4j driver has not been initialized. Call init_shared_driver first."
+        )
+
+    return _shared_driver
+
+
+def get_shared_database() -> Optional[str]:
+    """
+    Retrieve the database name associated with the process-wide Neo4j Driver.
+    """
+
+    return _shared_database
+
+
+def close_shared_driver() -> None:
+    """
+    Close the process-wide Neo4j Driver and release its connection pool.
+    """
+
+    global _shared_driver, _shared_database
+
+    if _shared_driver is not None:
+        _shared_driver.close()
+        print("shared driver closed.")
+
+    _shared_driver = None
+    _shared_database = None
+
+
+async def init_async_driver(uri, username, password, **pool_config) -> AsyncDriver:
+    """
+    Initiate the async Neo4j Driver.
+    """
+
+    d = AsyncGraphDatabase.driver(
+        get_routing_uri(uri), auth=(username, password), **pool_config
+    )
+    await d.verify_connectivity()
+    await d.verify_authentication()
+    print("async driver created. connection verified. auth verified.")
+    return d
+
+
+async def init_shared_async_driver(
+    uri, username, password, database: str
+) -> AsyncDriver:
+    """
+    Initiate the process-wide async Neo4j Driver and its connection pool.
+    This should be called once per process, for example in the app lifespan.
+    """
+
+    global _shared_async_driver, _shared_database
+
+    if _shared_async_driver is not None:
+        return _shared_async_driver
+
+    _shared_async_driver = await init_async_driver(
+        uri, username, password, **get_pool_config()
+    )
+    _shared_database = database
+
+    return _shared_async_driver
+
+
+def get_shared_async_driver() -> AsyncDriver:
+    """
+    Retrieve the process-wide async Neo4j Driver.
+    """
+
+    if _shared_async_driver is None:
+        raise RuntimeError(
+            "The shared async Neo4j driver has not been initialized. Call init_shared_async_driver first."
+        )
+
+    return _shared_async_driver
+
+
+async def close_shared_async_driver() -> None:
+    """
+    Close the process-wide async Neo4j Driver and release its connection pool.
+    """
+
+    global _shared_async_driver
+
+    if _shared_async_driver is not None:
+        await _shared_async_driver.close()
+        print("shared async driver closed.")
+
+    _shared_async_driver = None
@@ -0,0 +1,191 @@
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+from neo4j.exceptions import ClientError
+
+from database.async_communicator import AsyncGraphWriter
+from objects.turn import ConversationTurn
+from tools.metrics import REGISTRY, span
+
+_shared_log_queue: Optional["ConversationLogQueue"] = None
+
+
+class ConversationLogQueue:
+    """
+    Write-behind queue for conversation logging.
+    Turns are flushed to the graph in one transaction per max_batch_size messages
+    or every flush_interval_ms, whichever comes first.
+    A batch that is rejected by the database, for example on a constraint, is split in halves and each half retried,
+    so only the turns that fail on their own are dropped. Other failures retry the whole batch up to max_retries times.
+    """
+
+    def __init__(
+        self,
+        writer: AsyncGraphWriter,
+        max_batch_size: int = 200,
+        flush_interval_ms: float = 250.0,
+        max_queue_size: int = 10_000,
+        max_retries: int = 3,
+        retry_backoff_ms: float = 1000.0,
+    ) -> None:
+        self.writer = writer
+        self.max_batch_size = max_batch_size
+        self.flush_interval_ms = flush_interval_ms
+        self.max_retries = max_retries
+        self.retry_backoff_ms = retry_backoff_ms
+
+        self.turns_logged = 0
+        self.turns_dropped = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """
+        Start the background flusher.
+        """
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, turn: ConversationTurn) -> None:
+        """
+        Queue a conversation turn to be logged.
+        This only waits if the queue is full.
+        """
+
+        await self._queue.put(turn)
+
+    async def stop(self) -> None:
+        """
+        Write every queued turn and stop the background flusher.
+        """
+
+        if self._task is not None:
+            # the sentinel is queued behind every pending turn
+            await self._queue.put(None)
+            await self._task
+            self._task = None
+
+        print(
+            f"log queue stopped. {self.turns_logged} turns logged in {self.batches_written} batches."
+        )
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return the logged turn, batch and failure counters along with the queue depth.
+        """
+
+        return {
+            "turns_logged": self.turns_logged,
+            "turns_dropped": self.turns_dropped,
+            "batches_written": self.batches_written,
+            "failed_batches": self.failed_batches,
+            "queued": self._queue.qsize(),
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+
+        while not stopping:
+            turn = await self._queue.get()
+            if turn is None:
+                break
+
+            batch = [turn]
+            deadline = loop.time() + self.flush_interval_ms / 1000
+
+            # each turn holds a user and an assistant message
+            while len(batch) * 2 < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    turn = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if turn is None:
+                    stopping = True
+                    break
+                batch.append(turn)
+
+            await self._write(batch)
+
+    async def _write(self, batch: List[ConversationTurn], attempt: int = 0) -> None:
+        try:
+            with span("log_batch_write"):
+                await self.writer.log_conversation_turns(batch)
+            self.turns_logged += len(batch)
+            self.batches_written += 1
+            return
+
+        except ClientError as err:
+            self.failed_batches += 1
+            if len(batch) == 1:
+                print(f"dropping conversation turn {batch[0].user_message.message_id}: {err}")
+                self.turns_dropped += 1
+                return
+            print(f"failed to log {len(batch)} conversation turns: {err}. retrying each half.")
+
+        except Exception as err:
+            self.failed_batches += 1
+            if attempt >= self.max_retries:
+                print(f"dropping {len(batch)} conversation turns after {attempt + 1} attempts: {err}")
+                self.turns_dropped += len(batch)
+                return
+            print(f"failed to log {len(batch)} conversation turns: {err}. retrying.")
+            await asyncio.sleep(self.retry_backoff_ms * 2**attempt / 1000)
+            return await self._write(batch, attempt + 1)
+
+        # earlier turns are written first, so the NEXT links of later turns find their previous message
+        middle = len(batch) // 2
+        await self._write(batch[:middle])
+        await self._write(batch[middle:])
+
+
+def init_shared_log_queue(writer: AsyncGraphWriter) -> Optional[ConversationLogQueue]:
+    """
+    Start the process-wide write-behind log queue if LOG_WRITE_BEHIND is enabled.
+    The batch size and flush interval may be tuned with environment variables.
+    """
+
+    global _shared_log_queue
+
+    if os.environ.get("LOG_WRITE_BEHIND", "false").lower() != "true":
+        return None
+
+    if _shared_log_queue is None:
+        _shared_log_queue = ConversationLogQueue(
+            writer=writer,
+            max_batch_size=int(os.environ.get("LOG_BATCH_SIZE", 200)),
+            flush_interval_ms=float(os.environ.get("LOG_FLUSH_INTERVAL_MS", 250)),
+        )
+        _shared_log_queue.start()
+        REGISTRY.register_collector("log_queue", _shared_log_queue.get_stats)
+
+    return _shared_log_queue
+
+
+def get_shared_log_queue() -> Optional[ConversationLogQueue]:
+    """
+    Retrieve the process-wide write-behind log queue, if it is enabled.
+    """
+
+    return _shared_log_queue
+
+
+async def close_shared_log_queue() -> None:
+    """
+    Flush and stop the process-wide write-behind log queue.
+    """
+
+    global _shared_log_queue
+
+    if _shared_log_queue is not None:
+        await _shared_log_queue.stop()
+
+    _shared_log_queue = None
@@ -0,0 +1,328 @@
+import os
+import threading
+from collections import deque
+from functools import lru_cache, wraps
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from database import queries
+from tools.metrics import REGISTRY, get_request_id, percentile
+
+QUERY_DURATION = REGISTRY.histogram(
+    "neo4j_query_duration_seconds",
+    "Server time of each profiled Neo4j query, until its result was consumed.",
+    ["query"],
+)
+
+
+def _get_query_names() -> Dict[str, str]:
+    """
+    Map the text of every query in database.queries to its name.
+    The label templates are formatted with each label they may be used with.
+    """
+
+    names = dict()
+    for name, value in vars(queries).items():
+        if not name.isupper() or not isinstance(value, str):
+            continue
+        if "{label}" in value:
+            for label, key in queries.NODE_KEYS.items():
+                names[value.format(label=label, key=key)] = f"{name}[{label}]"
+        else:
+            names[value] = name
+
+    return names
+
+
+QUERY_NAMES = _get_query_names()
+
+
+def get_query_name(query: str) -> str:
+    return QUERY_NAMES.get(query, "UNNAMED")
+
+
+class QueryStats:
+    """
+    The aggregated result summaries of one named query.
+    """
+
+    def __init__(self, max_samples: int) -> None:
+        self.count = 0
+        self.durations_ms: Deque[float] = deque(maxlen=max_samples)
+        self.db_hits: Deque[int] = deque(maxlen=max_samples)
+        self.counters: Dict[str, int] = dict()
+        self.plan: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        durations = list(self.durations_ms)
+        stats = {
+            "count": self.count,
+            "p50_ms": percentile(durations, 50),
+            "p95_ms": percentile(durations, 95),
+            "p99_ms": percentile(durations, 99),
+            "max_ms": max(durations, default=0),
+            "counters": dict(self.counters),
+        }
+        if len(self.db_hits) > 0:
+            stats["mean_db_hits"] = sum(self.db_hits) / len(self.db_hits)
+            stats["plan"] = self.plan
+
+        return stats
+
+
+class QueryProfiler:
+    """
+    Aggregate the Neo4j result summaries of every query run through a profiled transaction, by query name.
+    The server reports when the result was available and when it was consumed, along with update counters.
+    If profile_plans is True, then each query is run with PROFILE and its plan and db hits are recorded.
+    This is expensive, so it should only be enabled while investigating.
+    Queries slower than slow_query_ms are logged and the most recent are kept.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        profile_plans: bool = False,
+        slow_query_ms: float = 500.0,
+        max_samples: int = 1_000,
+        max_slow_queries: int = 100,
+    ) -> None:
+        self.enabled = enabled
+        self.profile_plans = profile_plans
+        self.slow_query_ms = slow_query_ms
+        self.max_samples = max_samples
+
+        self._stats: Dict[str, QueryStats] = dict()
+        self._slow_queries: Deque[Dict[str, Any]] = deque(maxlen=max_slow_queries)
+        self._lock = threading.Lock()
+
+    def prepare(self, query: str) -> str:
+        return "PROFILE " + query if self.profile_plans else query
+
+    def record(self, name: str, summary) -> None:
+        """
+        Record the result summary of a query.
+        """
+
+        available_ms = summary.result_available_after or 0
+        consumed_ms = summary.result_consumed_after or 0
+        duration_ms = available_ms + consumed_ms
+        counters = {
+            key: value
+            for key, value in vars(summary.counters).items()
+            if isinstance(value, int) and not isinstance(value, bool) and value != 0
+        }
+        plan = summary.profile
+
+        with self._lock:
+            stats = self._stats.setdefault(name, QueryStats(self.max_samples))
+            stats.count += 1
+            stats.durations_ms.append(duration_ms)
+            for key, value in counters.items():
+                stats.counters[key] = stats.counters.get(key, 0) + value
+            if plan is not None:
+                stats.db_hits.append(_get_db_hits(plan))
+                stats.plan = plan
+
+            if duration_ms >= self.slow_query_ms:
+                self._slow_queries.append(
+                    {
+                        "query": name,
+                        "request_id": get_request_id(),
+                        "available_after_ms": available_ms,
+                        "consumed_after_ms": consumed_ms,
+                        "counters": counters,
+                    }
+                )
+
+        QUERY_DURATION.observe(duration_ms / 1000, query=name)
+        if duration_ms >= self.slow_query_ms:
+            print(
+                f"[{get_request_id()}] slow query {name}: available after {available_ms} ms, consumed after {consumed_ms} ms."
+            )
+
+    def get_report(self) -> Dict[str, Any]:
+        """
+        Return the percentiles, counters and plans of each query along with the recent slow queries.
+        """
+
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "profile_plans": self.profile_plans,
+                "slow_query_ms": self.slow_query_ms,
+                "queries": {
+                    name: stats.to_dict() for name, stats in sorted(self._stats.items())
+                },
+                "slow_queries": list(self._slow_queries),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self._slow_queries.clear()
+
+
+class ProfiledResult:
+    """
+    Wraps a Result so its summary is recorded once the records have been read.
+    """
+
+    def __init__(self, result, name: str, profiler: QueryProfiler) -> None:
+        self._result = result
+        self._name = name
+        self._profiler = profiler
+        self._recorded = False
+
+    def single(self, *args, **kwargs):
+        return self._record(self._result.single(*args, **kwargs))
+
+    def values(self, *args, **kwargs):
+        return self._record(self._result.values(*args, **kwargs))
+
+    def data(self, *args, **kwargs):
+        return self._record(self._result.data(*args, **kwargs))
+
+    def consume(self):
+        summary = self._result.consume()
+        self._record_summary(summary)
+        return summary
+
+    def __getattr__(self, name: str):
+        return getattr(self._result, name)
+
+    def _record(self, value):
+        self.consume()
+        return value
+
+    def _record_summary(self, summary) -> None:
+        if not self._recorded:
+            self._recorded = True
+            self._profiler.record(self._name, summary)
+
+
+class AsyncProfiledResult(ProfiledResult):
+    """
+    Wraps an AsyncResult so its summary is recorded once the records have been read.
+    """
+
+    async def single(self, *args, **kwargs):
+        return await self._record(await self._result.single(*args, **kwargs))
+
+    async def values(self, *args, **kwargs):
+        return await self._record(await self._result.values(*args, **kwargs))
+
+    async def data(self, *args, **kwargs):
+        return await self._record(await self._result.data(*args, **kwargs))
+
+    async def consume(self):
+        summary = await self._result.consume()
+        self._record_summary(summary)
+        return summary
+
+    async def _record(self, value):
+        await self.consume()
+        return value
+
+
+class ProfiledTransaction:
+    """
+    Wraps a managed transaction so every query run in it is profiled.
+    """
+
+    result_class = ProfiledResult
+
+    def __init__(self, tx, profiler: QueryProfiler) -> None:
+        self._tx = tx
+        self._profiler = profiler
+        self.results: List[ProfiledResult] = list()
+
+    def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, **kwargs):
+        result = self.result_class(
+            self._tx.run(self._profiler.prepare(query), parameters, **kwargs),
+            get_query_name(query),
+            self._profiler,
+        )
+        self.results.append(result)
+        return result
+
+    def __getattr__(self, name: str):
+        return getattr(self._tx, name)
+
+
+class AsyncProfiledTransaction(ProfiledTransaction):
+    """
+    Wraps an async managed transaction so every query run in it is profiled.
+    """
+
+    result_class = AsyncProfiledResult
+
+    async def run(self, query: str, parameters: Optional[Dict[str, Any]] = None, **kwargs):
+        result = self.result_class(
+            await self._tx.run(self._profiler.prepare(query), parameters, **kwargs),
+            get_query_name(query),
+            self._profiler,
+        )
+        self.results.append(result)
+        return result
+
+
+def profiled(work: Callable) -> Callable:
+    """
+    Wrap a transaction function for session.execute_read or session.execute_write.
+    Results the function did not read are consumed before the transaction commits, so writes are profiled too.
+    """
+
+    profiler = get_query_profiler()
+    if not profiler.enabled:
+        return work
+
+    @wraps(work)
+    def profiled_work(tx, *args, **kwargs):
+        profiled_tx = ProfiledTransaction(tx, profiler)
+        value = work(profiled_tx, *args, **kwargs)
+        for result in profiled_tx.results:
+            result.consume()
+        return value
+
+    return profiled_work
+
+
+def aprofiled(work: Callable) -> Callable:
+    """
+    Wrap an async transaction function for session.execute_read or session.execute_write.
+    Results the function did not read are consumed before the transaction commits, so writes are profiled too.
+    """
+
+    profiler = get_query_profiler()
+    if not profiler.enabled:
+        return work
+
+    @wraps(work)
+    async def profiled_work(tx, *args, **kwargs):
+        profiled_tx = AsyncProfiledTransaction(tx, profiler)
+        value = await work(profiled_tx, *args, **kwargs)
+        for result in profiled_tx.results:
+            await result.consume()
+        return value
+
+    return profiled_work
+
+
+@lru_cache(maxsize=None)
+def get_query_profiler() -> QueryProfiler:
+    """
+    Retrieve the process-wide query profiler.
+    Profiling is enabled with NEO4J_QUERY_PROFILING and PROFILE plans with NEO4J_PROFILE_PLANS.
+    """
+
+    return QueryProfiler(
+        enabled=os.environ.get("NEO4J_QUERY_PROFILING", "false").lower() == "true",
+        profile_plans=os.environ.get("NEO4J_PROFILE_PLANS", "false").lower() == "true",
+        slow_query_ms=float(os.environ.get("NEO4J_SLOW_QUERY_MS", 500)),
+    )
+
+
+def _get_db_hits(plan: Dict[str, Any]) -> int:
+    return plan.get("dbHits", 0) + sum(
+        _get_db_hits(child) for child in plan.get("children", [])
+    )
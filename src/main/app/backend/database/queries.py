@@ -0,0 +1,374 @@
+LOG_NEW_CONVERSATION = """
+create (c:Conversation)-[:FIRST]->(m:Message)
+set c.id = $convId,
+    c.llm = $llm,
+    c.temperature = $temperature,
+    c.public = toBoolean($public),
+    m.id = $messId,
+    m.content = $content,
+    m.role = $role,
+    m.postTime = coalesce(datetime($postTime), datetime()),
+    m.public = toBoolean($public)
+
+with c, m
+call db.create.setNodeVectorProperty(m, 'embedding', $embedding)
+
+merge (s:Session {id: $sessionId})
+on create set s.createTime = datetime()
+merge (s)-[:HAS_CONVERSATION]->(c)
+"""
+
+LOG_USER = """
+match (pm:Message {id: $prevMessId})
+merge (m:Message {id: $messId})
+set m.content = $content,
+    m.role = $role,
+    m.postTime = coalesce(datetime($postTime), datetime()),
+    m.public = toBoolean($public)
+
+with m, pm
+call db.create.setNodeVectorProperty(m, 'embedding', $embedding)
+
+merge (pm)-[:NEXT]->(m)
+"""
+
+LOG_ASSISTANT = """
+match (pm:Message {id: $prevMessId})
+merge (m:Message {id: $messId})
+set m.content = $content,
+    m.role = $role,
+    m.postTime = datetime(),
+    m.numDocs = $numDocs,
+    m.vectorIndexSearch = true,
+    m.prompt = $prompt,
+    m.public = toBoolean($public),
+    m.resultingSummary = $resultingSummary,
+    m.cachedFrom = $cachedFrom,
+    m.llm = $llm
+
+merge (pm)-[:NEXT]->(m)
+
+with m
+unwind $contextIndices as contextIdx
+match (d:Document)
+where d.index = contextIdx
+
+with m, d
+merge (m)-[:HAS_CONTEXT]->(d)
+"""
+
+RATE_MESSAGE = """
+match (m:Message {id: $messId})
+
+set m.rating = $rating,
+    m.ratingMessage = $message,
+    m.ratedAt = datetime()
+"""
+
+VECTOR_INDEX_SEARCH = """
+CALL db.index.vector.queryNodes('document-embeddings', toInteger($k), $questionEmbedding)
+YIELD node AS vDocs, score
+return vDocs.url as url, vDocs.text as text, vDocs.index as index, score
+"""
+
+TOPIC_VECTOR_INDEX_SEARCH = """
+CALL db.index.vector.queryNodes('topic_group_summary_embeddings', toInteger($k), $questionEmbedding)
+YIELD node AS g, score
+MATCH (g)<-[:IN_GROUP]-()<-[h:HAS_TOPIC]-(vDocs)
+WHERE h.rankAlpha50 <= toInteger($documents_per_topic)
+return vDocs.url as url, vDocs.text as text, vDocs.index as index, score
+"""
+
+GET_MESSAGE_RATING = """
+match (n:Message {id: $id})
+return n.id as id, n.rating as rating, n.ratingMessage as rating_message
+"""
+
+# only the first question of a conversation is a candidate, since a follow-up's answer depends on its conversation
+SEMANTIC_CACHE_LOOKUP = """
+CALL db.index.vector.queryNodes('message-embeddings', toInteger($k), $questionEmbedding)
+YIELD node AS um, score
+WHERE score >= $threshold AND um.role = 'user'
+MATCH (um)-[:NEXT]->(am:Message {role: 'assistant', rating: 'Good'})
+MATCH (c:Conversation)-[:FIRST]->(um)
+WHERE coalesce(am.llm, c.llm) = $llm
+OPTIONAL MATCH (am)-[:HAS_CONTEXT]->(d:Document)
+WITH am, score, collect(d.index) AS contextIndices
+RETURN am.id AS message_id, am.content AS content, score, contextIndices AS context_ids
+ORDER BY score DESC
+LIMIT 1
+"""
+
+CREATE_MESSAGE_EMBEDDINGS_INDEX = """
+CREATE VECTOR INDEX `message-embeddings` IF NOT EXISTS
+FOR (m:Message) ON (m.embedding)
+OPTIONS {indexConfig: {
+    `vector.dimensions`: 768,
+    `vector.similarity_function`: 'cosine'
+}}
+"""
+
+CREATE_DOCUMENT_EMBEDDINGS_INDEX = """
+CREATE VECTOR INDEX `document-embeddings` IF NOT EXISTS
+FOR (d:Document) ON (d.embedding)
+OPTIONS {indexConfig: {
+    `vector.dimensions`: 768,
+    `vector.similarity_function`: 'cosine'
+}}
+"""
+
+CREATE_TOPIC_GROUP_SUMMARY_EMBEDDINGS_INDEX = """
+CREATE VECTOR INDEX `topic_group_summary_embeddings` IF NOT EXISTS
+FOR (g:TopicGroup) ON (g.summaryEmbedding)
+OPTIONS {indexConfig: {
+    `vector.dimensions`: 768,
+    `vector.similarity_function`: 'cosine'
+}}
+"""
+
+CREATE_MESSAGE_ID_CONSTRAINT = """
+CREATE CONSTRAINT `message_id` IF NOT EXISTS
+FOR (m:Message) REQUIRE m.id IS UNIQUE
+"""
+
+CREATE_SESSION_ID_CONSTRAINT = """
+CREATE CONSTRAINT `session_id` IF NOT EXISTS
+FOR (s:Session) REQUIRE s.id IS UNIQUE
+"""
+
+CREATE_CONVERSATION_ID_CONSTRAINT = """
+CREATE CONSTRAINT `conversation_id` IF NOT EXISTS
+FOR (c:Conversation) REQUIRE c.id IS UNIQUE
+"""
+
+CREATE_DOCUMENT_INDEX_INDEX = """
+CREATE RANGE INDEX `document_index` IF NOT EXISTS
+FOR (d:Document) ON (d.index)
+"""
+
+CREATE_MESSAGE_ID_INDEX = """
+CREATE RANGE INDEX `message_id_range` IF NOT EXISTS
+FOR (m:Message) ON (m.id)
+"""
+
+CREATE_SESSION_ID_INDEX = """
+CREATE RANGE INDEX `session_id_range` IF NOT EXISTS
+FOR (s:Session) ON (s.id)
+"""
+
+CREATE_CONVERSATION_ID_INDEX = """
+CREATE RANGE INDEX `conversation_id_range` IF NOT EXISTS
+FOR (c:Conversation) ON (c.id)
+"""
+
+CREATE_MESSAGE_POST_TIME_INDEX = """
+CREATE RANGE INDEX `message_post_time` IF NOT EXISTS
+FOR (m:Message) ON (m.postTime)
+"""
+
+CREATE_MESSAGE_RATED_AT_INDEX = """
+CREATE RANGE INDEX `message_rated_at` IF NOT EXISTS
+FOR (m:Message) ON (m.ratedAt)
+"""
+
+GET_INDEX_STATES = """
+SHOW INDEXES
+YIELD name, state, populationPercent
+WHERE name IN $names
+RETURN name, state, populationPercent
+"""
+
+WARMUP_VECTOR_INDEX = """
+CALL db.index.vector.queryNodes($name, 1, $embedding)
+YIELD node
+RETURN count(node) AS count
+"""
+
+LOG_CONVERSATIONS_BATCH = """
+unwind $conversations as row
+merge (c:Conversation {id: row.convId})
+on create set c.llm = row.llm,
+    c.temperature = row.temperature,
+    c.public = toBoolean(row.public)
+merge (s:Session {id: row.sessionId})
+on create set s.createTime = datetime()
+merge (s)-[:HAS_CONVERSATION]->(c)
+"""
+
+LOG_USER_MESSAGES_BATCH = """
+unwind $messages as row
+merge (m:Message {id: row.messId})
+set m.content = row.content,
+    m.role = 'user',
+    m.postTime = datetime(row.postTime),
+    m.public = toBoolean(row.public)
+
+with m, row
+call db.create.setNodeVectorProperty(m, 'embedding', row.embedding)
+"""
+
+LOG_ASSISTANT_MESSAGES_BATCH = """
+unwind $messages as row
+merge (m:Message {id: row.messId})
+set m.content = row.content,
+    m.role = 'assistant',
+    m.postTime = datetime(row.postTime),
+    m.numDocs = row.numDocs,
+    m.vectorIndexSearch = true,
+    m.prompt = row.prompt,
+    m.public = toBoolean(row.public),
+    m.resultingSummary = row.resultingSummary,
+    m.cachedFrom = row.cachedFrom,
+    m.llm = row.llm
+
+with m, row
+unwind row.contextIndices as contextIdx
+match (d:Document)
+where d.index = contextIdx
+
+with m, d
+merge (m)-[:HAS_CONTEXT]->(d)
+"""
+
+LOG_FIRST_BATCH = """
+unwind $links as row
+match (c:Conversation {id: row.convId})
+match (m:Message {id: row.messId})
+merge (c)-[:FIRST]->(m)
+"""
+
+LOG_NEXT_BATCH = """
+unwind $links as row
+match (pm:Message {id: row.prevMessId})
+match (m:Message {id: row.messId})
+merge (pm)-[:NEXT]->(m)
+"""
+
+GET_DOCUMENT_EMBEDDINGS = """
+match (d:Document)
+where d.embedding is not null
+with d, coalesce(d.createTime.epochMillis, 0) as createTime
+where createTime > $createdAfter
+    or (createTime = $createdAfter and d.index > $afterIndex)
+return d.index as index, d.url as url, d.text as text, d.embedding as embedding, createTime
+order by createTime, index
+limit toInteger($limit)
+"""
+
+GET_CONVERSATION_MEMORY = """
+match (c:Conversation {id: $convId})
+return c.summary as summary, c.recentMessages as recent_messages, c.turnCount as turn_count
+"""
+
+UPDATE_CONVERSATION_MEMORY_BATCH = """
+unwind $memories as row
+match (c:Conversation {id: row.convId})
+where coalesce(c.turnCount, 0) < row.turnCount
+set c.summary = row.summary,
+    c.recentMessages = row.recentMessages,
+    c.turnCount = row.turnCount
+"""
+
+# the indexed key of each label that may be deleted or counted by key
+NODE_KEYS = {
+    "Conversation": "id",
+    "Document": "index",
+    "Message": "id",
+    "Session": "id",
+}
+
+# labels can not be parameters, so these are formatted with a label and key from NODE_KEYS
+DELETE_NODES_BY_KEY = """
+unwind $ids as id
+match (n:{label} {{{key}: id}})
+detach delete n
+"""
+
+DELETE_NODES_BY_KEY_IN_TRANSACTIONS = """
+unwind $ids as id
+call {{
+    with id
+    match (n:{label} {{{key}: id}})
+    detach delete n
+}} in transactions of $batchSize rows
+"""
+
+COUNT_NODES_BY_KEY = """
+unwind $ids as id
+match (n:{label} {{{key}: id}})
+return count(distinct n) as count
+"""
+
+WRITE_NODE_BY_KEY = """
+merge (n:{label} {{{key}: $id}})
+"""
+
+GET_INGESTION_EPOCH = """
+optional match (e:IngestionEpoch {id: 'documents'})
+return coalesce(e.epoch, 0) as epoch
+"""
+
+# one page of messages after the (postTime, id) cursor. the postTime range index serves the seek and the order.
+# only the first message of a conversation is matched to it here. the others inherit it from their previous message
+EXPORT_MESSAGES_PAGE = """
+match (m:Message)
+where m.postTime >= datetime($afterTime)
+    and (m.postTime > datetime($afterTime) or m.id > $afterId)
+    and ($until is null or m.postTime < datetime($until))
+with m
+order by m.postTime, m.id
+limit toInteger($limit)
+optional match (s:Session)-[:HAS_CONVERSATION]->(c:Conversation)-[:FIRST]->(m)
+return m.id as message_id,
+    toString(m.postTime) as post_time,
+    m.postTime.epochMillis as post_time_ms,
+    m.role as role,
+    m.content as content,
+    head([(pm:Message)-[:NEXT]->(m) | pm.id]) as previous_message_id,
+    c.id as conversation_id,
+    s.id as session_id,
+    m.llm as llm,
+    c.llm as conversation_llm,
+    c.temperature as temperature,
+    m.numDocs as number_of_documents,
+    m.cachedFrom as cached_from,
+    [(m)-[:HAS_CONTEXT]->(d:Document) | d.index] as context_ids,
+    m.rating as rating,
+    m.ratingMessage as rating_message,
+    m.public as public
+order by m.postTime, m.id
+"""
+
+# the conversation of each message, found by walking back to the first message of the conversation
+EXPORT_MESSAGE_CONVERSATIONS = """
+unwind $messageIds as messageId
+match (m:Message {id: messageId})
+call {
+    with m
+    match (s:Session)-[:HAS_CONVERSATION]->(c:Conversation)-[:FIRST]->(:Message)-[:NEXT*0..]->(m)
+    return s, c
+    limit 1
+}
+return messageId as message_id,
+    c.id as conversation_id,
+    s.id as session_id,
+    c.llm as conversation_llm,
+    c.temperature as temperature
+"""
+
+# one page of ratings after the (ratedAt, id) cursor. the ratedAt range index serves the seek and the order
+EXPORT_RATINGS_PAGE = """
+match (m:Message)
+where m.ratedAt >= datetime($afterTime)
+    and (m.ratedAt > datetime($afterTime) or m.id > $afterId)
+    and ($until is null or m.ratedAt < datetime($until))
+with m
+order by m.ratedAt, m.id
+limit toInteger($limit)
+return m.id as message_id,
+    toString(m.ratedAt) as rated_at,
+    m.ratedAt.epochMillis as rated_at_ms,
+    m.rating as rating,
+    m.ratingMessage as rating_message
+order by m.ratedAt, m.id
+"""
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from neo4j import AsyncDriver
+
+from database import queries
+from tools.metrics import REGISTRY
+
+EMBEDDING_DIMENSIONS = 768
+
+
+@dataclass(frozen=True)
+class SchemaItem:
+    """
+    An index or constraint the backend relies on.
+    If the statement fails, for example because existing data violates a constraint,
+    then the fallback statement creates the fallback index instead.
+    """
+
+    name: str
+    statement: str
+    fallback_name: Optional[str] = None
+    fallback_statement: Optional[str] = None
+    vector: bool = False
+
+
+# every key that the graph writer merges or matches on, the export cursors and every vector index that is queried
+SCHEMA = [
+    SchemaItem(
+        name="message_id",
+        statement=queries.CREATE_MESSAGE_ID_CONSTRAINT,
+        fallback_name="message_id_range",
+        fallback_statement=queries.CREATE_MESSAGE_ID_INDEX,
+    ),
+    SchemaItem(
+        name="session_id",
+        statement=queries.CREATE_SESSION_ID_CONSTRAINT,
+        fallback_name="session_id_range",
+        fallback_statement=queries.CREATE_SESSION_ID_INDEX,
+    ),
+    SchemaItem(
+        name="conversation_id",
+        statement=queries.CREATE_CONVERSATION_ID_CONSTRAINT,
+        fallback_name="conversation_id_range",
+        fallback_statement=queries.CREATE_CONVERSATION_ID_INDEX,
+    ),
+    SchemaItem(name="document_index", statement=queries.CREATE_DOCUMENT_INDEX_INDEX),
+    SchemaItem(
+        name="message_post_time", statement=queries.CREATE_MESSAGE_POST_TIME_INDEX
+    ),
+    SchemaItem(
+        name="message_rated_at", statement=queries.CREATE_MESSAGE_RATED_AT_INDEX
+    ),
+    SchemaItem(
+        name="document-embeddings",
+        statement=queries.CREATE_DOCUMENT_EMBEDDINGS_INDEX,
+        vector=True,
+    ),
+    SchemaItem(
+        name="topic_group_summary_embeddings",
+        statement=queries.CREATE_TOPIC_GROUP_SUMMARY_EMBEDDINGS_INDEX,
+        vector=True,
+    ),
+    SchemaItem(
+        name="message-embeddings",
+        statement=queries.CREATE_MESSAGE_EMBEDDINGS_INDEX,
+        vector=True,
+    ),
+]
+
+
+class SchemaManager:
+    """
+    Ensure the constraints and indexes of the graph exist and are ONLINE before the backend serves requests.
+    Every statement is idempotent, so this is safe to run on each startup.
+    """
+
+    def __init__(
+        self,
+        driver: AsyncDriver,
+        database_name: Optional[str] = None,
+        schema: List[SchemaItem] = SCHEMA,
+        online_timeout: float = 300.0,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.driver = driver
+        self.database_name = database_name
+        self.schema = schema
+        self.online_timeout = online_timeout
+        self.poll_interval = poll_interval
+
+        self.ready = False
+        self.index_names: List[str] = list()
+        self.index_states: Dict[str, str] = dict()
+        self.bootstrap_seconds = 0.0
+
+    async def bootstrap(self) -> bool:
+        """
+        Create the schema, wait for every index to come ONLINE and warm up the vector indexes.
+        Returns whether the schema is ready.
+        """
+
+        start = time.perf_counter()
+        await self.create_schema()
+        self.ready = await self.await_online()
+        await self.warmup()
+        self.bootstrap_seconds = time.perf_counter() - start
+
+        print(
+            f"schema {'ready' if self.ready else 'not ready'} after {round(self.bootstrap_seconds, 2)} seconds."
+        )
+        return self.ready
+
+    async def create_schema(self) -> None:
+        """
+        Create any missing constraints and indexes.
+        """
+
+        self.index_names = list()
+        for item in self.schema:
+            try:
+                await self._run(item.statement)
+                self.index_names.append(item.name)
+
+            except Exception as err:
+                print(f"unable to create {item.name}: {err}")
+                if item.fallback_statement is None:
+                    continue
+                try:
+                    await self._run(item.fallback_statement)
+                    self.index_names.append(item.fallback_name)
+                except Exception as err:
+                    print(f"unable to create {item.fallback_name}: {err}")
+
+    async def await_online(self) -> bool:
+        """
+        Wait until every created index is ONLINE, or until the timeout passes.
+        Returns False if an index failed or is still populating.
+        """
+
+        deadline = time.monotonic() + self.online_timeout
+        while True:
+            self.index_states = await self.get_index_states()
+            # a name that is not listed was skipped because an equivalent index already exists
+            pending = [
+                name
+                for name in self.index_names
+                if self.index_states.get(name, "ONLINE") != "ONLINE"
+            ]
+            failed = [
+                name for name in pending if self.index_states.get(name) == "FAILED"
+            ]
+
+            if len(failed) > 0:
+                print(f"indexes failed to populate: {failed}")
+                return False
+            if len(pending) == 0:
+                return True
+            if time.monotonic() >= deadline:
+                print(f"indexes still populating after {self.online_timeout} seconds: {pending}")
+                return False
+
+            await asyncio.sleep(self.poll_interval)
+
+    async def get_index_states(self) -> Dict[str, str]:
+        """
+        Retrieve the state of each created index, for example 'POPULATING' or 'ONLINE'.
+        """
+
+        async with self.driver.session(database=self.database_name) as session:
+            result = await session.run(queries.GET_INDEX_STATES, names=self.index_names)
+            records = await result.data()
+
+        return {record["name"]: record["state"] for record in records}
+
+    async def warmup(self) -> None:
+        """
+        Query each ONLINE vector index once, so the first user request does not pay to load it.
+        """
+
+        embedding = [1.0] + [0.0] * (EMBEDDING_DIMENSIONS - 1)
+        for item in self.schema:
+            if not item.vector or self.index_states.get(item.name) != "ONLINE":
+                continue
+            try:
+                await self._run(
+                    queries.WARMUP_VECTOR_INDEX, name=item.name, embedding=embedding
+                )
+            except Exception as err:
+                print(f"unable to warm up {item.name}: {err}")
+
+    def get_stats(self) -> Dict[str, float]:
+        return {
+            "ready": int(self.ready),
+            "indexes": len(self.index_names),
+            "online_indexes": sum(
+                1 for name in self.index_names if self.index_states.get(name) == "ONLINE"
+            ),
+            "bootstrap_seconds": self.bootstrap_seconds,
+        }
+
+    async def _run(self, query: str, **parameters) -> None:
+        async with self.driver.session(database=self.database_name) as session:
+            result = await session.run(query, **parameters)
+            await result.consume()
+
+
+async def bootstrap_schema(
+    driver: AsyncDriver, database_name: Optional[str] = None
+) -> SchemaManager:
+    """
+    Run the schema manager at startup. The wait for indexes may be tuned with SCHEMA_ONLINE_TIMEOUT_SECONDS.
+    """
+
+    schema_manager = SchemaManager(
+        driver=driver,
+        database_name=database_name,
+        online_timeout=float(os.environ.get("SCHEMA_ONLINE_TIMEOUT_SECONDS", 300)),
+    )
+    REGISTRY.register_collector("schema", schema_manager.get_stats)
+    await schema_manager.bootstrap()
+
+    return schema_manager
@@ -0,0 +1,403 @@
+"""
+Export sessions, conversations, messages and ratings from the graph to Parquet.
+
+Messages are streamed from the GraphReader in pages ordered by (postTime, id) and written to Parquet files
+partitioned by post date, so memory is bounded by the page and row group sizes rather than the number of messages.
+Each row is one message, with its session, conversation, LLM settings, previous message, context document indices
+and rating. The files may be read as one dataset, for example with pyarrow.dataset or pandas.read_parquet.
+
+Exports are incremental. The (postTime, id) of the last exported message is kept as a watermark in the
+output directory, and the next export starts after it. Messages posted within the last --lag-seconds are left
+for the next export, since the write-behind log queue may still be writing them.
+Files are hidden until the export completes, so a failed export may simply be run again.
+
+A message row carries the rating it had when it was exported, and a message is usually rated after that.
+Ratings are therefore also exported on their own, ordered by ratedAt with a second watermark, to the
+_ratings directory in rated_date=YYYY-MM-DD partitions. Readers of the message dataset skip it, since it starts
+with '_'. The latest rating of a message is the ratings row with the greatest rated_at, or else the message row's.
+Ratings given before ratedAt was recorded are only exported with their message.
+
+pyarrow is not a dependency of the backend image. Install it before exporting:
+    pip install pyarrow
+
+Run from the backend directory:
+    python3 -m exports.conversation_export --output-dir exports/data
+    python3 -m exports.conversation_export --output-dir exports/data --full
+"""
+
+import argparse
+import json
+import os
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Protocol, Tuple
+
+WATERMARK_FILE = "_watermark.json"
+RATINGS_DIR = "_ratings"
+
+# the time column that the rows of each table are ordered by, and the partition it is written to
+TABLES = {
+    "messages": ("post_time", "post_date"),
+    "ratings": ("rated_at", "rated_date"),
+}
+
+
+@dataclass(frozen=True)
+class ExportWatermark:
+    """
+    The keyset cursors of the last exported message and the last exported rating.
+    post_time and rated_at are as returned by Neo4j, with their full precision.
+    """
+
+    post_time: str = "1970-01-01T00:00:00Z"
+    message_id: str = ""
+    rated_at: str = "1970-01-01T00:00:00Z"
+    rated_message_id: str = ""
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ExportWatermark"]:
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            return cls(**json.load(f))
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp_path, path)
+
+
+class MessageReaderProtocol(Protocol):
+    def stream_messages(
+        self,
+        after_time: str,
+        after_id: str,
+        until: Optional[str] = None,
+        page_size: int = 10_000,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream messages after the cursor and before until, ordered by postTime and id.
+        """
+        pass
+
+    def stream_ratings(
+        self,
+        after_time: str,
+        after_id: str,
+        until: Optional[str] = None,
+        page_size: int = 10_000,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Stream ratings after the cursor and before until, ordered by ratedAt and id.
+        """
+        pass
+
+
+class RowWriterProtocol(Protocol):
+    def write(self, row: Dict[str, Any]) -> None:
+        pass
+
+    def commit(self) -> List[str]:
+        """
+        Publish every file written and return their paths.
+        """
+        pass
+
+    def abort(self) -> None:
+        """
+        Remove every file written.
+        """
+        pass
+
+
+class PartitionedParquetWriter:
+    """
+    Write the rows of a table to Parquet files partitioned by date, such as post_date=YYYY-MM-DD for messages.
+    Rows are buffered up to row_group_size and then written as a row group, and a file is closed
+    once it holds max_rows_per_file rows or the partition changes.
+    Rows arrive in time order, so only one file is open at a time.
+    Files are written with a leading '.', which dataset readers skip, and renamed when the export is committed.
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        export_id: str,
+        table: str = "messages",
+        row_group_size: int = 50_000,
+        max_rows_per_file: int = 1_000_000,
+    ) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "pyarrow is required to export to Parquet. Install it with 'pip install pyarrow'."
+            ) from None
+
+        self._pa = pa
+        self._pq = pq
+        self.time_column, self.partition_column = TABLES[table]
+        if table == "messages":
+            self.schema = pa.schema(
+                [
+                    ("message_id", pa.string()),
+                    ("post_time", pa.timestamp("ms", tz="UTC")),
+                    ("role", pa.string()),
+                    ("content", pa.string()),
+                    ("previous_message_id", pa.string()),
+                    ("conversation_id", pa.string()),
+                    ("session_id", pa.string()),
+                    ("llm", pa.string()),
+                    ("temperature", pa.float64()),
+                    ("number_of_documents", pa.int64()),
+                    ("cached_from", pa.string()),
+                    ("context_ids", pa.list_(pa.string())),
+                    ("rating", pa.string()),
+                    ("rating_message", pa.string()),
+                    ("public", pa.bool_()),
+                ]
+            )
+        else:
+            self.schema = pa.schema(
+                [
+                    ("message_id", pa.string()),
+                    ("rated_at", pa.timestamp("ms", tz="UTC")),
+                    ("rating", pa.string()),
+                    ("rating_message", pa.string()),
+                ]
+            )
+
+        self.output_dir = output_dir
+        self.export_id = export_id
+        self.row_group_size = row_group_size
+        self.max_rows_per_file = max_rows_per_file
+        self.rows = 0
+
+        self._buffer: List[Dict[str, Any]] = list()
+        self._partition: Optional[str] = None
+        self._writer = None
+        self._file_rows = 0
+        self._file_count = 0
+        # (hidden path, final path) of every file written
+        self._files: List[Tuple[str, str]] = list()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        partition = row[self.time_column][:10]
+        if partition != self._partition or self._file_rows >= self.max_rows_per_file:
+            self._close_file()
+            self._partition = partition
+
+        self._buffer.append(
+            {**row, self.time_column: row[self.time_column + "_ms"]}
+        )
+        self._file_rows += 1
+        self.rows += 1
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def commit(self) -> List[str]:
+        self._close_file()
+        for hidden_path, path in self._files:
+            os.replace(hidden_path, path)
+
+        return [path for _, path in self._files]
+
+    def abort(self) -> None:
+        self._buffer = list()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for hidden_path, _ in self._files:
+            if os.path.exists(hidden_path):
+                os.remove(hidden_path)
+
+    def _flush(self) -> None:
+        if len(self._buffer) == 0:
+            return
+
+        if self._writer is None:
+            directory = os.path.join(
+                self.output_dir, f"{self.partition_column}={self._partition}"
+            )
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{self.export_id}-{self._file_count:05d}.parquet"
+            hidden_path = os.path.join(directory, "." + name)
+            self._files.append((hidden_path, os.path.join(directory, name)))
+            self._file_count += 1
+            self._writer = self._pq.ParquetWriter(hidden_path, self.schema)
+
+        self._writer.write_table(
+            self._pa.Table.from_pylist(self._buffer, schema=self.schema)
+        )
+        self._buffer = list()
+
+    def _close_file(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._file_rows = 0
+
+
+def export_messages(
+    reader: MessageReaderProtocol,
+    writer: RowWriterProtocol,
+    watermark: Optional[ExportWatermark] = None,
+    until: Optional[str] = None,
+    page_size: int = 10_000,
+) -> Optional[ExportWatermark]:
+    """
+    Stream every message after the watermark and before until into the writer, then commit the written files.
+    Returns the watermark of the last exported message, or the given watermark if there were no new messages.
+    If the export fails, then the written files are removed.
+    """
+
+    after = watermark or ExportWatermark()
+    last = _write_rows(
+        reader.stream_messages(
+            after_time=after.post_time,
+            after_id=after.message_id,
+            until=until,
+            page_size=page_size,
+        ),
+        writer,
+    )
+    if last is None:
+        return watermark
+
+    return replace(after, post_time=last["post_time"], message_id=last["message_id"])
+
+
+def export_ratings(
+    reader: MessageReaderProtocol,
+    writer: RowWriterProtocol,
+    watermark: Optional[ExportWatermark] = None,
+    until: Optional[str] = None,
+    page_size: int = 10_000,
+) -> Optional[ExportWatermark]:
+    """
+    Stream every rating after the watermark and before until into the writer, then commit the written files.
+    Returns the watermark of the last exported rating, or the given watermark if there were no new ratings.
+    If the export fails, then the written files are removed.
+    """
+
+    after = watermark or ExportWatermark()
+    last = _write_rows(
+        reader.stream_ratings(
+            after_time=after.rated_at,
+            after_id=after.rated_message_id,
+            until=until,
+            page_size=page_size,
+        ),
+        writer,
+    )
+    if last is None:
+        return watermark
+
+    return replace(after, rated_at=last["rated_at"], rated_message_id=last["message_id"])
+
+
+def _write_rows(
+    rows: Iterator[Dict[str, Any]], writer: RowWriterProtocol
+) -> Optional[Dict[str, Any]]:
+    """
+    Write every row and commit the written files. Returns the last row, if any.
+    """
+
+    last = None
+    try:
+        for row in rows:
+            writer.write(row)
+            last = row
+
+    except BaseException:
+        writer.abort()
+        raise
+
+    writer.commit()
+    return last
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Export conversations to Parquet. Ratings given after a message was exported "
+        f"are exported to the {RATINGS_DIR} directory."
+    )
+    parser.add_argument("--output-dir", required=True, help="The Parquet dataset directory.")
+    parser.add_argument(
+        "--full", action="store_true", help="Ignore the watermark and export every message and rating."
+    )
+    parser.add_argument("--page-size", type=int, default=10_000, help="Messages read per transaction.")
+    parser.add_argument("--row-group-size", type=int, default=50_000, help="Rows per Parquet row group.")
+    parser.add_argument("--rows-per-file", type=int, default=1_000_000, help="Rows per Parquet file.")
+    parser.add_argument(
+        "--lag-seconds",
+        type=float,
+        default=300,
+        help="Leave messages posted and ratings given within this many seconds for the next export.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Optional[ExportWatermark]:
+    from database.communicator import GraphReader
+
+    args = parse_args(argv)
+    os.makedirs(args.output_dir, exist_ok=True)
+    watermark_path = os.path.join(args.output_dir, WATERMARK_FILE)
+
+    started = datetime.now(timezone.utc)
+    watermark = None if args.full else ExportWatermark.load(watermark_path)
+    until = (started - timedelta(seconds=args.lag_seconds)).isoformat()
+    writer = PartitionedParquetWriter(
+        output_dir=args.output_dir,
+        export_id=started.strftime("%Y%m%dT%H%M%S"),
+        row_group_size=args.row_group_size,
+        max_rows_per_file=args.rows_per_file,
+    )
+    ratings_writer = PartitionedParquetWriter(
+        output_dir=os.path.join(args.output_dir, RATINGS_DIR),
+        export_id=started.strftime("%Y%m%dT%H%M%S"),
+        table="ratings",
+        row_group_size=args.row_group_size,
+        max_rows_per_file=args.rows_per_file,
+    )
+
+    print(f"exporting messages and ratings after {watermark} and before {until}.")
+    reader = GraphReader()
+    try:
+        new_watermark = export_messages(
+            reader=reader,
+            writer=writer,
+            watermark=watermark,
+            until=until,
+            page_size=args.page_size,
+        )
+        # the message watermark is saved first, so a failed ratings export does not export the messages again
+        if new_watermark is not None:
+            new_watermark.save(watermark_path)
+
+        new_watermark = export_ratings(
+            reader=reader,
+            writer=ratings_writer,
+            watermark=new_watermark,
+            until=until,
+            page_size=args.page_size,
+        )
+        if new_watermark is not None:
+            new_watermark.save(watermark_path)
+    finally:
+        reader.close_driver()
+
+    print(
+        f"exported {writer.rows} messages and {ratings_writer.rows} ratings in "
+        f"{round((datetime.now(timezone.utc) - started).total_seconds(), 2)} seconds. watermark: {new_watermark}"
+    )
+    return new_watermark
+
+
+if __name__ == "__main__":
+    main()
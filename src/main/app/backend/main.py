@@ -1,9 +1,67 @@
-from fastapi import FastAPI
+import os
+import time
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers import llm, rating
+from database import drivers
+from database.async_communicator import (
+    AsyncGraphReader,
+    AsyncGraphWriter,
+    init_shared_async_driver,
+)
+from database.log_queue import close_shared_log_queue, init_shared_log_queue
+from database.schema import bootstrap_schema
+from routers import admin, llm, metrics, rating
+from tools.llm import configure_langsmith, get_llm_client_registry
+from tools.metrics import (
+    REQUEST_DURATION,
+    REQUESTS,
+    reset_request_id,
+    set_request_id,
+)
+from tools.secret_manager import get_backend_secret_ids, get_secret_manager
+from tools.vector_index import (
+    close_shared_local_vector_index,
+    init_shared_local_vector_index,
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Prefetch secrets, create the process-wide async Neo4j driver, ensure the graph schema is ONLINE
+    and warm up the LLM clients on startup.
+    Flush the conversation log queue, stop the local vector index and close the driver on shutdown.
+    """
+
+    sm = get_secret_manager()
+    await sm.aprefetch(get_backend_secret_ids())
+    configure_langsmith(secret_manager=sm)
+    driver = await init_shared_async_driver(secret_manager=sm)
+    try:
+        await bootstrap_schema(driver=driver, database_name=drivers.get_shared_database())
+    except Exception as err:
+        print(f"unable to bootstrap the graph schema: {err}")
+    writer = AsyncGraphWriter(driver=driver, database_name=drivers.get_shared_database())
+    init_shared_log_queue(writer=writer)
+    warmup_models = os.environ.get("LLM_WARMUP_MODELS")
+    if warmup_models:
+        get_llm_client_registry().warmup(
+            llm_types=[m.strip() for m in warmup_models.split(",")]
+        )
+    await init_shared_local_vector_index(
+        reader=AsyncGraphReader(driver=driver, database_name=drivers.get_shared_database())
+    )
+    yield
+    await close_shared_log_queue()
+    await close_shared_local_vector_index()
+    await drivers.close_shared_async_driver()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",
@@ -21,5 +79,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """
+    Tag the request with an id, so its stages can be traced in the logs, and record its latency.
+    A caller-provided X-Request-ID header is reused.
+    """
+
+    request_id = request.headers.get("X-Request-ID", str(uuid4()))
+    token = set_request_id(request_id)
+    start = time.perf_counter()
+    status = "500"
+    try:
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        status = str(response.status_code)
+        return response
+    finally:
+        path = get_route_path(request)
+        REQUESTS.inc(path=path, status=status)
+        REQUEST_DURATION.observe(time.perf_counter() - start, path=path)
+        reset_request_id(token)
+
+
+def get_route_path(request: Request) -> str:
+    """
+    Return the path template of the route that served the request, such as /rating/{message_id},
+    so metric labels are bounded by the number of routes. Requests that match no route are 'unmatched'.
+    """
+
+    route = request.scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+app.include_router(admin.router)
 app.include_router(llm.router)
+app.include_router(metrics.router)
 app.include_router(rating.router)
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+@dataclass(frozen=True, slots=True)
+class ContextDocument:
+    """
+    Contains a document retrieved from the graph to be used as LLM context.
+    """
+
+    url: str
+    text: str
+    index: str
+    score: Optional[float] = None
+
+    def to_record(self, fields: Tuple[str, ...] = ("url", "text")) -> Dict[str, Any]:
+        """
+        Return the requested fields as a dictionary.
+        """
+
+        return {field: getattr(self, field) for field in fields}
+
+
+class ContextSet(Sequence[ContextDocument]):
+    """
+    An immutable, ordered collection of context documents.
+    """
+
+    __slots__ = ("_documents",)
+
+    def __init__(self, documents: Iterable[ContextDocument] = ()) -> None:
+        self._documents: Tuple[ContextDocument, ...] = tuple(documents)
+
+    @classmethod
+    def from_records(cls, records: Iterable[Sequence[Any]]) -> "ContextSet":
+        """
+        Build a context set from (url, text, index[, score]) rows, such as Neo4j result values.
+        """
+
+        return cls(ContextDocument(*record) for record in records)
+
+    @property
+    def indices(self) -> List[str]:
+        """
+        The indices of the documents, in order.
+        """
+
+        return [document.index for document in self._documents]
+
+    def to_records(
+        self, fields: Tuple[str, ...] = ("url", "text")
+    ) -> List[Dict[str, Any]]:
+        """
+        Return the requested fields of each document as a list of dictionaries.
+        """
+
+        return [document.to_record(fields) for document in self._documents]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return ContextSet(self._documents[i])
+        return self._documents[i]
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __iter__(self) -> Iterator[ContextDocument]:
+        return iter(self._documents)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, ContextSet) and self._documents == other._documents
+
+    def __repr__(self) -> str:
+        return f"ContextSet({list(self._documents)!r})"
@@ -0,0 +1,44 @@
+from typing import List
+
+from pydantic import BaseModel, Field, field_validator
+
+
+class ConversationMemory(BaseModel):
+    """
+    Contains the rolling summary and the most recent messages of a conversation.
+    This is stored on the Conversation node and updated after each assistant message.
+    """
+
+    summary: str = Field(
+        default="",
+        description="A summary of the conversation turns that are no longer in the recent window.",
+    )
+    recent_messages: List[str] = Field(
+        default=[],
+        description="The most recent messages, alternating between user and assistant, oldest first.",
+    )
+    turn_count: int = Field(
+        default=0, ge=0, description="The number of turns in the conversation."
+    )
+
+    @field_validator("recent_messages")
+    def validate_recent_messages(cls, v: List[str]) -> List[str]:
+        if len(v) % 2 != 0:
+            raise ValueError("recent_messages must hold whole user and assistant turns.")
+        return v
+
+    def is_empty(self) -> bool:
+        return self.summary == "" and len(self.recent_messages) == 0
+
+    def to_prompt(self) -> str:
+        """
+        Render the memory for the LLM prompt.
+        """
+
+        lines = list()
+        if self.summary != "":
+            lines.append(f"Summary: {self.summary}")
+        for i, message in enumerate(self.recent_messages):
+            lines.append(f"{'User' if i % 2 == 0 else 'Assistant'}: {message}")
+
+        return "\n".join(lines)
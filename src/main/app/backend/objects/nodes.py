@@ -1,4 +1,5 @@
-from typing import List, Dict, Union
+from datetime import datetime
+from typing import List, Dict, Optional, Union
 from uuid import uuid4
 
 from pydantic import BaseModel, Field, field_validator
@@ -28,6 +29,10 @@ class UserMessage(BaseModel):
     public: bool = Field(
         description="Whether the question is from the public facing app or not."
     )
+    post_time: Optional[datetime] = Field(
+        default=None,
+        description="When the question was received. The time it is logged if None.",
+    )
 
     @field_validator("message_id")
     def validate_message_id(cls, v: str) -> str:
@@ -79,6 +84,14 @@ class AssistantMessage(BaseModel):
     temperature: float = Field(
         default=0.0, ge=0.0, le=1.0, description="Temperature parameter for the LLM."
     )
+    cached_from: Optional[str] = Field(
+        default=None,
+        description="The ID of the rated assistant message this response was reused from, if any.",
+    )
+    llm_type: Optional[str] = Field(
+        default=None,
+        description="The LLM that generated the response. This is the fallback model if the conversation LLM was too busy.",
+    )
 
     @field_validator("message_id")
     def validate_message_id(cls, v: str) -> str:
@@ -32,6 +32,14 @@ class Question(BaseModel):
     temperature: float = Field(
         default=0.0, ge=0.0, le=1.0, description="Temperature parameter for the LLM."
     )
+    retrieval_mode: str = Field(
+        default="vector",
+        description="How context is retrieved. Must be 'vector', 'topic', 'hybrid' or 'local'.",
+    )
+    use_cache: bool = Field(
+        default=True,
+        description="Whether a well rated answer to a near-duplicate question may be reused. Questions with a message history are follow-ups and are never answered from the cache.",
+    )
 
     @field_validator("message_history")
     def validate_message_history(cls, v: List[str]) -> List[str]:
@@ -42,6 +50,14 @@ class Question(BaseModel):
                 assert v[i].startswith("llm-")
         return v
 
+    @field_validator("retrieval_mode")
+    def validate_retrieval_mode(cls, v: str) -> str:
+        if v.lower() not in ["vector", "topic", "hybrid", "local"]:
+            raise ValueError(
+                "retrieval_mode must be one of the following: ['vector', 'topic', 'hybrid', 'local']."
+            )
+        return v.lower()
+
     @field_validator("llm_type")
     def validate_llm_type(cls, v: str) -> str:
         if v.lower() not in VALID_MODELS:
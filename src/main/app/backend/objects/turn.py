@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from pydantic import BaseModel, Field
+
+from objects.memory import ConversationMemory
+from objects.nodes import UserMessage, AssistantMessage
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ConversationTurn(BaseModel):
+    """
+    Contains a user message and the assistant reply to it, ready to be logged to the graph.
+    """
+
+    user_message: UserMessage = Field(description="The user message.")
+    assistant_message: AssistantMessage = Field(
+        description="The assistant reply to the user message."
+    )
+    previous_message_id: Optional[str] = Field(
+        default=None,
+        description="The ID of the message preceding the user message. None if this turn starts a new conversation.",
+    )
+    llm_type: str = Field(description="The LLM used in the conversation.")
+    temperature: float = Field(
+        default=0.0, ge=0.0, le=1.0, description="Temperature parameter for the LLM."
+    )
+    context_ids: List[str] = Field(
+        default=[], description="The indices of the documents used as context."
+    )
+    assistant_post_time: datetime = Field(
+        default_factory=_now, description="When the assistant reply was posted."
+    )
+    previous_memory: ConversationMemory = Field(
+        default_factory=ConversationMemory,
+        description="The conversation memory before this turn.",
+    )
+    memory: Optional[ConversationMemory] = Field(
+        default=None,
+        description="The conversation memory after this turn. None until it is computed.",
+    )
@@ -12,3 +12,16 @@ prompt_no_context_template = """
                     2. Use your knowledge to answer the user question.
                     3. Return your answer with sources if possible.
                               """
+
+conversation_history_template = """
+                    The conversation so far:
+                    {conversation_history}
+                              """
+
+summary_template = """
+                    Update the conversation summary with the latest turn. Keep the topics, named entities and any decisions.
+                    Respond with the new summary only, in at most {max_words} words.
+                    Current summary: {summary}
+                    User: {user}
+                    Assistant: {assistant}
+                              """
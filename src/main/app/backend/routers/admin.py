@@ -0,0 +1,41 @@
+import os
+import secrets
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from database.profiler import get_query_profiler
+
+router = APIRouter(prefix="/admin")
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """
+    Require the X-Admin-Token header to match ADMIN_TOKEN.
+    The admin endpoints are disabled if ADMIN_TOKEN is not set.
+    """
+
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+@router.get("/queries", dependencies=[Depends(verify_admin_token)])
+def get_query_report() -> Dict[str, Any]:
+    """
+    Report the latency percentiles, update counters and plans of each profiled Neo4j query
+    along with the recent slow queries of this worker.
+    """
+
+    return get_query_profiler().get_report()
+
+
+@router.delete("/queries", dependencies=[Depends(verify_admin_token)])
+def reset_query_report() -> None:
+    """
+    Clear the profiled query statistics of this worker.
+    """
+
+    get_query_profiler().reset()
@@ -0,0 +1,47 @@
+from typing import Optional
+
+from database import drivers
+from database.async_communicator import AsyncGraphReader, AsyncGraphWriter
+from database.log_queue import ConversationLogQueue, get_shared_log_queue
+from tools.retrieval_cache import get_retrieval_cache
+from tools.vector_index import LocalVectorIndex, get_shared_local_vector_index
+
+
+def get_reader() -> AsyncGraphReader:
+    """
+    Provide an AsyncGraphReader that borrows sessions from the process-wide async driver.
+    Context retrieval is served from the process-wide retrieval cache where possible.
+    """
+
+    return AsyncGraphReader(
+        driver=drivers.get_shared_async_driver(),
+        database_name=drivers.get_shared_database(),
+        retrieval_cache=get_retrieval_cache(),
+    )
+
+
+def get_writer() -> AsyncGraphWriter:
+    """
+    Provide an AsyncGraphWriter that borrows sessions from the process-wide async driver.
+    """
+
+    return AsyncGraphWriter(
+        driver=drivers.get_shared_async_driver(),
+        database_name=drivers.get_shared_database(),
+    )
+
+
+def get_log_queue() -> Optional[ConversationLogQueue]:
+    """
+    Provide the process-wide write-behind log queue, or None if conversations are logged directly.
+    """
+
+    return get_shared_log_queue()
+
+
+def get_local_vector_index() -> Optional[LocalVectorIndex]:
+    """
+    Provide the process-wide local vector index, or None if it is not enabled.
+    """
+
+    return get_shared_local_vector_index()
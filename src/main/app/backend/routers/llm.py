@@ -1,42 +1,75 @@
+import asyncio
+import json
 import os
-from typing import List, Dict, Union, Tuple
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List, Dict, Optional, Union, Tuple
 from uuid import uuid4
 
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
-from database.communicator import GraphReader, GraphWriter
+from database.async_communicator import AsyncGraphReader, AsyncGraphWriter
+from database.log_queue import ConversationLogQueue
+from objects.context import ContextSet
+from objects.memory import ConversationMemory
 from objects.question import Question
 from objects.response import Response
 from objects.nodes import UserMessage, AssistantMessage
+from objects.turn import ConversationTurn
 from resources.prompts.prompts import prompt_no_context_template, prompt_template
-from tools.embedding import TextEmbeddingService, EmbeddingServiceProtocol
+from routers.dependencies import (
+    get_local_vector_index,
+    get_log_queue,
+    get_reader,
+    get_writer,
+)
+from tools.circuit_breaker import DependencyUnavailableError, get_circuit_breaker
+from tools.embedding import (
+    BatchingEmbeddingService,
+    CachedEmbeddingService,
+    EmbeddingServiceProtocol,
+    TextEmbeddingService,
+)
 from tools.llm import LLM
-from tools.secret_manager import SecretManager
+from tools.llm_scheduler import LLMQueueTimeoutError
+from tools.memory import get_summarizer, get_window_turns, update_memory
+from tools.metrics import REGISTRY, span
+from tools.retrieval import retrieve_context
+from tools.semantic_cache import SemanticCache
+from tools.vector_index import LocalVectorIndex
 
 PUBLIC = True
+RETRIEVAL_FALLBACK_TIMEOUT = float(os.environ.get("RETRIEVAL_FALLBACK_MS", 1000)) / 1000
 
-sm = SecretManager()
 router = APIRouter()
 
 
-def get_reader():
-    reader = GraphReader(secret_manager=sm)
-    try:
-        yield reader
-    finally:
-        reader.close_driver()
-
-
-def get_writer():
-    writer = GraphWriter(secret_manager=sm)
-    try:
-        yield writer
-    finally:
-        writer.close_driver()
+@lru_cache(maxsize=None)
+def get_embedding_service() -> EmbeddingServiceProtocol:
+    batching_service = BatchingEmbeddingService(
+        embedding_service=TextEmbeddingService(),
+        max_batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", 5)),
+        max_wait_ms=float(os.environ.get("EMBEDDING_BATCH_WAIT_MS", 10)),
+    )
+    cached_service = CachedEmbeddingService(
+        embedding_service=batching_service,
+        max_size=int(os.environ.get("EMBEDDING_CACHE_SIZE", 10_000)),
+        cache_path=os.environ.get("EMBEDDING_CACHE_PATH"),
+    )
+    REGISTRY.register_collector("embedding_batcher", batching_service.get_stats)
+    REGISTRY.register_collector("embedding_cache", cached_service.get_stats)
+    return cached_service
 
 
-def get_embedding_service() -> EmbeddingServiceProtocol:
-    return TextEmbeddingService()
+@lru_cache(maxsize=None)
+def get_semantic_cache() -> SemanticCache:
+    semantic_cache = SemanticCache(
+        similarity_threshold=float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", 0.97))
+    )
+    REGISTRY.register_collector("semantic_cache", semantic_cache.get_stats)
+    return semantic_cache
 
 
 def get_llm(question: Question) -> LLM:
@@ -91,32 +124,71 @@ async def get_response(question: Question) -> Response:
 async def get_response(
     question: Question,
     background_tasks: BackgroundTasks,
-    reader: GraphReader = Depends(get_reader),
-    writer: GraphWriter = Depends(get_writer),
+    reader: AsyncGraphReader = Depends(get_reader),
+    writer: AsyncGraphWriter = Depends(get_writer),
     embedding_service: EmbeddingServiceProtocol = Depends(get_embedding_service),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache),
+    log_queue: Optional[ConversationLogQueue] = Depends(get_log_queue),
+    local_index: Optional[LocalVectorIndex] = Depends(get_local_vector_index),
     llm: LLM = Depends(get_llm),
 ) -> Response:
     """
     Gather context from the graph and retrieve a response from the designated LLM endpoint.
+    A well rated answer to a near-duplicate question is reused unless the question opts out of the cache
+    or continues a conversation.
+    If the graph is unavailable, then the question is answered without context.
+    If the embedding service or the LLM is unavailable, then a 503 is returned without waiting on it.
     """
 
-    question_embedding = embedding_service.get_embedding(text=question.question)
-    print("got embedding...")
-    context = reader.retrieve_context_documents(
-        question_embedding=question_embedding,
-        number_of_context_documents=question.number_of_documents,
+    received_at = datetime.now(timezone.utc)
+    question_embedding, memory = await asyncio.gather(
+        embed_question(question, embedding_service),
+        load_conversation_memory(question, reader),
     )
-    # print(context)
-    print("context retrieved...")
-    # llm = LLM(llm_type=question.llm_type, temperature=question.temperature)
-    print("llm initialized...")
+    if not memory.is_empty():
+        question.conversation_history = memory.to_prompt()
     user_id: str = "user-" + str(uuid4())
     assistant_id: str = "llm-" + str(uuid4())
-    llm_response = llm.get_response(
-        question=question, context=context, user_id=user_id, assistant_id=assistant_id
-    )
-    print("response retrieved...")
-    print(llm_response)
+
+    cached_answer = None
+    # a follow-up depends on the conversation, so a near-duplicate from another conversation is not an answer to it.
+    # the memory of the previous turn may not be written yet, so follow-ups are told apart by the message history
+    if question.use_cache and len(question.message_history) == 0:
+        cached_answer = await lookup_cached_answer(
+            question, question_embedding, reader, semantic_cache
+        )
+
+    if cached_answer is not None:
+        content = cached_answer["content"]
+        context_ids = cached_answer["context_ids"]
+        prompt = get_prompt(context=context_ids)
+        cached_from = cached_answer["message_id"]
+        served_llm_type = None
+
+    else:
+        reject_if_llm_unavailable(llm)
+        context = await retrieve_question_context(
+            question, question_embedding, reader, local_index
+        )
+        # print(context)
+        # llm = LLM(llm_type=question.llm_type, temperature=question.temperature)
+        try:
+            with span("llm"):
+                llm_response = await llm.aget_response(
+                    question=question,
+                    context=context,
+                    user_id=user_id,
+                    assistant_id=assistant_id,
+                )
+        except (LLMQueueTimeoutError, DependencyUnavailableError) as err:
+            raise HTTPException(status_code=503, detail=str(err))
+        print(llm_response)
+        content = llm_response.content
+        context_ids = llm.packed_context.indices
+        prompt = get_prompt(context=llm.packed_context)
+        cached_from = None
+        served_llm_type = llm.served_llm_type
+
     user_message = UserMessage(
         session_id=question.session_id,
         conversation_id=question.conversation_id,
@@ -124,79 +196,382 @@ async def get_response(
         content=question.question,
         embedding=question_embedding,
         public=PUBLIC,
+        post_time=received_at,
     )
 
     assistant_message = AssistantMessage(
         session_id=question.session_id,
         conversation_id=question.conversation_id,
         message_id=assistant_id,
-        prompt=get_prompt(context=context),
-        content=llm_response.content,
+        prompt=prompt,
+        content=content,
         public=PUBLIC,
         vector_index_search=True,
         number_of_documents=question.number_of_documents,
         temperature=question.temperature,
+        cached_from=cached_from,
+        llm_type=served_llm_type,
     )
 
-    background_tasks.add_task(
-        log_user_message,
-        user_message,
-        question.message_history,
-        question.llm_type,
-        question.temperature,
-        writer,
-    )
-    background_tasks.add_task(
-        log_assistant_message,
-        assistant_message,
-        user_message.message_id,
-        list(context["index"]),
-        writer,
+    turn = ConversationTurn(
+        user_message=user_message,
+        assistant_message=assistant_message,
+        previous_message_id=(
+            question.message_history[-1] if len(question.message_history) > 0 else None
+        ),
+        llm_type=question.llm_type,
+        temperature=question.temperature,
+        context_ids=context_ids,
+        previous_memory=memory,
     )
+    background_tasks.add_task(log_conversation_turn, turn, writer, log_queue)
     print("returning...")
     return Response(
         session_id=question.session_id,
         conversation_id=question.conversation_id,
-        content=llm_response.content,
+        content=content,
         message_history=question.message_history
         + [user_message.message_id, assistant_message.message_id],
     )
 
 
-def log_user_message(
+@router.post("/llm/stream")
+async def get_streaming_response(
+    question: Question,
+    reader: AsyncGraphReader = Depends(get_reader),
+    writer: AsyncGraphWriter = Depends(get_writer),
+    embedding_service: EmbeddingServiceProtocol = Depends(get_embedding_service),
+    semantic_cache: SemanticCache = Depends(get_semantic_cache),
+    log_queue: Optional[ConversationLogQueue] = Depends(get_log_queue),
+    local_index: Optional[LocalVectorIndex] = Depends(get_local_vector_index),
+    llm: LLM = Depends(get_llm),
+) -> StreamingResponse:
+    """
+    Gather context from the graph and stream a response from the designated LLM endpoint as server-sent events.
+    Each token is sent as a 'token' event and the final 'response' event carries the Response.
+    A cached answer is sent as a single 'token' event.
+    If the LLM is over capacity, failing or too slow, then an 'error' event is sent instead of the response.
+    The conversation is logged to the graph once the stream completes.
+    """
+
+    received_at = datetime.now(timezone.utc)
+    question_embedding, memory = await asyncio.gather(
+        embed_question(question, embedding_service),
+        load_conversation_memory(question, reader),
+    )
+    if not memory.is_empty():
+        question.conversation_history = memory.to_prompt()
+    user_id: str = "user-" + str(uuid4())
+    assistant_id: str = "llm-" + str(uuid4())
+    tokens: List[str] = list()
+    failed = False
+
+    cached_answer = None
+    # a follow-up depends on the conversation, so a near-duplicate from another conversation is not an answer to it.
+    # the memory of the previous turn may not be written yet, so follow-ups are told apart by the message history
+    if question.use_cache and len(question.message_history) == 0:
+        cached_answer = await lookup_cached_answer(
+            question, question_embedding, reader, semantic_cache
+        )
+
+    if cached_answer is not None:
+
+        async def stream_tokens():
+            yield cached_answer["content"]
+
+    else:
+        reject_if_llm_unavailable(llm)
+        context = await retrieve_question_context(
+            question, question_embedding, reader, local_index
+        )
+
+        def stream_tokens():
+            return llm.astream_response(
+                question=question,
+                context=context,
+                user_id=user_id,
+                assistant_id=assistant_id,
+            )
+
+    async def stream_events():
+        nonlocal failed
+        try:
+            with span("llm_stream"):
+                async for token in stream_tokens():
+                    tokens.append(token)
+                    yield format_event("token", {"content": token})
+        except (LLMQueueTimeoutError, DependencyUnavailableError) as err:
+            failed = True
+            yield format_event("error", {"detail": str(err)})
+            return
+
+        response = Response(
+            session_id=question.session_id,
+            conversation_id=question.conversation_id,
+            content="".join(tokens),
+            message_history=question.message_history + [user_id, assistant_id],
+        )
+        yield format_event("response", response.model_dump())
+
+    async def log_streamed_messages() -> None:
+        if failed:
+            return
+
+        # the context is packed by the LLM as the stream starts
+        if cached_answer is not None:
+            context_ids = cached_answer["context_ids"]
+            prompt = get_prompt(context=context_ids)
+        else:
+            context_ids = llm.packed_context.indices
+            prompt = get_prompt(context=llm.packed_context)
+
+        user_message = UserMessage(
+            session_id=question.session_id,
+            conversation_id=question.conversation_id,
+            message_id=user_id,
+            content=question.question,
+            embedding=question_embedding,
+            public=PUBLIC,
+            post_time=received_at,
+        )
+        assistant_message = AssistantMessage(
+            session_id=question.session_id,
+            conversation_id=question.conversation_id,
+            message_id=assistant_id,
+            prompt=prompt,
+            content="".join(tokens),
+            public=PUBLIC,
+            vector_index_search=True,
+            number_of_documents=question.number_of_documents,
+            temperature=question.temperature,
+            cached_from=(
+                cached_answer["message_id"] if cached_answer is not None else None
+            ),
+            llm_type=llm.served_llm_type if cached_answer is None else None,
+        )
+
+        turn = ConversationTurn(
+            user_message=user_message,
+            assistant_message=assistant_message,
+            previous_message_id=(
+                question.message_history[-1]
+                if len(question.message_history) > 0
+                else None
+            ),
+            llm_type=question.llm_type,
+            temperature=question.temperature,
+            context_ids=context_ids,
+            previous_memory=memory,
+        )
+        await log_conversation_turn(turn, writer, log_queue)
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        background=BackgroundTask(log_streamed_messages),
+    )
+
+
+def format_event(event: str, data: Dict) -> str:
+    """
+    Format a server-sent event.
+    """
+
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def embed_question(
+    question: Question, embedding_service: EmbeddingServiceProtocol
+) -> List[float]:
+    """
+    Embed the question within the embedding deadline.
+    The embedding is logged with the user message, so the request fails fast if it can not be created.
+    """
+
+    with span("embedding"):
+        try:
+            return await get_circuit_breaker("embedding").call(
+                lambda: embedding_service.aget_embedding(text=question.question)
+            )
+        except Exception as err:
+            print(f"unable to embed the question: {err}")
+            raise HTTPException(
+                status_code=503, detail="The embedding service is unavailable."
+            )
+
+
+async def lookup_cached_answer(
+    question: Question,
+    question_embedding: List[float],
+    reader: AsyncGraphReader,
+    semantic_cache: SemanticCache,
+) -> Optional[Dict]:
+    """
+    Look up a cached answer within the graph reader deadline. If the graph is unavailable, then it is a miss.
+    """
+
+    with span("semantic_cache"):
+        try:
+            return await get_circuit_breaker("graph_reader").call(
+                lambda: semantic_cache.lookup(
+                    reader=reader,
+                    question_embedding=question_embedding,
+                    llm_type=question.llm_type,
+                )
+            )
+        except DependencyUnavailableError as err:
+            print(f"skipping the semantic cache: {err}")
+            return None
+
+
+async def retrieve_question_context(
+    question: Question,
+    question_embedding: List[float],
+    reader: AsyncGraphReader,
+    local_index: Optional[LocalVectorIndex] = None,
+) -> ContextSet:
+    """
+    Retrieve context within the graph reader deadline.
+    If the graph is failing or too slow, then no context is returned and the no context prompt is used.
+    A retrieval mode that is not enabled, such as 'local' without a local vector index, is a 400.
+    """
+
+    with span("retrieval"):
+        try:
+            return await get_circuit_breaker("graph_reader").call(
+                lambda: retrieve_context(
+                    reader=reader,
+                    question_embedding=question_embedding,
+                    retrieval_mode=question.retrieval_mode,
+                    number_of_documents=question.number_of_documents,
+                    local_index=local_index,
+                    fallback_timeout=RETRIEVAL_FALLBACK_TIMEOUT,
+                ),
+                ignored_exceptions=(ValueError,),
+            )
+        except ValueError as err:
+            raise HTTPException(status_code=400, detail=str(err))
+        except Exception as err:
+            print(f"unable to retrieve context. answering without context: {err}")
+            return ContextSet()
+
+
+def reject_if_llm_unavailable(llm: LLM) -> None:
+    """
+    Fail fast, before retrieving context, if the circuit breaker of the LLM is open.
+    """
+
+    if get_circuit_breaker("llm", llm.llm_type).is_open:
+        raise HTTPException(
+            status_code=503, detail=f"{llm.llm_type} is unavailable. Please try again later."
+        )
+
+
+async def load_conversation_memory(
+    question: Question, reader: AsyncGraphReader
+) -> ConversationMemory:
+    """
+    Retrieve the memory of an ongoing conversation. A new conversation has no memory.
+    If the memory can not be read within the graph reader deadline, then the question is answered without it.
+    """
+
+    if len(question.message_history) == 0:
+        return ConversationMemory()
+
+    with span("conversation_memory"):
+        try:
+            return await get_circuit_breaker("graph_reader").call(
+                lambda: reader.get_conversation_memory(question.conversation_id)
+            )
+        except Exception as err:
+            print(f"unable to retrieve the conversation memory: {err}")
+            return ConversationMemory()
+
+
+async def log_conversation_turn(
+    turn: ConversationTurn,
+    writer: AsyncGraphWriter,
+    log_queue: Optional[ConversationLogQueue] = None,
+) -> None:
+    """
+    Log a user message and the assistant reply in the graph.
+    The conversation memory is updated with the turn and written along with the assistant reply.
+    If the write-behind log queue is enabled, then the turn is queued to be written in a batch.
+    """
+
+    with span("memory_update"):
+        try:
+            turn.memory = await update_memory(
+                memory=turn.previous_memory,
+                user_message=turn.user_message.content,
+                assistant_message=turn.assistant_message.content,
+                summarizer=get_summarizer(),
+                window_turns=get_window_turns(),
+            )
+        except Exception as err:
+            print(f"unable to update the conversation memory: {err}")
+
+    if log_queue is not None:
+        await log_queue.put(turn)
+
+    else:
+        with span("log_write"):
+            await log_user_message(
+                turn.user_message,
+                (
+                    [turn.previous_message_id]
+                    if turn.previous_message_id is not None
+                    else []
+                ),
+                turn.llm_type,
+                turn.temperature,
+                writer,
+            )
+            await log_assistant_message(
+                turn.assistant_message,
+                turn.user_message.message_id,
+                turn.context_ids,
+                writer,
+                turn.memory,
+            )
+
+
+async def log_user_message(
     message: UserMessage,
     message_history: List[str],
     llm_type: str,
     temperature: float,
-    writer: GraphWriter,
+    writer: AsyncGraphWriter,
 ) -> None:
     """
     Log a user message in the graph. If this is the first message, then also log the conversation and session.
     """
 
     if len(message_history) == 0:
-        writer.log_new_conversation(
+        await writer.log_new_conversation(
             message=message, llm_type=llm_type, temperature=temperature
         )
 
     else:
-        writer.log_user(message=message, previous_message_id=message_history[-1])
+        await writer.log_user(message=message, previous_message_id=message_history[-1])
 
 
-def log_assistant_message(
+async def log_assistant_message(
     message: AssistantMessage,
     previous_message_id: str,
     context_ids: List[str],
-    writer: GraphWriter,
+    writer: AsyncGraphWriter,
+    memory: Optional[ConversationMemory] = None,
 ) -> None:
     """
-    Log an assistant message in the graph.
+    Log an assistant message in the graph, along with the updated conversation memory.
     """
 
-    writer.log_assistant(
+    await writer.log_assistant(
         message=message,
         previous_message_id=previous_message_id,
         context_ids=context_ids,
+        memory=memory,
     )
 
 
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from tools.metrics import REGISTRY
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> str:
+    """
+    Export the latency histograms, token counters and cache statistics of this worker
+    in the Prometheus text format.
+    """
+
+    return REGISTRY.render()
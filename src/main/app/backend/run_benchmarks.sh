@@ -0,0 +1 @@
+python3 -m benchmarks.llm_benchmark "$@"
\ No newline at end of file
@@ -0,0 +1 @@
+python3 -m exports.conversation_export "$@"
\ No newline at end of file
@@ -1,6 +1,11 @@
 import unittest
 
-mods = ["test_graph_reader", "test_graph_writer"]
+mods = [
+    "test_async_communicator",
+    "test_drivers",
+    "test_graph_reader",
+    "test_graph_writer",
+]
 # initialize the test suite
 loader = unittest.TestLoader()
 suite = unittest.TestSuite()
@@ -0,0 +1,132 @@
+import os
+import unittest
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from database import drivers
+from database.async_communicator import (
+    AsyncGraphReader,
+    AsyncGraphWriter,
+    init_shared_async_driver,
+)
+from database.communicator import GraphReader, GraphWriter
+from objects.nodes import UserMessage, AssistantMessage
+from objects.rating import Rating
+from objects.turn import ConversationTurn
+from resources.prompts.prompts import prompt_no_context_template
+from tools.secret_manager import SecretManager
+
+test_ids = {
+    "session_id": "s-123-async-test",
+    "conversation_id": "conv-123-async-test",
+    "assistant_id": "llm-123-async-test",
+    "user_id": "user-123-async-test",
+    "second_user_id": "user-456-async-test",
+    "second_assistant_id": "llm-456-async-test",
+}
+test_nodes = {
+    "Session": [test_ids["session_id"]],
+    "Conversation": [test_ids["conversation_id"]],
+    "Message": [
+        test_ids["user_id"],
+        test_ids["assistant_id"],
+        test_ids["second_user_id"],
+        test_ids["second_assistant_id"],
+    ],
+}
+
+
+class TestAsyncCommunicator(unittest.IsolatedAsyncioTestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        assert (
+            os.environ.get("DATABASE_TYPE") == "dev"
+        ), f"Current db is {os.environ.get('DATABASE_TYPE')}. Please change to dev for testing."
+        cls.embedder = FakeEmbeddings(size=768)
+        cls.sm = SecretManager()
+
+    async def asyncSetUp(self) -> None:
+        driver = await init_shared_async_driver(secret_manager=self.sm)
+        self.reader = AsyncGraphReader(
+            driver=driver, database_name=drivers.get_shared_database()
+        )
+        self.writer = AsyncGraphWriter(
+            driver=driver, database_name=drivers.get_shared_database()
+        )
+
+    async def asyncTearDown(self) -> None:
+        await drivers.close_shared_async_driver()
+
+    async def test_standard_context_retrieval(self) -> None:
+        context = await self.reader.retrieve_context_documents(
+            question_embedding=self.embedder.embed_query("What is gds?"),
+            number_of_context_documents=5,
+        )
+        self.assertEqual(len(context), 5)
+
+    async def test_rate_message(self) -> None:
+        gw = GraphWriter(secret_manager=self.sm)
+        gw.write_dummy_node(id=test_ids["assistant_id"], label="Message")
+
+        r = Rating(
+            session_id=test_ids["session_id"],
+            conversation_id=test_ids["conversation_id"],
+            message_id=test_ids["assistant_id"],
+            value="Good",
+            message="good job.",
+        )
+        bookmarks = await self.writer.rate_message(r)
+        r_in_graph = await self.reader.get_message_rating(
+            assistant_message_id=test_ids["assistant_id"], bookmarks=bookmarks
+        )
+
+        gw.delete_nodes({"Message": [test_ids["assistant_id"]]})
+        gw.close_driver()
+
+        self.assertEqual(r_in_graph[1], r.value)
+        self.assertEqual(r_in_graph[2], r.message)
+
+    async def test_log_conversation_turns(self) -> None:
+        def make_turn(user_id, assistant_id, previous_message_id=None):
+            return ConversationTurn(
+                user_message=UserMessage(
+                    session_id=test_ids["session_id"],
+                    conversation_id=test_ids["conversation_id"],
+                    message_id=user_id,
+                    content="test content",
+                    embedding=self.embedder.embed_query("test content"),
+                    public=False,
+                ),
+                assistant_message=AssistantMessage(
+                    session_id=test_ids["session_id"],
+                    conversation_id=test_ids["conversation_id"],
+                    message_id=assistant_id,
+                    prompt=prompt_no_context_template,
+                    content="test content",
+                    public=False,
+                ),
+                previous_message_id=previous_message_id,
+                llm_type="gemini",
+            )
+
+        await self.writer.log_conversation_turns(
+            [
+                make_turn(test_ids["user_id"], test_ids["assistant_id"]),
+                make_turn(
+                    test_ids["second_user_id"],
+                    test_ids["second_assistant_id"],
+                    previous_message_id=test_ids["assistant_id"],
+                ),
+            ]
+        )
+
+        gr = GraphReader(secret_manager=self.sm)
+        num_nodes = sum(gr.count_nodes(test_nodes).values())
+        gr.close_driver()
+
+        gw = GraphWriter(secret_manager=self.sm)
+        gw.delete_nodes(test_nodes)
+        gw.close_driver()
+
+        self.assertEqual(num_nodes, len(test_ids))
@@ -0,0 +1,155 @@
+import asyncio
+import time
+import unittest
+
+from tools.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    DependencyUnavailableError,
+)
+
+
+async def succeed() -> str:
+    return "ok"
+
+
+async def fail() -> str:
+    raise ConnectionError("unavailable")
+
+
+async def stall() -> str:
+    await asyncio.sleep(1)
+    return "late"
+
+
+async def stream_tokens():
+    for token in ["GDS ", "is ", "cool."]:
+        yield token
+
+
+async def stall_stream():
+    yield "GDS "
+    await asyncio.sleep(1)
+    yield "is "
+
+
+async def collect(breaker: CircuitBreaker, work) -> list:
+    return [token async for token in breaker.stream(work)]
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_success(self) -> None:
+        breaker = CircuitBreaker(name="test")
+
+        self.assertEqual(asyncio.run(breaker.call(succeed)), "ok")
+        self.assertEqual(breaker.get_stats()["state"], 0)
+        self.assertEqual(breaker.get_stats()["calls"], 1)
+
+    def test_deadline(self) -> None:
+        breaker = CircuitBreaker(name="test", timeout=0.01)
+
+        start = time.perf_counter()
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(breaker.call(stall))
+
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(breaker.timeouts, 1)
+        self.assertEqual(breaker.consecutive_failures, 1)
+
+    def test_opens_after_consecutive_failures(self) -> None:
+        breaker = CircuitBreaker(name="test", failure_threshold=2)
+
+        for _ in range(2):
+            with self.assertRaises(DependencyUnavailableError):
+                asyncio.run(breaker.call(fail))
+
+        self.assertTrue(breaker.is_open)
+        with self.assertRaises(CircuitOpenError):
+            asyncio.run(breaker.call(succeed))
+        self.assertEqual(breaker.get_stats()["state"], 2)
+        self.assertEqual(breaker.rejections, 1)
+        self.assertEqual(breaker.opened, 1)
+
+    def test_success_resets_failures(self) -> None:
+        breaker = CircuitBreaker(name="test", failure_threshold=2)
+
+        with self.assertRaises(DependencyUnavailableError):
+            asyncio.run(breaker.call(fail))
+        asyncio.run(breaker.call(succeed))
+        with self.assertRaises(DependencyUnavailableError):
+            asyncio.run(breaker.call(fail))
+
+        self.assertFalse(breaker.is_open)
+
+    def test_failures_are_wrapped(self) -> None:
+        breaker = CircuitBreaker(name="test")
+
+        with self.assertRaises(DependencyUnavailableError) as context:
+            asyncio.run(breaker.call(fail))
+
+        self.assertIsInstance(context.exception.__cause__, ConnectionError)
+
+    def test_ignored_exceptions(self) -> None:
+        breaker = CircuitBreaker(name="test", failure_threshold=1)
+
+        with self.assertRaises(ConnectionError):
+            asyncio.run(breaker.call(fail, ignored_exceptions=(ConnectionError,)))
+
+        self.assertFalse(breaker.is_open)
+        self.assertEqual(breaker.failures, 0)
+
+    def test_half_open_trial(self) -> None:
+        breaker = CircuitBreaker(name="test", failure_threshold=1, reset_timeout=0.01)
+
+        with self.assertRaises(DependencyUnavailableError):
+            asyncio.run(breaker.call(fail))
+        time.sleep(0.02)
+        self.assertFalse(breaker.is_open)
+
+        # a failed trial opens the breaker again
+        with self.assertRaises(DependencyUnavailableError):
+            asyncio.run(breaker.call(fail))
+        self.assertTrue(breaker.is_open)
+
+        time.sleep(0.02)
+        self.assertEqual(asyncio.run(breaker.call(succeed)), "ok")
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.opened, 2)
+
+    def test_half_open_rejects_concurrent_calls(self) -> None:
+        breaker = CircuitBreaker(name="test", failure_threshold=1, reset_timeout=0.01)
+
+        with self.assertRaises(DependencyUnavailableError):
+            asyncio.run(breaker.call(fail))
+        time.sleep(0.02)
+
+        async def call_concurrently():
+            return await asyncio.gather(
+                breaker.call(lambda: asyncio.sleep(0.01, "ok")),
+                breaker.call(succeed),
+                return_exceptions=True,
+            )
+
+        trial, rejected = asyncio.run(call_concurrently())
+
+        self.assertEqual(trial, "ok")
+        self.assertIsInstance(rejected, CircuitOpenError)
+        self.assertEqual(breaker.state, "closed")
+
+    def test_stream(self) -> None:
+        breaker = CircuitBreaker(name="test")
+
+        self.assertEqual(
+            asyncio.run(collect(breaker, stream_tokens)), ["GDS ", "is ", "cool."]
+        )
+        self.assertEqual(breaker.consecutive_failures, 0)
+
+    def test_stream_deadline(self) -> None:
+        breaker = CircuitBreaker(name="test", timeout=0.05, failure_threshold=1)
+
+        with self.assertRaises(DeadlineExceededError):
+            asyncio.run(collect(breaker, stall_stream))
+
+        self.assertTrue(breaker.is_open)
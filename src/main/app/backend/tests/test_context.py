@@ -0,0 +1,44 @@
+import unittest
+from dataclasses import FrozenInstanceError
+
+from objects.context import ContextDocument, ContextSet
+
+
+class TestContext(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.rows = [
+            ["http://a", "text a", "a", 0.9],
+            ["http://b", "text b", "b", 0.8],
+        ]
+
+    def test_from_records(self) -> None:
+        context = ContextSet.from_records(self.rows)
+
+        self.assertEqual(len(context), 2)
+        self.assertEqual(context.indices, ["a", "b"])
+        self.assertEqual(context[0].score, 0.9)
+        self.assertEqual(
+            context.to_records(),
+            [{"url": "http://a", "text": "text a"}, {"url": "http://b", "text": "text b"}],
+        )
+
+    def test_empty(self) -> None:
+        context = ContextSet.from_records([])
+
+        self.assertEqual(len(context), 0)
+        self.assertEqual(context.indices, [])
+
+    def test_immutable(self) -> None:
+        document = ContextDocument(url="http://a", text="text a", index="a")
+
+        with self.assertRaises(FrozenInstanceError):
+            document.text = "new text"
+        self.assertFalse(hasattr(document, "__dict__"))
+
+    def test_slice(self) -> None:
+        context = ContextSet.from_records(self.rows)
+
+        self.assertIsInstance(context[:1], ContextSet)
+        self.assertEqual(context[:1].indices, ["a"])
@@ -0,0 +1,93 @@
+import unittest
+
+from objects.context import ContextDocument, ContextSet
+from tools.context_packer import (
+    ContextPacker,
+    ModelBudget,
+    get_context_packer,
+    render_context,
+)
+
+
+def make_document(index: str, text: str, score: float = None) -> ContextDocument:
+    return ContextDocument(url=f"http://{index}", text=text, index=index, score=score)
+
+
+class TestContextPacker(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_order_by_score(self) -> None:
+        packer = get_context_packer("gpt-4 32k")
+        context = ContextSet(
+            [
+                make_document("a", "Graph algorithms find communities.", 0.7),
+                make_document("b", "Vector indexes speed up similarity search.", 0.9),
+            ]
+        )
+
+        self.assertEqual(packer.pack(context).indices, ["b", "a"])
+
+    def test_unscored_documents_keep_retrieval_order(self) -> None:
+        packer = get_context_packer("gpt-4 32k")
+        context = ContextSet(
+            [
+                make_document("a", "Graph algorithms find communities."),
+                make_document("b", "Vector indexes speed up similarity search.", 0.9),
+            ]
+        )
+
+        self.assertEqual(packer.pack(context).indices, ["a", "b"])
+
+    def test_near_duplicates_are_dropped(self) -> None:
+        packer = get_context_packer("gpt-4 32k")
+        text = "The Graph Data Science library provides over sixty graph algorithms for Neo4j."
+        context = ContextSet(
+            [
+                make_document("a", text, 0.9),
+                make_document("b", text.upper() + " ", 0.8),
+                make_document("c", "Cypher is a declarative graph query language.", 0.7),
+            ]
+        )
+
+        self.assertEqual(packer.pack(context).indices, ["a", "c"])
+
+    def test_tail_is_trimmed_to_budget(self) -> None:
+        packer = ContextPacker(
+            budget=ModelBudget(context_window=300, max_output_tokens=100),
+            min_document_tokens=10,
+        )
+        context = ContextSet(
+            make_document(str(i), f"document {i} " + "word " * 100, 1 - i / 10)
+            for i in range(5)
+        )
+
+        packed = packer.pack(context, reserved_tokens=50)
+        rendered_tokens = packer.token_counter.count(render_context(packed))
+
+        self.assertEqual(packed.indices, ["0", "1"])
+        self.assertLess(len(packed[1].text), len(context[1].text))
+        self.assertLessEqual(rendered_tokens, 150 + 1)
+
+    def test_small_models_get_less_context(self) -> None:
+        context = ContextSet(
+            make_document(str(i), f"document {i} " + "word " * 1_000, None)
+            for i in range(10)
+        )
+
+        small = get_context_packer("chat-bison 2k").pack(context)
+        large = get_context_packer("gpt-4 32k").pack(context)
+
+        self.assertLess(len(small), len(large))
+        self.assertEqual(len(large), 10)
+
+    def test_render_context(self) -> None:
+        context = ContextSet([make_document("a", "Some text.")])
+
+        self.assertEqual(render_context(context), "\n[1] http://a\nSome text.\n---\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,286 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+from typing import Any, Dict, List
+
+from database import queries
+from database.communicator import GraphReader
+from exports.conversation_export import (
+    ExportWatermark,
+    PartitionedParquetWriter,
+    export_messages,
+    export_ratings,
+)
+
+
+def make_message(
+    day: int,
+    second: int,
+    message_id: str,
+    previous_message_id: str = None,
+    conversation_id: str = None,
+) -> Dict[str, Any]:
+    """
+    Only the first message of a conversation is returned with its conversation.
+    """
+
+    return {
+        "message_id": message_id,
+        "post_time": f"2024-05-0{day}T12:00:0{second}.123456789Z",
+        "post_time_ms": 1714564800000 + day * 86_400_000 + second * 1000,
+        "role": "user",
+        "content": "What is GDS?",
+        "previous_message_id": previous_message_id,
+        "conversation_id": conversation_id,
+        "session_id": "s-1" if conversation_id is not None else None,
+        "llm": None,
+        "conversation_llm": "chat-bison 2k" if conversation_id is not None else None,
+        "temperature": 0.7 if conversation_id is not None else None,
+        "number_of_documents": None,
+        "cached_from": None,
+        "context_ids": [],
+        "rating": None,
+        "rating_message": None,
+        "public": True,
+    }
+
+
+MESSAGES = [
+    make_message(1, 1, "user-a", conversation_id="conv-1"),
+    make_message(1, 1, "user-b", conversation_id="conv-2"),
+    make_message(1, 2, "llm-a", previous_message_id="user-a"),
+    make_message(2, 1, "user-c", previous_message_id="llm-a"),
+    make_message(2, 2, "llm-c", previous_message_id="user-c"),
+]
+
+RATINGS = [
+    {
+        "message_id": "llm-a",
+        "rated_at": f"2024-05-03T12:00:0{second}.123456789Z",
+        "rated_at_ms": 1714737600000 + second * 1000,
+        "rating": rating,
+        "rating_message": None,
+    }
+    for second, rating in [(1, "Good"), (2, "Bad")]
+]
+
+
+class TransactionMock:
+    def __init__(self, pages: List[Dict[str, Any]], walks: List[List[str]]) -> None:
+        self.pages = pages
+        self.walks = walks
+
+    def run(self, query: str, **parameters) -> "TransactionMock":
+        if query == queries.EXPORT_MESSAGE_CONVERSATIONS:
+            self.walks.append(parameters["messageIds"])
+            self.rows = [
+                {
+                    "message_id": message_id,
+                    "conversation_id": "conv-1",
+                    "session_id": "s-1",
+                    "conversation_llm": "chat-bison 2k",
+                    "temperature": 0.7,
+                }
+                for message_id in parameters["messageIds"]
+            ]
+            return self
+
+        self.pages.append(parameters)
+        rows, time_key = (
+            (RATINGS, "rated_at")
+            if query == queries.EXPORT_RATINGS_PAGE
+            else (MESSAGES, "post_time")
+        )
+        after = (parameters["afterTime"], parameters["afterId"])
+        self.rows = [
+            dict(m)
+            for m in rows
+            if (m[time_key], m["message_id"]) > after
+            and (parameters["until"] is None or m[time_key] < parameters["until"])
+        ][: parameters["limit"]]
+        return self
+
+    def data(self) -> List[Dict[str, Any]]:
+        return self.rows
+
+
+class SessionMock:
+    def __init__(self, pages: List[Dict[str, Any]], walks: List[List[str]]) -> None:
+        self.pages = pages
+        self.walks = walks
+
+    def __enter__(self) -> "SessionMock":
+        return self
+
+    def __exit__(self, *args) -> None:
+        pass
+
+    def execute_read(self, work):
+        return work(TransactionMock(self.pages, self.walks))
+
+
+class DriverMock:
+    def __init__(self) -> None:
+        self.pages = list()
+        self.walks = list()
+
+    def session(self, **config) -> SessionMock:
+        return SessionMock(self.pages, self.walks)
+
+
+class RowWriterMock:
+    def __init__(self) -> None:
+        self.rows = list()
+        self.committed = False
+        self.aborted = False
+
+    def write(self, row: Dict[str, Any]) -> None:
+        self.rows.append(row)
+
+    def commit(self) -> List[str]:
+        self.committed = True
+        return []
+
+    def abort(self) -> None:
+        self.aborted = True
+
+
+class FailingReaderMock:
+    def stream_messages(self, after_time: str, after_id: str, until=None, page_size=10_000):
+        yield MESSAGES[0]
+        raise ConnectionError("Neo4j is unavailable.")
+
+
+class TestConversationExport(unittest.TestCase):
+
+    def test_stream_messages_pages(self) -> None:
+        driver = DriverMock()
+        reader = GraphReader(driver=driver, database_name="neo4j")
+
+        rows = list(reader.stream_messages(page_size=2))
+
+        self.assertEqual([r["message_id"] for r in rows], [m["message_id"] for m in MESSAGES])
+        self.assertEqual(len(driver.pages), 3)
+        # each page starts after the last message of the previous page
+        self.assertEqual(driver.pages[1]["afterTime"], MESSAGES[1]["post_time"])
+        self.assertEqual(driver.pages[1]["afterId"], "user-b")
+
+    def test_conversations_are_inherited(self) -> None:
+        driver = DriverMock()
+        reader = GraphReader(driver=driver, database_name="neo4j")
+
+        rows = list(reader.stream_messages(page_size=3))
+
+        self.assertEqual(
+            [r["conversation_id"] for r in rows],
+            ["conv-1", "conv-2", "conv-1", "conv-1", "conv-1"],
+        )
+        self.assertEqual({r["llm"] for r in rows}, {"chat-bison 2k"})
+        self.assertNotIn("conversation_llm", rows[0])
+        # every previous message was seen, so no conversation is walked
+        self.assertEqual(driver.walks, [])
+
+        # an incremental export has not seen the previous messages, so the path is walked once per page
+        rows = list(
+            reader.stream_messages(
+                after_time=MESSAGES[2]["post_time"], after_id="llm-a", page_size=3
+            )
+        )
+
+        self.assertEqual([r["conversation_id"] for r in rows], ["conv-1", "conv-1"])
+        self.assertEqual(driver.walks, [["user-c"]])
+
+    def test_export_is_incremental(self) -> None:
+        reader = GraphReader(driver=DriverMock(), database_name="neo4j")
+        writer = RowWriterMock()
+
+        watermark = export_messages(
+            reader, writer, until="2024-05-02T00:00:00Z", page_size=2
+        )
+        self.assertEqual(len(writer.rows), 3)
+        self.assertTrue(writer.committed)
+        self.assertEqual(watermark, ExportWatermark(MESSAGES[2]["post_time"], "llm-a"))
+
+        writer = RowWriterMock()
+        next_watermark = export_messages(reader, writer, watermark=watermark, page_size=2)
+        self.assertEqual([r["message_id"] for r in writer.rows], ["user-c", "llm-c"])
+        self.assertEqual(next_watermark.message_id, "llm-c")
+
+        writer = RowWriterMock()
+        self.assertEqual(
+            export_messages(reader, writer, watermark=next_watermark), next_watermark
+        )
+        self.assertEqual(len(writer.rows), 0)
+
+    def test_ratings_are_exported_after_their_messages(self) -> None:
+        reader = GraphReader(driver=DriverMock(), database_name="neo4j")
+        writer = RowWriterMock()
+        watermark = ExportWatermark(MESSAGES[-1]["post_time"], "llm-c")
+
+        rating_watermark = export_ratings(reader, writer, watermark=watermark)
+
+        self.assertEqual([r["rating"] for r in writer.rows], ["Good", "Bad"])
+        self.assertTrue(writer.committed)
+        self.assertEqual(rating_watermark.rated_at, RATINGS[-1]["rated_at"])
+        self.assertEqual(rating_watermark.rated_message_id, "llm-a")
+        # the message watermark is kept
+        self.assertEqual(rating_watermark.message_id, "llm-c")
+
+        writer = RowWriterMock()
+        self.assertEqual(
+            export_ratings(reader, writer, watermark=rating_watermark), rating_watermark
+        )
+        self.assertEqual(len(writer.rows), 0)
+
+    def test_failed_export_is_aborted(self) -> None:
+        writer = RowWriterMock()
+
+        with self.assertRaises(ConnectionError):
+            export_messages(FailingReaderMock(), writer)
+
+        self.assertTrue(writer.aborted)
+        self.assertFalse(writer.committed)
+
+    def test_watermark_round_trip(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "_watermark.json")
+            self.assertIsNone(ExportWatermark.load(path))
+
+            watermark = ExportWatermark(MESSAGES[0]["post_time"], "user-a")
+            watermark.save(path)
+
+            self.assertEqual(ExportWatermark.load(path), watermark)
+
+            # a watermark saved before ratings were exported starts the ratings from the beginning
+            with open(path, "w") as f:
+                f.write('{"post_time": "2024-05-01T12:00:01Z", "message_id": "user-a"}')
+            self.assertEqual(
+                ExportWatermark.load(path).rated_at, ExportWatermark().rated_at
+            )
+
+    @unittest.skipUnless(importlib.util.find_spec("pyarrow"), "pyarrow is not installed.")
+    def test_partitioned_parquet_writer(self) -> None:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        partitioning = ds.partitioning(pa.schema([("post_date", pa.string())]), flavor="hive")
+        with tempfile.TemporaryDirectory() as directory:
+            writer = PartitionedParquetWriter(
+                directory, "test", row_group_size=2, max_rows_per_file=2
+            )
+            for message in MESSAGES:
+                writer.write(message)
+
+            # files are hidden until the export is committed
+            self.assertEqual(ds.dataset(directory, partitioning=partitioning).count_rows(), 0)
+            paths = writer.commit()
+
+            table = ds.dataset(directory, partitioning=partitioning).to_table()
+
+        self.assertEqual(len(paths), 3)
+        self.assertEqual(table.num_rows, len(MESSAGES))
+        self.assertEqual(
+            sorted(set(table.column("post_date").to_pylist())),
+            ["2024-05-01", "2024-05-02"],
+        )
@@ -0,0 +1,112 @@
+import os
+import unittest
+from unittest import mock
+
+from neo4j import READ_ACCESS, WRITE_ACCESS
+
+from database import drivers
+from database.communicator import GraphReader, GraphWriter
+
+
+class DriverMock:
+    def __init__(self) -> None:
+        self.closed = False
+        self.sessions = list()
+
+    def session(self, **config) -> None:
+        self.sessions.append(config)
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class TestDrivers(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def tearDown(self) -> None:
+        drivers._shared_driver = None
+        drivers._shared_database = None
+
+    def test_pool_config_defaults(self) -> None:
+        with mock.patch.dict(os.environ, {}, clear=True):
+            config = drivers.get_pool_config()
+
+        self.assertEqual(config["max_connection_pool_size"], 100)
+        self.assertEqual(config["connection_acquisition_timeout"], 60.0)
+
+    def test_pool_config_from_env(self) -> None:
+        with mock.patch.dict(
+            os.environ,
+            {
+                "NEO4J_MAX_CONNECTION_POOL_SIZE": "25",
+                "NEO4J_CONNECTION_ACQUISITION_TIMEOUT": "5",
+            },
+        ):
+            config = drivers.get_pool_config()
+
+        self.assertEqual(config["max_connection_pool_size"], 25)
+        self.assertEqual(config["connection_acquisition_timeout"], 5.0)
+
+    def test_routing_uri(self) -> None:
+        with mock.patch.dict(os.environ, {}, clear=True):
+            self.assertEqual(
+                drivers.get_routing_uri("bolt://localhost:7687"), "neo4j://localhost:7687"
+            )
+            self.assertEqual(
+                drivers.get_routing_uri("bolt+s://db.example.com"), "neo4j+s://db.example.com"
+            )
+            self.assertEqual(
+                drivers.get_routing_uri("neo4j+s://db.example.com"), "neo4j+s://db.example.com"
+            )
+
+        with mock.patch.dict(os.environ, {"NEO4J_ROUTING": "false"}):
+            self.assertEqual(
+                drivers.get_routing_uri("bolt://localhost:7687"), "bolt://localhost:7687"
+            )
+
+    def test_shared_driver_not_initialized(self) -> None:
+        with self.assertRaises(RuntimeError):
+            drivers.get_shared_driver()
+
+    def test_shared_driver_created_once(self) -> None:
+        with mock.patch.object(
+            drivers, "init_driver", return_value=DriverMock()
+        ) as init:
+            first = drivers.init_shared_driver("neo4j://x", "neo4j", "pw", "neo4j")
+            second = drivers.init_shared_driver("neo4j://x", "neo4j", "pw", "neo4j")
+
+        self.assertIs(first, second)
+        self.assertEqual(init.call_count, 1)
+        self.assertEqual(drivers.get_shared_database(), "neo4j")
+
+        drivers.close_shared_driver()
+        self.assertTrue(first.closed)
+        with self.assertRaises(RuntimeError):
+            drivers.get_shared_driver()
+
+    def test_borrowed_driver_is_not_closed(self) -> None:
+        driver = DriverMock()
+
+        gr = GraphReader(driver=driver, database_name="neo4j")
+        gw = GraphWriter(driver=driver, database_name="neo4j")
+        gr.close_driver()
+        gw.close_driver()
+
+        self.assertIs(gr.driver, driver)
+        self.assertEqual(gw.database_name, "neo4j")
+        self.assertFalse(driver.closed)
+
+    def test_session_access_modes(self) -> None:
+        driver = DriverMock()
+
+        GraphReader(driver=driver, database_name="neo4j")._read_session(
+            bookmarks="bookmarks"
+        )
+        GraphWriter(driver=driver, database_name="neo4j")._write_session()
+
+        self.assertEqual(driver.sessions[0]["default_access_mode"], READ_ACCESS)
+        self.assertEqual(driver.sessions[0]["bookmarks"], "bookmarks")
+        self.assertEqual(driver.sessions[1]["default_access_mode"], WRITE_ACCESS)
@@ -0,0 +1,194 @@
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from typing import List
+
+from tools.embedding import BatchingEmbeddingService, CachedEmbeddingService
+
+
+class CountingEmbeddingService:
+    model_name = "counting"
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def get_embedding(self, text: str) -> List[float]:
+        self.calls += 1
+        return [float(len(text)), 0.5, 0.25]
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+
+class TestCachedEmbeddingService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_normalized_hit(self) -> None:
+        inner = CountingEmbeddingService()
+        service = CachedEmbeddingService(embedding_service=inner)
+
+        first = service.get_embedding("What is GDS?")
+        second = service.get_embedding("  what   is gds? ")
+
+        self.assertEqual(first, second)
+        self.assertEqual(inner.calls, 1)
+        self.assertEqual(service.get_stats()["hits"], 1)
+        self.assertEqual(service.get_stats()["misses"], 1)
+
+    def test_async_hit(self) -> None:
+        inner = CountingEmbeddingService()
+        service = CachedEmbeddingService(embedding_service=inner)
+
+        asyncio.run(service.aget_embedding("What is GDS?"))
+        asyncio.run(service.aget_embedding("What is GDS?"))
+
+        self.assertEqual(inner.calls, 1)
+
+    def test_lru_eviction(self) -> None:
+        inner = CountingEmbeddingService()
+        service = CachedEmbeddingService(embedding_service=inner, max_size=2)
+
+        service.get_embedding("a")
+        service.get_embedding("b")
+        service.get_embedding("a")
+        service.get_embedding("c")  # evicts b, the least recently used
+        service.get_embedding("a")
+        service.get_embedding("b")
+
+        self.assertEqual(inner.calls, 4)
+        self.assertEqual(service.get_stats()["evictions"], 2)
+
+    def test_disk_cache_survives_restart(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.sqlite")
+
+            inner = CountingEmbeddingService()
+            service = CachedEmbeddingService(embedding_service=inner, cache_path=path)
+            embedding = service.get_embedding("What is GDS?")
+            service.close()
+
+            restarted = CachedEmbeddingService(embedding_service=inner, cache_path=path)
+            self.assertEqual(restarted.get_embedding("What is GDS?"), embedding)
+            self.assertEqual(inner.calls, 1)
+            self.assertEqual(restarted.get_stats()["disk_hits"], 1)
+            restarted.close()
+
+    def test_async_disk_cache_runs_off_the_event_loop(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "embeddings.sqlite")
+            inner = CountingEmbeddingService()
+            service = CachedEmbeddingService(embedding_service=inner, cache_path=path)
+
+            disk_threads = set()
+            lookup_disk, store_disk = service._lookup_disk, service._store_disk
+
+            def record(method):
+                def wrapper(*args):
+                    disk_threads.add(threading.get_ident())
+                    return method(*args)
+
+                return wrapper
+
+            service._lookup_disk = record(lookup_disk)
+            service._store_disk = record(store_disk)
+
+            async def run() -> int:
+                await service.aget_embedding("What is GDS?")
+                service._memory.clear()
+                await service.aget_embedding("What is GDS?")
+                return threading.get_ident()
+
+            loop_thread = asyncio.run(run())
+            service.close()
+
+            self.assertEqual(inner.calls, 1)
+            self.assertEqual(service.get_stats()["disk_hits"], 1)
+            self.assertGreater(len(disk_threads), 0)
+            self.assertNotIn(loop_thread, disk_threads)
+
+
+class BatchCountingEmbeddingService(CountingEmbeddingService):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.batches: List[List[str]] = list()
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(texts)
+        return [self.get_embedding(text) for text in texts]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.get_embeddings(texts)
+
+
+class TestBatchingEmbeddingService(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_concurrent_calls_are_coalesced(self) -> None:
+        inner = BatchCountingEmbeddingService()
+        service = BatchingEmbeddingService(
+            embedding_service=inner, max_batch_size=4, max_wait_ms=50
+        )
+        texts = ["a", "bb", "ccc", "dddd", "eeeee", "ffffff"]
+
+        async def run():
+            return await asyncio.gather(*[service.aget_embedding(t) for t in texts])
+
+        embeddings = asyncio.run(run())
+
+        self.assertEqual([e[0] for e in embeddings], [1.0, 2.0, 3.0, 4.0, 5.0, 6.0])
+        self.assertEqual([len(b) for b in inner.batches], [4, 2])
+        self.assertEqual(service.get_stats(), {"requests": 6, "batches": 2})
+
+    def test_duplicate_texts_share_an_embedding(self) -> None:
+        inner = BatchCountingEmbeddingService()
+        service = BatchingEmbeddingService(embedding_service=inner, max_wait_ms=5)
+
+        async def run():
+            return await asyncio.gather(
+                service.aget_embedding("What is GDS?"),
+                service.aget_embedding("What is GDS?"),
+            )
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        self.assertEqual(inner.batches, [["What is GDS?"]])
+
+    def test_errors_reach_every_caller(self) -> None:
+        class FailingEmbeddingService(BatchCountingEmbeddingService):
+            async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+                raise ConnectionError("vertex unavailable.")
+
+        service = BatchingEmbeddingService(
+            embedding_service=FailingEmbeddingService(), max_wait_ms=5
+        )
+
+        async def run():
+            return await asyncio.gather(
+                service.aget_embedding("a"),
+                service.aget_embedding("b"),
+                return_exceptions=True,
+            )
+
+        results = asyncio.run(run())
+
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+
+    def test_cached_batch_lookup(self) -> None:
+        inner = BatchCountingEmbeddingService()
+        service = CachedEmbeddingService(embedding_service=inner)
+
+        service.get_embedding("a")
+        embeddings = service.get_embeddings(["a", "bb", "ccc"])
+
+        self.assertEqual([e[0] for e in embeddings], [1.0, 2.0, 3.0])
+        self.assertEqual(inner.batches, [["bb", "ccc"]])
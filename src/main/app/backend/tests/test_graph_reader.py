@@ -55,14 +55,14 @@ class TestGraphReader(unittest.TestCase):
         # gr.close_driver()
         pass  # not implemented
 
-    def test_match_by_id(self) -> None:
+    def test_count_nodes(self) -> None:
         gr = GraphReader(secret_manager=self.sm)
         ids = [
             "conv-20aa11bb-d65b-4c77-a6f3-58a39d8d0205",
             "conv-692266c4-33ba-4f6f-bf41-fcea75fd2579",
         ]  # exist in dev database
 
-        num_nodes = gr.match_by_id(ids=ids)
+        num_nodes = gr.count_nodes({"Conversation": ids})["Conversation"]
         gr.close_driver()
 
         self.assertEqual(num_nodes, len(ids))
@@ -19,6 +19,12 @@ test_ids = {
     "assistant_id": "llm-123-test",
     "document_id": "idx-123-test",
 }
+test_nodes = {
+    "Session": [test_ids["session_id"]],
+    "Conversation": [test_ids["conversation_id"]],
+    "Message": [test_ids["user_id"], test_ids["assistant_id"]],
+    "Document": [test_ids["document_id"]],
+}
 
 
 class TestGraphWriter(unittest.TestCase):
@@ -32,7 +38,7 @@ class TestGraphWriter(unittest.TestCase):
         cls.sm = SecretManager()
         # ensure no test data in database
         gw = GraphWriter(secret_manager=cls.sm)
-        gw.delete_by_id(list(test_ids.values()))
+        gw.delete_nodes(test_nodes)
         gw.close_driver()
 
     def test_init(self) -> None:
@@ -63,22 +69,15 @@ class TestGraphWriter(unittest.TestCase):
             message=user_message, llm_type="gpt-4 8k", temperature=0
         )
 
-        num_nodes = gr.match_by_id(
-            [
-                test_ids["conversation_id"],
-                test_ids["session_id"],
-                test_ids["user_id"],
-            ]
-        )
+        nodes = {
+            "Conversation": [test_ids["conversation_id"]],
+            "Session": [test_ids["session_id"]],
+            "Message": [test_ids["user_id"]],
+        }
+        num_nodes = sum(gr.count_nodes(nodes).values())
         gr.close_driver()
 
-        gw.delete_by_id(
-            [
-                test_ids["conversation_id"],
-                test_ids["session_id"],
-                test_ids["user_id"],
-            ]
-        )
+        gw.delete_nodes(nodes)
         gw.close_driver()
 
         self.assertEqual(num_nodes, 3)
@@ -99,10 +98,11 @@ class TestGraphWriter(unittest.TestCase):
 
         gw.log_user(message=user_message, previous_message_id=test_ids["assistant_id"])
 
-        num_nodes = gr.match_by_id([test_ids["assistant_id"], test_ids["user_id"]])
+        nodes = {"Message": [test_ids["assistant_id"], test_ids["user_id"]]}
+        num_nodes = sum(gr.count_nodes(nodes).values())
         gr.close_driver()
 
-        gw.delete_by_id([test_ids["conversation_id"], test_ids["user_id"]])
+        gw.delete_nodes(nodes)
         gw.close_driver()
 
         self.assertEqual(num_nodes, 2)
@@ -113,7 +113,14 @@ class TestGraphWriter(unittest.TestCase):
 
         gw.write_dummy_node(id=test_ids["user_id"], label="Message")
         gw.write_dummy_node(id=test_ids["document_id"], label="Document")
-        num_nodes = gr.match_by_id([test_ids["user_id"], test_ids["document_id"]])
+        num_nodes = sum(
+            gr.count_nodes(
+                {
+                    "Message": [test_ids["user_id"]],
+                    "Document": [test_ids["document_id"]],
+                }
+            ).values()
+        )
 
         assistant_message = AssistantMessage(
             session_id=test_ids["session_id"],
@@ -132,14 +139,14 @@ class TestGraphWriter(unittest.TestCase):
             context_ids=[test_ids["document_id"]],
         )
 
-        num_nodes = gr.match_by_id(
-            [test_ids["user_id"], test_ids["assistant_id"], test_ids["document_id"]]
-        )
+        nodes = {
+            "Message": [test_ids["user_id"], test_ids["assistant_id"]],
+            "Document": [test_ids["document_id"]],
+        }
+        num_nodes = sum(gr.count_nodes(nodes).values())
         gr.close_driver()
 
-        gw.delete_by_id(
-            [test_ids["user_id"], test_ids["assistant_id"], test_ids["document_id"]]
-        )
+        gw.delete_nodes(nodes)
         gw.close_driver()
 
         self.assertEqual(num_nodes, 3)
@@ -150,10 +157,11 @@ class TestGraphWriter(unittest.TestCase):
 
         gw.write_dummy_node(id=test_ids["conversation_id"], label="Conversation")
 
-        num_nodes = gr.match_by_id([test_ids["conversation_id"]])
+        nodes = {"Conversation": [test_ids["conversation_id"]]}
+        num_nodes = sum(gr.count_nodes(nodes).values())
         gr.close_driver()
 
-        gw.delete_by_id([test_ids["conversation_id"]])
+        gw.delete_nodes(nodes)
         gw.close_driver()
 
         self.assertEqual(num_nodes, 1)
@@ -170,9 +178,9 @@ class TestGraphWriter(unittest.TestCase):
             value="Good",
             message="good job.",
         )
-        gw.rate_message(r)
+        bookmarks = gw.rate_message(r)
         r_in_graph = gr.get_message_rating(
-            assistant_message_id=test_ids["assistant_id"]
+            assistant_message_id=test_ids["assistant_id"], bookmarks=bookmarks
         )
 
         self.assertEqual(r_in_graph[0], test_ids["assistant_id"])
@@ -185,15 +193,15 @@ class TestGraphWriter(unittest.TestCase):
             message_id=test_ids["assistant_id"],
             value="Bad",
         )
-        gw.rate_message(r2)
+        bookmarks = gw.rate_message(r2)
         r2_in_graph = gr.get_message_rating(
-            assistant_message_id=test_ids["assistant_id"]
+            assistant_message_id=test_ids["assistant_id"], bookmarks=bookmarks
         )
 
         self.assertEqual(r2_in_graph[0], test_ids["assistant_id"])
         self.assertEqual(r2_in_graph[1], r2.value)
 
-        gw.delete_by_id([test_ids["assistant_id"]])
+        gw.delete_nodes({"Message": [test_ids["assistant_id"]]})
 
         gw.close_driver()
         gr.close_driver()
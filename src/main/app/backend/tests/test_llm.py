@@ -1,9 +1,26 @@
+import asyncio
 import unittest
+from unittest import mock
 
-import pandas as pd
+from objects.context import ContextDocument, ContextSet
+from objects.question import Question
+from tools.circuit_breaker import get_circuit_breaker
+from tools.context_packer import MODEL_BUDGETS, ContextPacker, get_context_packer
+from tools.llm import LLM, LLMClientRegistry, get_llm_client_registry
+from resources.prompts.prompts import (
+    conversation_history_template,
+    prompt_no_context_template,
+    prompt_template,
+)
 
-from tools.llm import LLM
-from resources.prompts.prompts import prompt_no_context_template, prompt_template
+
+class FallbackSchedulerStub:
+    """
+    Sends every request to the fake model, as if the requested model's queue were too deep.
+    """
+
+    async def acquire(self, llm_type: str, tokens: int) -> str:
+        return "fake"
 
 
 class TestLLM(unittest.TestCase):
@@ -24,23 +41,138 @@ class TestLLM(unittest.TestCase):
 
     def test_format_llm_input(self) -> None:
         llm = LLM(llm_type="gemini")
-        context_df = pd.DataFrame(
+        context = ContextSet(
             [
-                {"url": "url1", "text": "Some text for url1."},
-                {"url": "url2", "text": "This is more text."},
+                ContextDocument(url="url1", text="Some text for url1.", index="1"),
+                ContextDocument(url="url2", text="This is more text.", index="2"),
             ]
         )
         question = "What is GDS?"
 
         truth_with_context = prompt_template.format(
-            question=question, context=context_df.to_dict("records")
+            question=question,
+            context="\n[1] url1\nSome text for url1.\n---\n[2] url2\nThis is more text.\n---\n",
         )
         truth_without_context = prompt_no_context_template.format(question=question)
 
         self.assertEqual(
-            llm._format_llm_input(question=question, context=context_df),
+            llm._format_llm_input(question=question, context=context),
             truth_with_context,
         )
         self.assertEqual(
             llm._format_llm_input(question=question), truth_without_context
         )
+        self.assertEqual(
+            llm._format_llm_input(
+                question=question, conversation_history="User: Hi\nAssistant: Hello"
+            ),
+            conversation_history_template.format(
+                conversation_history="User: Hi\nAssistant: Hello"
+            )
+            + truth_without_context,
+        )
+
+    def test_aget_response(self) -> None:
+        llm = LLM(llm_type="fake")
+        question = Question(
+            session_id="s-123",
+            conversation_id="conv-123",
+            question="What is GDS?",
+            llm_type="gemini",
+        )
+
+        response = asyncio.run(
+            llm.aget_response(question=question, user_id="user-1", assistant_id="llm-1")
+        )
+
+        self.assertEqual(response.content, "GDS is cool.")
+
+    def test_context_is_packed_once(self) -> None:
+        llm = LLM(llm_type="fake")
+        question = Question(
+            session_id="s-123",
+            conversation_id="conv-123",
+            question="What is GDS?",
+            llm_type="gemini",
+        )
+        context = ContextSet(
+            [
+                ContextDocument(url="url1", text="Some text for url1.", index="1"),
+                ContextDocument(url="url2", text="This is more text.", index="2"),
+            ]
+        )
+
+        with mock.patch.object(
+            ContextPacker, "pack", autospec=True, side_effect=ContextPacker.pack
+        ) as pack:
+            asyncio.run(
+                llm.aget_response(
+                    question=question,
+                    user_id="user-1",
+                    assistant_id="llm-1",
+                    context=context,
+                )
+            )
+
+        self.assertEqual(pack.call_count, 1)
+        self.assertEqual(llm.packed_context.indices, ["1", "2"])
+
+    def test_fallback_is_packed_for_its_budget(self) -> None:
+        llm = LLM(llm_type="gemini")
+        question = Question(
+            session_id="s-123",
+            conversation_id="conv-123",
+            question="What is GDS?",
+            llm_type="gemini",
+        )
+        # fits the gemini prompt budget but not the smaller budget of the fake fallback
+        context = ContextSet(
+            [
+                ContextDocument(url=f"url{i}", text=f"document {i} " * 1_000, index=str(i))
+                for i in range(8)
+            ]
+        )
+
+        get_circuit_breaker.cache_clear()
+        with mock.patch("tools.llm.get_llm_scheduler", return_value=FallbackSchedulerStub()):
+            llm_type, llm_instance, llm_input = asyncio.run(
+                llm._schedule(question, context)
+            )
+            response = asyncio.run(
+                llm.aget_response(
+                    question=question,
+                    user_id="user-1",
+                    assistant_id="llm-1",
+                    context=context,
+                )
+            )
+
+        self.assertEqual(llm_type, "fake")
+        self.assertEqual(llm.served_llm_type, "fake")
+        self.assertIs(llm_instance, get_llm_client_registry().get_client("fake", 0.0))
+        self.assertLessEqual(
+            get_context_packer("fake").token_counter.count(llm_input),
+            MODEL_BUDGETS["fake"].prompt_tokens,
+        )
+        self.assertEqual(response.content, "GDS is cool.")
+        # the breaker of the model that served the request counts the call
+        self.assertEqual(get_circuit_breaker("llm", "gemini").calls, 0)
+        self.assertGreater(get_circuit_breaker("llm", "fake").calls, 0)
+
+    def test_llm_clients_are_reused(self) -> None:
+        first = LLM(llm_type="fake", temperature=0.5)
+        second = LLM(llm_type="fake", temperature=0.5)
+        other = LLM(llm_type="fake", temperature=0.2)
+
+        self.assertIs(first.llm_instance, second.llm_instance)
+        self.assertIs(
+            first.llm_instance, get_llm_client_registry().get_client("fake", 0.5)
+        )
+        self.assertIsNot(first.llm_instance, other.llm_instance)
+
+    def test_llm_client_registry_warmup(self) -> None:
+        registry = LLMClientRegistry()
+        registry.warmup(llm_types=["fake", "not a model"], temperatures=[0.0, 0.001])
+
+        # unknown models are skipped and temperatures are rounded
+        self.assertEqual(registry.get_stats(), {"clients": 1})
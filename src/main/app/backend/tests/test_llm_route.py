@@ -1,52 +1,124 @@
+import json
 import unittest
-from typing import List
+from typing import List, Optional
 
 from fastapi.testclient import TestClient
-import pandas as pd
 
 from main import app
+from objects.context import ContextDocument, ContextSet
+from objects.memory import ConversationMemory
 from tools.embedding import FakeEmbeddingService
 from tools.llm import LLM
 from objects.nodes import UserMessage, AssistantMessage
 from objects.rating import Rating
 from routers.llm import get_embedding_service, get_llm, get_reader, get_writer
+from tools.circuit_breaker import get_circuit_breaker
 
 client = TestClient(app)
 
 
 class GraphWriterMock:
-    def log_new_conversation(
+    async def log_new_conversation(
         self, message: UserMessage, llm_type: str, temperature: float
     ) -> None:
         pass
 
-    def log_user(self, message: UserMessage, previous_message_id: str) -> None:
+    async def log_user(self, message: UserMessage, previous_message_id: str) -> None:
         pass
 
-    def log_assistant(
+    async def log_assistant(
         self,
         message: AssistantMessage,
         previous_message_id: str,
         context_ids: List[str],
+        memory: Optional[ConversationMemory] = None,
     ) -> None:
         pass
 
-    def rate_message(rating: Rating) -> None:
+    async def rate_message(self, rating: Rating) -> None:
         pass
 
 class GraphReaderMock:
-    def retrieve_context_documents(
+    async def get_conversation_memory(self, conversation_id: str) -> ConversationMemory:
+        return ConversationMemory(
+            summary="The user asked about GDS.",
+            recent_messages=["What is GDS?", "GDS is cool."],
+            turn_count=2,
+        )
+
+    async def retrieve_cached_answer(
+        self,
+        question_embedding: List[float],
+        llm_type: str,
+        similarity_threshold: float,
+        number_of_candidates: int = 5,
+    ) -> None:
+        return None
+
+    async def retrieve_context_documents(
         self, question_embedding: List[float], number_of_context_documents: int = 10
-    ) -> pd.DataFrame:
-        return pd.DataFrame.from_dict(
-            {
-                "index": ["a", "b", "c"],
-                "text": ["text a", "text b", "text c"],
-                "url": ["http://a", "http://b", "http://c"],
-            }
+    ) -> ContextSet:
+        return ContextSet(
+            [
+                ContextDocument(url="http://a", text="text a", index="a", score=0.9),
+                ContextDocument(url="http://b", text="text b", index="b", score=0.8),
+                ContextDocument(url="http://c", text="text c", index="c", score=0.7),
+            ]
         )
 
 
+class CachedAnswerGraphReaderMock(GraphReaderMock):
+    async def retrieve_cached_answer(
+        self,
+        question_embedding: List[float],
+        llm_type: str,
+        similarity_threshold: float,
+        number_of_candidates: int = 5,
+    ) -> dict:
+        return {
+            "message_id": "llm-cached",
+            "content": "GDS is a graph data science library.",
+            "score": 0.99,
+            "context_ids": ["a", "b"],
+        }
+
+
+class CachedAnswerWithoutMemoryGraphReaderMock(CachedAnswerGraphReaderMock):
+    """
+    A conversation whose memory has not been written yet.
+    """
+
+    async def get_conversation_memory(self, conversation_id: str) -> ConversationMemory:
+        return ConversationMemory()
+
+
+class UnavailableGraphReaderMock(GraphReaderMock):
+    async def retrieve_context_documents(
+        self, question_embedding: List[float], number_of_context_documents: int = 10
+    ) -> ContextSet:
+        raise ConnectionError("Neo4j is unavailable.")
+
+
+class UnavailableEmbeddingService(FakeEmbeddingService):
+    async def aget_embedding(self, text: str) -> List[float]:
+        raise ConnectionError("Vertex AI is unavailable.")
+
+
+class FailingChatModel:
+    async def ainvoke(self, *args, **kwargs):
+        raise RuntimeError("429 Too Many Requests")
+
+    async def astream(self, *args, **kwargs):
+        raise RuntimeError("429 Too Many Requests")
+        yield
+
+
+class FailingLLM(LLM):
+    @property
+    def llm_instance(self) -> FailingChatModel:
+        return FailingChatModel()
+
+
 def override_get_reader():
     return GraphReaderMock()
 
@@ -97,4 +169,154 @@ class TestLLMRoute(unittest.TestCase):
     def test_llm_route(self) -> None:
         resp = client.post("/llm", json=self.question)
         self.assertEqual(resp.status_code, 200)
-        self.assertEqual(resp.json()["content"], "GDS is cool.")
\ No newline at end of file
+        self.assertEqual(resp.json()["content"], "GDS is cool.")
+
+    def test_llm_stream_route(self) -> None:
+        resp = client.post("/llm/stream", json=self.question)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("text/event-stream"))
+
+        events = list()
+        for event in resp.text.strip().split("\n\n"):
+            name, data = event.split("\n")
+            events.append((name[len("event: ") :], json.loads(data[len("data: ") :])))
+
+        tokens = "".join(data["content"] for name, data in events if name == "token")
+        name, response = events[-1]
+
+        self.assertEqual(tokens, "GDS is cool.")
+        self.assertEqual(name, "response")
+        self.assertEqual(response["content"], "GDS is cool.")
+        self.assertEqual(len(response["message_history"]), 2)
+
+    def test_llm_route_conversation_memory(self) -> None:
+        resp = client.post(
+            "/llm",
+            json={**self.question, "message_history": ["user-1", "llm-1"]},
+        )
+        metrics = client.get("/metrics")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(len(resp.json()["message_history"]), 4)
+        self.assertIn(
+            'agent_neo_stage_duration_seconds_count{stage="conversation_memory"}',
+            metrics.text,
+        )
+
+    def test_llm_route_semantic_cache_hit(self) -> None:
+        app.dependency_overrides[get_reader] = CachedAnswerGraphReaderMock
+        try:
+            resp = client.post("/llm", json=self.question)
+            opt_out = client.post("/llm", json={**self.question, "use_cache": False})
+        finally:
+            app.dependency_overrides[get_reader] = override_get_reader
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["content"], "GDS is a graph data science library.")
+        self.assertEqual(opt_out.json()["content"], "GDS is cool.")
+
+    def test_llm_route_semantic_cache_skipped_for_follow_up(self) -> None:
+        app.dependency_overrides[get_reader] = CachedAnswerGraphReaderMock
+        try:
+            resp = client.post(
+                "/llm",
+                json={**self.question, "message_history": ["user-1", "llm-1"]},
+            )
+        finally:
+            app.dependency_overrides[get_reader] = override_get_reader
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["content"], "GDS is cool.")
+
+    def test_llm_route_semantic_cache_skipped_for_follow_up_without_memory(self) -> None:
+        app.dependency_overrides[get_reader] = CachedAnswerWithoutMemoryGraphReaderMock
+        try:
+            resp = client.post(
+                "/llm",
+                json={**self.question, "message_history": ["user-1", "llm-1"]},
+            )
+        finally:
+            app.dependency_overrides[get_reader] = override_get_reader
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["content"], "GDS is cool.")
+
+    def test_metrics_route(self) -> None:
+        llm_resp = client.post(
+            "/llm", json=self.question, headers={"X-Request-ID": "req-123"}
+        )
+        resp = client.get("/metrics")
+
+        self.assertEqual(llm_resp.headers["X-Request-ID"], "req-123")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn('agent_neo_stage_duration_seconds_count{stage="llm"}', resp.text)
+        self.assertIn(
+            'agent_neo_llm_tokens_total{llm_type="fake",kind="completion"}', resp.text
+        )
+
+    def test_metrics_are_labeled_by_route(self) -> None:
+        client.post("/llm", json=self.question)
+        client.get("/wp-admin/setup-config.php")
+        resp = client.get("/metrics")
+
+        self.assertIn('agent_neo_requests_total{path="/llm",status="200"}', resp.text)
+        self.assertIn(
+            'agent_neo_requests_total{path="unmatched",status="404"}', resp.text
+        )
+        self.assertNotIn("wp-admin", resp.text)
+
+    def test_llm_route_retrieval_unavailable(self) -> None:
+        app.dependency_overrides[get_reader] = UnavailableGraphReaderMock
+        try:
+            resp = client.post("/llm", json=self.question)
+        finally:
+            app.dependency_overrides[get_reader] = override_get_reader
+            get_circuit_breaker.cache_clear()
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["content"], "GDS is cool.")
+
+    def test_llm_route_embedding_unavailable(self) -> None:
+        app.dependency_overrides[get_embedding_service] = UnavailableEmbeddingService
+        try:
+            resp = client.post("/llm", json=self.question)
+        finally:
+            app.dependency_overrides[get_embedding_service] = override_get_embedding_service
+            get_circuit_breaker.cache_clear()
+
+        self.assertEqual(resp.status_code, 503)
+
+    def test_llm_route_llm_unavailable(self) -> None:
+        breaker = get_circuit_breaker("llm", "fake")
+        for _ in range(breaker.failure_threshold):
+            breaker._on_failure()
+        try:
+            resp = client.post("/llm", json=self.question)
+            stream_resp = client.post("/llm/stream", json=self.question)
+            metrics = client.get("/metrics")
+        finally:
+            get_circuit_breaker.cache_clear()
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(stream_resp.status_code, 503)
+        self.assertIn("agent_neo_circuit_breaker_llm_fake_state 2", metrics.text)
+
+    def test_llm_route_llm_failing(self) -> None:
+        app.dependency_overrides[get_llm] = lambda: FailingLLM(llm_type="fake")
+        try:
+            resp = client.post("/llm", json=self.question)
+            stream_resp = client.post("/llm/stream", json=self.question)
+        finally:
+            app.dependency_overrides[get_llm] = override_get_llm
+            get_circuit_breaker.cache_clear()
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(stream_resp.status_code, 200)
+        self.assertTrue(stream_resp.text.startswith("event: error\n"))
+        self.assertIn("429 Too Many Requests", stream_resp.text)
+
+    def test_llm_route_local_retrieval_not_enabled(self) -> None:
+        resp = client.post("/llm", json={**self.question, "retrieval_mode": "local"})
+
+        self.assertEqual(resp.status_code, 400)
+        self.assertEqual(resp.json()["detail"], "The local vector index is not enabled.")
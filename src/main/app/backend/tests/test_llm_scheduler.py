@@ -0,0 +1,99 @@
+import asyncio
+import time
+import unittest
+
+from tools.llm_scheduler import (
+    LLMQueueTimeoutError,
+    LLMScheduler,
+    RateLimit,
+    TokenBucket,
+    parse_fallbacks,
+)
+
+
+class TestLLMScheduler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_token_bucket(self) -> None:
+        bucket = TokenBucket(rate=10, capacity=10)
+
+        self.assertEqual(bucket.get_wait_time(10), 0.0)
+        bucket.consume(10)
+        self.assertAlmostEqual(bucket.get_wait_time(5), 0.5, places=1)
+        # amounts over the capacity wait for a full bucket
+        self.assertAlmostEqual(bucket.get_wait_time(100), 1.0, places=1)
+
+    def test_unlimited_model_is_not_queued(self) -> None:
+        scheduler = LLMScheduler(rate_limits={})
+
+        self.assertEqual(asyncio.run(scheduler.acquire("gemini", 10_000)), "gemini")
+
+    def test_requests_are_rate_limited(self) -> None:
+        # 600 requests per minute refills one request every 0.1 seconds
+        scheduler = LLMScheduler(
+            rate_limits={
+                "gpt-4 8k": RateLimit(requests_per_minute=600, tokens_per_minute=10**6)
+            }
+        )
+        scheduler._limiters["gpt-4 8k"].requests.tokens = 0
+
+        async def run() -> float:
+            start = time.perf_counter()
+            await asyncio.gather(*[scheduler.acquire("gpt-4 8k", 10) for _ in range(3)])
+            return time.perf_counter() - start
+
+        self.assertGreater(asyncio.run(run()), 0.25)
+
+    def test_deadline(self) -> None:
+        scheduler = LLMScheduler(
+            rate_limits={
+                "gpt-4 8k": RateLimit(requests_per_minute=60, tokens_per_minute=600)
+            },
+            queue_timeout=0.1,
+        )
+
+        async def run() -> None:
+            await scheduler.acquire("gpt-4 8k", 600)
+            # the bucket takes a minute to refill
+            await scheduler.acquire("gpt-4 8k", 600)
+
+        with self.assertRaises(LLMQueueTimeoutError):
+            asyncio.run(run())
+
+    def test_fallback_when_queue_is_deep(self) -> None:
+        scheduler = LLMScheduler(
+            rate_limits={
+                "gpt-4 8k": RateLimit(requests_per_minute=1, tokens_per_minute=10**6),
+                "gpt-4 32k": RateLimit(requests_per_minute=600, tokens_per_minute=10**6),
+            },
+            fallbacks={"gpt-4 8k": "gpt-4 32k"},
+            max_queue_depth=1,
+            queue_timeout=0.2,
+        )
+
+        async def run():
+            await scheduler.acquire("gpt-4 8k", 10)
+            return await asyncio.gather(
+                scheduler.acquire("gpt-4 8k", 10),
+                scheduler.acquire("gpt-4 8k", 10),
+                return_exceptions=True,
+            )
+
+        queued, fallback = asyncio.run(run())
+
+        self.assertIsInstance(queued, LLMQueueTimeoutError)
+        self.assertEqual(fallback, "gpt-4 32k")
+
+    def test_parse_fallbacks(self) -> None:
+        self.assertEqual(
+            parse_fallbacks("GPT-4 8k = gpt-4 32k,chat-bison 2k=gemini"),
+            {"gpt-4 8k": "gpt-4 32k", "chat-bison 2k": "gemini"},
+        )
+        self.assertEqual(parse_fallbacks(None), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
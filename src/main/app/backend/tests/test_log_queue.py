@@ -0,0 +1,183 @@
+import asyncio
+import unittest
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from neo4j.exceptions import ConstraintError, ServiceUnavailable
+
+from database import queries
+from database.async_communicator import AsyncGraphWriter
+from database.log_queue import ConversationLogQueue
+from objects.nodes import UserMessage, AssistantMessage
+from objects.turn import ConversationTurn
+from resources.prompts.prompts import prompt_template
+
+
+class BatchRecordingWriterMock:
+    def __init__(self) -> None:
+        self.batches: List[List[ConversationTurn]] = list()
+
+    async def log_conversation_turns(self, turns: List[ConversationTurn]) -> None:
+        self.batches.append(turns)
+
+
+class ConstraintViolatingWriterMock(BatchRecordingWriterMock):
+    """
+    Rolls back any batch that holds the bad turn.
+    """
+
+    async def log_conversation_turns(self, turns: List[ConversationTurn]) -> None:
+        if any(t.user_message.message_id == "user-2" for t in turns):
+            raise ConstraintError("Node already exists with label `Message`.")
+        self.batches.append(turns)
+
+
+class FlakyWriterMock(BatchRecordingWriterMock):
+    def __init__(self, failures: int) -> None:
+        super().__init__()
+        self.failures = failures
+
+    async def log_conversation_turns(self, turns: List[ConversationTurn]) -> None:
+        if self.failures > 0:
+            self.failures -= 1
+            raise ServiceUnavailable("Unable to retrieve routing information.")
+        self.batches.append(turns)
+
+
+class WriteSessionMock:
+    """
+    Records the parameters of each query run in a write transaction.
+    """
+
+    def __init__(self) -> None:
+        self.parameters: Dict[str, Dict[str, Any]] = dict()
+
+    async def __aenter__(self) -> "WriteSessionMock":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    async def execute_write(self, work):
+        return await work(self)
+
+    async def run(self, query: str, **parameters) -> None:
+        self.parameters[query] = parameters
+
+
+def make_turn(i: int, previous_message_id: str = None) -> ConversationTurn:
+    return ConversationTurn(
+        user_message=UserMessage(
+            session_id="s-123",
+            conversation_id="conv-123",
+            message_id=f"user-{i}",
+            content="What is GDS?",
+            embedding=[0.1, 0.2],
+            public=False,
+        ),
+        assistant_message=AssistantMessage(
+            session_id="s-123",
+            conversation_id="conv-123",
+            message_id=f"llm-{i}",
+            prompt=prompt_template,
+            content="GDS is cool.",
+            public=False,
+        ),
+        previous_message_id=previous_message_id,
+        llm_type="gemini",
+    )
+
+
+class TestConversationLogQueue(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_turns_are_batched_in_order(self) -> None:
+        writer = BatchRecordingWriterMock()
+
+        async def run():
+            queue = ConversationLogQueue(
+                writer=writer, max_batch_size=4, flush_interval_ms=1000
+            )
+            queue.start()
+            await queue.put(make_turn(0))
+            for i in range(1, 5):
+                await queue.put(make_turn(i, previous_message_id=f"llm-{i - 1}"))
+            await queue.stop()
+            return queue
+
+        queue = asyncio.run(run())
+
+        # 4 messages per batch means 2 turns per batch
+        self.assertEqual([len(b) for b in writer.batches], [2, 2, 1])
+        self.assertEqual(
+            [t.user_message.message_id for b in writer.batches for t in b],
+            ["user-0", "user-1", "user-2", "user-3", "user-4"],
+        )
+        self.assertEqual(queue.turns_logged, 5)
+
+    def test_flush_interval(self) -> None:
+        writer = BatchRecordingWriterMock()
+
+        async def run():
+            queue = ConversationLogQueue(
+                writer=writer, max_batch_size=100, flush_interval_ms=10
+            )
+            queue.start()
+            await queue.put(make_turn(0))
+            await asyncio.sleep(0.1)
+            flushed = len(writer.batches)
+            await queue.stop()
+            return flushed
+
+        self.assertEqual(asyncio.run(run()), 1)
+
+    def test_user_message_is_logged_when_it_was_received(self) -> None:
+        received_at = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+        turn = make_turn(0)
+        turn.user_message.post_time = received_at
+        session = WriteSessionMock()
+        writer = AsyncGraphWriter(driver=None)
+        writer._write_session = lambda: session
+
+        asyncio.run(writer.log_conversation_turns([turn]))
+
+        user_messages = session.parameters[queries.LOG_USER_MESSAGES_BATCH]["messages"]
+        assistant_messages = session.parameters[queries.LOG_ASSISTANT_MESSAGES_BATCH]["messages"]
+        self.assertEqual(user_messages[0]["postTime"], received_at.isoformat())
+        self.assertEqual(
+            assistant_messages[0]["postTime"], turn.assistant_post_time.isoformat()
+        )
+
+    def test_failed_batch_is_split(self) -> None:
+        writer = ConstraintViolatingWriterMock()
+        queue = ConversationLogQueue(writer=writer)
+
+        asyncio.run(queue._write([make_turn(i) for i in range(5)]))
+
+        self.assertEqual(
+            [t.user_message.message_id for b in writer.batches for t in b],
+            ["user-0", "user-1", "user-3", "user-4"],
+        )
+        self.assertEqual(queue.turns_logged, 4)
+        self.assertEqual(queue.turns_dropped, 1)
+        self.assertGreater(queue.failed_batches, 0)
+
+    def test_unavailable_database_is_retried(self) -> None:
+        writer = FlakyWriterMock(failures=2)
+        queue = ConversationLogQueue(writer=writer, retry_backoff_ms=1)
+
+        asyncio.run(queue._write([make_turn(0), make_turn(1)]))
+
+        self.assertEqual([len(b) for b in writer.batches], [2])
+        self.assertEqual(queue.failed_batches, 2)
+        self.assertEqual(queue.turns_dropped, 0)
+
+        writer = FlakyWriterMock(failures=10)
+        queue = ConversationLogQueue(writer=writer, max_retries=1, retry_backoff_ms=1)
+
+        asyncio.run(queue._write([make_turn(0), make_turn(1)]))
+
+        self.assertEqual(queue.turns_dropped, 2)
@@ -0,0 +1,92 @@
+import asyncio
+import unittest
+
+from pydantic import ValidationError
+
+from objects.memory import ConversationMemory
+from tools.memory import ExtractiveSummarizer, LLMSummarizer, update_memory
+
+
+class FailingSummarizer:
+    async def summarize(self, summary: str, user: str, assistant: str) -> str:
+        raise AssertionError("turns inside the window should not be summarized.")
+
+
+class TestConversationMemory(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_bad_recent_messages(self) -> None:
+        with self.assertRaises(ValidationError):
+            ConversationMemory(recent_messages=["What is GDS?"])
+
+    def test_to_prompt(self) -> None:
+        memory = ConversationMemory(
+            summary="The user asked about GDS.",
+            recent_messages=["What is Node2Vec?", "An embedding algorithm."],
+            turn_count=2,
+        )
+
+        self.assertEqual(
+            memory.to_prompt(),
+            "Summary: The user asked about GDS.\nUser: What is Node2Vec?\nAssistant: An embedding algorithm.",
+        )
+        self.assertTrue(ConversationMemory().is_empty())
+        self.assertFalse(memory.is_empty())
+
+    def test_update_memory_within_window(self) -> None:
+        memory = asyncio.run(
+            update_memory(
+                ConversationMemory(),
+                "What is GDS?",
+                "GDS is cool.",
+                summarizer=FailingSummarizer(),
+                window_turns=2,
+            )
+        )
+
+        self.assertEqual(memory.summary, "")
+        self.assertEqual(memory.recent_messages, ["What is GDS?", "GDS is cool."])
+        self.assertEqual(memory.turn_count, 1)
+
+    def test_update_memory_folds_oldest_turn(self) -> None:
+        memory = ConversationMemory(
+            recent_messages=["q1", "a1", "q2", "a2"], turn_count=2
+        )
+
+        memory = asyncio.run(
+            update_memory(
+                memory, "q3", "a3", summarizer=ExtractiveSummarizer(), window_turns=2
+            )
+        )
+
+        self.assertEqual(memory.summary, "User asked: q1 Assistant answered: a1")
+        self.assertEqual(memory.recent_messages, ["q2", "a2", "q3", "a3"])
+        self.assertEqual(memory.turn_count, 3)
+
+    def test_extractive_summary_is_bounded(self) -> None:
+        summarizer = ExtractiveSummarizer(excerpt_characters=20, max_characters=150)
+        summary = ""
+        for i in range(20):
+            summary = asyncio.run(
+                summarizer.summarize(summary, f"question {i} " * 10, f"answer {i}")
+            )
+
+        self.assertLessEqual(len(summary), 150)
+        self.assertTrue(summary.endswith("Assistant answered: answer 19"))
+        self.assertNotIn("answer 0\n", summary)
+
+    def test_llm_summarizer_falls_back(self) -> None:
+        summarizer = LLMSummarizer(llm_type="not-a-model")
+
+        summary = asyncio.run(summarizer.summarize("", "What is GDS?", "GDS is cool."))
+
+        self.assertEqual(
+            summary, "User asked: What is GDS? Assistant answered: GDS is cool."
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
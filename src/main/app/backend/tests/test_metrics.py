@@ -0,0 +1,85 @@
+import unittest
+
+from tools.metrics import (
+    LLM_TOKENS,
+    STAGE_DURATION,
+    STAGE_ERRORS,
+    MetricsRegistry,
+    get_request_id,
+    record_token_usage,
+    reset_request_id,
+    set_request_id,
+    span,
+)
+
+
+class TestMetrics(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_counter_render(self) -> None:
+        registry = MetricsRegistry(namespace="test")
+        counter = registry.counter("calls_total", "Calls.", ["route"])
+        counter.inc(route="/llm")
+        counter.inc(2, route="/llm")
+
+        self.assertEqual(counter.get(route="/llm"), 3)
+        self.assertIn('test_calls_total{route="/llm"} 3.0', registry.render())
+
+    def test_histogram_render(self) -> None:
+        registry = MetricsRegistry(namespace="test")
+        histogram = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5.0)
+
+        rendered = registry.render()
+
+        self.assertIn('test_latency_seconds_bucket{le="0.1"} 1', rendered)
+        self.assertIn('test_latency_seconds_bucket{le="1.0"} 2', rendered)
+        self.assertIn('test_latency_seconds_bucket{le="+Inf"} 3', rendered)
+        self.assertIn("test_latency_seconds_count 3", rendered)
+
+    def test_collector(self) -> None:
+        registry = MetricsRegistry(namespace="test")
+        registry.register_collector("cache", lambda: {"hits": 4, "dtype": "int8"})
+
+        rendered = registry.render()
+
+        self.assertIn("test_cache_hits 4", rendered)
+        self.assertNotIn("dtype", rendered)
+
+    def test_span(self) -> None:
+        before = STAGE_DURATION.get_count(stage="test_stage")
+        errors = STAGE_ERRORS.get(stage="test_stage")
+
+        token = set_request_id("req-123")
+        try:
+            self.assertEqual(get_request_id(), "req-123")
+            with span("test_stage"):
+                pass
+            with self.assertRaises(ValueError):
+                with span("test_stage"):
+                    raise ValueError()
+        finally:
+            reset_request_id(token)
+
+        self.assertEqual(get_request_id(), "-")
+        self.assertEqual(STAGE_DURATION.get_count(stage="test_stage"), before + 2)
+        self.assertEqual(STAGE_ERRORS.get(stage="test_stage"), errors + 1)
+
+    def test_record_token_usage(self) -> None:
+        record_token_usage(
+            "test-llm", "prompt", "done", {"prompt_tokens": 10, "completion_tokens": 3}
+        )
+        # without reported usage the tokens are estimated
+        record_token_usage("test-llm", "abcdefgh", "abcd")
+
+        self.assertEqual(LLM_TOKENS.get(llm_type="test-llm", kind="prompt"), 12)
+        self.assertEqual(LLM_TOKENS.get(llm_type="test-llm", kind="completion"), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
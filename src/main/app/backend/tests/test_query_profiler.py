@@ -0,0 +1,134 @@
+import asyncio
+import os
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from fastapi.testclient import TestClient
+from neo4j._work.summary import SummaryCounters
+
+from database import queries
+from database.profiler import (
+    AsyncProfiledTransaction,
+    ProfiledTransaction,
+    QueryProfiler,
+    get_query_name,
+    get_query_profiler,
+)
+from main import app
+
+client = TestClient(app)
+
+PLAN = {"operatorType": "ProduceResults", "dbHits": 2, "children": [{"dbHits": 40}]}
+
+
+def make_summary(available: int, consumed: int, counters=None, profile=None):
+    return SimpleNamespace(
+        result_available_after=available,
+        result_consumed_after=consumed,
+        counters=SummaryCounters(counters or {}),
+        profile=profile,
+    )
+
+
+class ResultMock:
+    def __init__(self, summary) -> None:
+        self.summary = summary
+
+    def values(self):
+        return [["a"]]
+
+    def consume(self):
+        return self.summary
+
+
+class AsyncResultMock(ResultMock):
+    async def values(self):
+        return [["a"]]
+
+    async def consume(self):
+        return self.summary
+
+
+class TransactionMock:
+    def __init__(self, summary, result_class=ResultMock) -> None:
+        self.summary = summary
+        self.result_class = result_class
+        self.queries = list()
+
+    def run(self, query, parameters=None, **kwargs):
+        self.queries.append(query)
+        return self.result_class(self.summary)
+
+
+class AsyncTransactionMock(TransactionMock):
+    async def run(self, query, parameters=None, **kwargs):
+        return super().run(query, parameters, **kwargs)
+
+
+class TestQueryProfiler(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_query_names(self) -> None:
+        self.assertEqual(get_query_name(queries.LOG_ASSISTANT), "LOG_ASSISTANT")
+        self.assertEqual(
+            get_query_name(
+                queries.COUNT_NODES_BY_KEY.format(label="Document", key="index")
+            ),
+            "COUNT_NODES_BY_KEY[Document]",
+        )
+        self.assertEqual(get_query_name("return 1"), "UNNAMED")
+
+    def test_record_read(self) -> None:
+        profiler = QueryProfiler(enabled=True, slow_query_ms=100)
+        tx = ProfiledTransaction(TransactionMock(make_summary(3, 2)), profiler)
+
+        values = tx.run(queries.TOPIC_VECTOR_INDEX_SEARCH, k=3).values()
+        stats = profiler.get_report()["queries"]["TOPIC_VECTOR_INDEX_SEARCH"]
+
+        self.assertEqual(values, [["a"]])
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["p50_ms"], 5)
+        self.assertEqual(profiler.get_report()["slow_queries"], [])
+
+    def test_record_write_with_plan(self) -> None:
+        profiler = QueryProfiler(enabled=True, profile_plans=True, slow_query_ms=100)
+        mock_tx = AsyncTransactionMock(
+            make_summary(150, 10, {"nodes-created": 1}, PLAN), AsyncResultMock
+        )
+        tx = AsyncProfiledTransaction(mock_tx, profiler)
+
+        async def write():
+            await tx.run(queries.LOG_ASSISTANT, messId="llm-1")
+            for result in tx.results:
+                await result.consume()
+                await result.consume()
+
+        asyncio.run(write())
+        report = profiler.get_report()
+        stats = report["queries"]["LOG_ASSISTANT"]
+
+        self.assertTrue(mock_tx.queries[0].startswith("PROFILE "))
+        self.assertEqual(stats["count"], 1)
+        self.assertEqual(stats["counters"], {"nodes_created": 1})
+        self.assertEqual(stats["mean_db_hits"], 42)
+        self.assertEqual(report["slow_queries"][0]["query"], "LOG_ASSISTANT")
+
+    def test_admin_route(self) -> None:
+        with mock.patch.dict(os.environ, {"ADMIN_TOKEN": "secret"}):
+            resp = client.get("/admin/queries", headers={"X-Admin-Token": "secret"})
+            unauthorized = client.get("/admin/queries")
+        with mock.patch.dict(os.environ, {}, clear=True):
+            disabled = client.get("/admin/queries", headers={"X-Admin-Token": "secret"})
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["enabled"], get_query_profiler().enabled)
+        self.assertEqual(unauthorized.status_code, 401)
+        self.assertEqual(disabled.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
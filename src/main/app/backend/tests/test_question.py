@@ -119,3 +119,22 @@ class TestQuestion(unittest.TestCase):
                 number_of_documents=5,
                 temperature=2,
             )
+
+    def test_retrieval_mode(self) -> None:
+        q = Question(
+            session_id="s-123",
+            conversation_id="conv-123",
+            question="This is the content.",
+            llm_type="gpt-4 8k",
+            retrieval_mode="Hybrid",
+        )
+        self.assertEqual(q.retrieval_mode, "hybrid")
+
+        with self.assertRaises(ValueError):
+            Question(
+                session_id="s-123",
+                conversation_id="conv-123",
+                question="This is the content.",
+                llm_type="gpt-4 8k",
+                retrieval_mode="keyword",
+            )
@@ -0,0 +1,80 @@
+import asyncio
+import time
+import unittest
+from typing import List
+
+from objects.context import ContextDocument, ContextSet
+from tools.retrieval import reciprocal_rank_fusion, retrieve_context
+
+
+def make_context(indices: List[str]) -> ContextSet:
+    return ContextSet(
+        ContextDocument(url=f"http://{i}", text=f"text {i}", index=i) for i in indices
+    )
+
+
+class SlowGraphReaderMock:
+    async def retrieve_context_documents(
+        self, question_embedding: List[float], number_of_context_documents: int = 10
+    ) -> ContextSet:
+        await asyncio.sleep(0.2)
+        return make_context(["a", "b", "c"])
+
+    async def retrieve_context_documents_by_topic(
+        self,
+        question_embedding: List[float],
+        number_of_topics: int = 3,
+        documents_per_topic: int = 4,
+    ) -> ContextSet:
+        await asyncio.sleep(0.2)
+        return make_context(["c", "d"])
+
+
+class TestRetrieval(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_reciprocal_rank_fusion(self) -> None:
+        fused = reciprocal_rank_fusion(
+            [make_context(["a", "b", "c"]), make_context(["c", "d"])], limit=10, k=60
+        )
+
+        # c appears in both rankings so it is ranked first
+        self.assertEqual(fused.indices, ["c", "a", "b", "d"])
+        self.assertAlmostEqual(fused[0].score, 1 / 63 + 1 / 61)
+
+    def test_reciprocal_rank_fusion_limit(self) -> None:
+        fused = reciprocal_rank_fusion(
+            [make_context(["a", "b", "c"]), make_context(["c", "d"])], limit=2
+        )
+
+        self.assertEqual(len(fused), 2)
+
+    def test_hybrid_retrieval_runs_concurrently(self) -> None:
+        start = time.perf_counter()
+        context = asyncio.run(
+            retrieve_context(
+                reader=SlowGraphReaderMock(),
+                question_embedding=[0.1, 0.2],
+                retrieval_mode="hybrid",
+                number_of_documents=10,
+            )
+        )
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(set(context.indices), {"a", "b", "c", "d"})
+        self.assertLess(elapsed, 0.35)
+
+    def test_topic_retrieval_is_truncated(self) -> None:
+        context = asyncio.run(
+            retrieve_context(
+                reader=SlowGraphReaderMock(),
+                question_embedding=[0.1, 0.2],
+                retrieval_mode="topic",
+                number_of_documents=1,
+            )
+        )
+
+        self.assertEqual(context.indices, ["c"])
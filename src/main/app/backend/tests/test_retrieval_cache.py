@@ -0,0 +1,118 @@
+import asyncio
+import unittest
+
+from objects.context import ContextDocument, ContextSet
+from tools.retrieval_cache import RetrievalCache, get_retrieval_key
+
+
+class CountingRetriever:
+    def __init__(self, context: ContextSet = None) -> None:
+        self.context = context if context is not None else ContextSet(
+            [ContextDocument(url="http://a", text="text a", index="a", score=0.9)]
+        )
+        self.calls = 0
+        self.epoch = 0
+
+    async def retrieve(self) -> ContextSet:
+        self.calls += 1
+        return self.context
+
+    async def get_epoch(self) -> int:
+        return self.epoch
+
+
+class TestRetrievalCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.embedding = [0.1, 0.2, 0.3]
+
+    def test_key(self) -> None:
+        key = get_retrieval_key(self.embedding, "vector", k=10)
+
+        self.assertEqual(key, get_retrieval_key(list(self.embedding), "vector", k=10))
+        self.assertNotEqual(key, get_retrieval_key(self.embedding, "vector", k=5))
+        self.assertNotEqual(key, get_retrieval_key(self.embedding, "topic", k=10))
+        self.assertNotEqual(key, get_retrieval_key([0.1, 0.2, 0.31], "vector", k=10))
+
+    def test_hit(self) -> None:
+        cache = RetrievalCache()
+        retriever = CountingRetriever()
+
+        async def run():
+            for _ in range(3):
+                context = await cache.get_or_retrieve(
+                    "key", retriever.retrieve, retriever.get_epoch
+                )
+            return context
+
+        context = asyncio.run(run())
+
+        self.assertEqual(context.indices, ["a"])
+        self.assertEqual(retriever.calls, 1)
+        self.assertAlmostEqual(cache.get_stats()["hit_ratio"], 2 / 3)
+
+    def test_empty_context_is_not_cached(self) -> None:
+        cache = RetrievalCache()
+        retriever = CountingRetriever(ContextSet())
+
+        async def run():
+            for _ in range(2):
+                await cache.get_or_retrieve("key", retriever.retrieve, retriever.get_epoch)
+
+        asyncio.run(run())
+
+        self.assertEqual(retriever.calls, 2)
+
+    def test_lru_and_ttl_eviction(self) -> None:
+        cache = RetrievalCache(max_size=2, ttl_seconds=0.05)
+        retriever = CountingRetriever()
+
+        async def run():
+            for key in ["a", "b", "a", "c"]:
+                await cache.get_or_retrieve(key, retriever.retrieve, retriever.get_epoch)
+            # b was least recently used
+            self.assertEqual(cache.get_stats()["evictions"], 1)
+            await cache.get_or_retrieve("a", retriever.retrieve, retriever.get_epoch)
+            self.assertEqual(retriever.calls, 3)
+
+            await asyncio.sleep(0.06)
+            await cache.get_or_retrieve("a", retriever.retrieve, retriever.get_epoch)
+            self.assertEqual(retriever.calls, 4)
+            self.assertEqual(cache.get_stats()["expirations"], 1)
+
+        asyncio.run(run())
+
+    def test_epoch_invalidation(self) -> None:
+        cache = RetrievalCache(epoch_check_seconds=0.0)
+        retriever = CountingRetriever()
+
+        async def run():
+            await cache.get_or_retrieve("key", retriever.retrieve, retriever.get_epoch)
+            await cache.get_or_retrieve("key", retriever.retrieve, retriever.get_epoch)
+            retriever.epoch = 1
+            await cache.get_or_retrieve("key", retriever.retrieve, retriever.get_epoch)
+
+        asyncio.run(run())
+
+        self.assertEqual(retriever.calls, 2)
+        self.assertEqual(cache.get_stats()["invalidations"], 1)
+        self.assertEqual(cache.epoch, 1)
+
+    def test_epoch_check_interval(self) -> None:
+        cache = RetrievalCache(epoch_check_seconds=60.0)
+        retriever = CountingRetriever()
+
+        async def run():
+            await cache.get_or_retrieve("key", retriever.retrieve, retriever.get_epoch)
+            retriever.epoch = 1
+            await cache.get_or_retrieve("key", retriever.retrieve, retriever.get_epoch)
+
+        asyncio.run(run())
+
+        self.assertEqual(retriever.calls, 1)
+        self.assertEqual(cache.epoch, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
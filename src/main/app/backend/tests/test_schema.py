@@ -0,0 +1,114 @@
+import asyncio
+import unittest
+from typing import Any, Dict, List
+
+from database import queries
+from database.schema import SchemaItem, SchemaManager
+
+
+class FakeResult:
+    def __init__(self, records: List[Dict[str, Any]]) -> None:
+        self.records = records
+
+    async def data(self) -> List[Dict[str, Any]]:
+        return self.records
+
+    async def consume(self) -> None:
+        pass
+
+
+class FakeSession:
+    def __init__(self, driver: "FakeDriver") -> None:
+        self.driver = driver
+
+    async def __aenter__(self) -> "FakeSession":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    async def run(self, query: str, **parameters) -> FakeResult:
+        self.driver.queries.append((query, parameters))
+        if query in self.driver.failing_queries:
+            raise RuntimeError("constraint violated by existing data")
+        if query == queries.GET_INDEX_STATES:
+            self.driver.polls += 1
+            state = "ONLINE" if self.driver.polls >= self.driver.polls_until_online else "POPULATING"
+            return FakeResult(
+                [{"name": name, "state": state} for name in parameters["names"]]
+            )
+        return FakeResult([])
+
+
+class FakeDriver:
+    def __init__(self, failing_queries=(), polls_until_online: int = 1) -> None:
+        self.failing_queries = failing_queries
+        self.polls_until_online = polls_until_online
+        self.polls = 0
+        self.queries = list()
+
+    def session(self, database=None) -> FakeSession:
+        return FakeSession(self)
+
+
+SCHEMA = [
+    SchemaItem(
+        name="message_id",
+        statement=queries.CREATE_MESSAGE_ID_CONSTRAINT,
+        fallback_name="message_id_range",
+        fallback_statement=queries.CREATE_MESSAGE_ID_INDEX,
+    ),
+    SchemaItem(
+        name="document-embeddings",
+        statement=queries.CREATE_DOCUMENT_EMBEDDINGS_INDEX,
+        vector=True,
+    ),
+]
+
+
+class TestSchemaManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        pass
+
+    def test_bootstrap(self) -> None:
+        driver = FakeDriver(polls_until_online=3)
+        schema_manager = SchemaManager(driver, schema=SCHEMA, poll_interval=0.0)
+
+        ready = asyncio.run(schema_manager.bootstrap())
+        warmups = [p for q, p in driver.queries if q == queries.WARMUP_VECTOR_INDEX]
+
+        self.assertTrue(ready)
+        self.assertEqual(driver.polls, 3)
+        self.assertEqual(schema_manager.index_names, ["message_id", "document-embeddings"])
+        self.assertEqual([p["name"] for p in warmups], ["document-embeddings"])
+        self.assertEqual(len(warmups[0]["embedding"]), 768)
+        self.assertEqual(schema_manager.get_stats()["online_indexes"], 2)
+
+    def test_constraint_fallback(self) -> None:
+        driver = FakeDriver(failing_queries=(queries.CREATE_MESSAGE_ID_CONSTRAINT,))
+        schema_manager = SchemaManager(driver, schema=SCHEMA, poll_interval=0.0)
+
+        asyncio.run(schema_manager.bootstrap())
+
+        self.assertEqual(
+            schema_manager.index_names, ["message_id_range", "document-embeddings"]
+        )
+
+    def test_online_timeout(self) -> None:
+        driver = FakeDriver(polls_until_online=1_000)
+        schema_manager = SchemaManager(
+            driver, schema=SCHEMA, online_timeout=0.05, poll_interval=0.01
+        )
+
+        ready = asyncio.run(schema_manager.bootstrap())
+
+        self.assertFalse(ready)
+        self.assertFalse(
+            any(q == queries.WARMUP_VECTOR_INDEX for q, _ in driver.queries)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+
+from tools import secret_cache
+from tools.secret_manager import SecretManager
+
+
+class SecretClientMock:
+    """
+    Stands in for the GCP SecretManagerServiceClient.
+    """
+
+    def __init__(self, secrets: dict) -> None:
+        self.secrets = secrets
+        self.calls = 0
+        self.fail = False
+
+    def access_secret_version(self, request: dict):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("secret manager unavailable.")
+        secret_id = request["name"].split("/")[3]
+        return SimpleNamespace(
+            payload=SimpleNamespace(data=self.secrets[secret_id].encode("UTF-8"))
+        )
+
+
+class TestSecretManager(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.secrets = {"neo4j_username": "neo4j", "config": '{"region": "us"}'}
+
+    def test_cached_lookup(self) -> None:
+        client = SecretClientMock(self.secrets)
+        sm = SecretManager(project_id="proj", client=client, ttl_seconds=60)
+
+        self.assertEqual(sm.access_secret_version("neo4j_username"), "neo4j")
+        self.assertEqual(sm.access_secret_version("neo4j_username"), "neo4j")
+        self.assertEqual(sm.access_secret_version("config"), {"region": "us"})
+        self.assertEqual(client.calls, 2)
+        sm.close()
+
+    def test_prefetch(self) -> None:
+        client = SecretClientMock(self.secrets)
+        sm = SecretManager(project_id="proj", client=client, ttl_seconds=60)
+
+        secrets = sm.prefetch(["neo4j_username", "config", "missing"])
+        self.assertEqual(set(secrets.keys()), {"neo4j_username", "config"})
+
+        sm.access_secret_version("neo4j_username")
+        sm.access_secret_version("config")
+        self.assertEqual(client.calls, 3)
+        sm.close()
+
+    def test_aprefetch(self) -> None:
+        client = SecretClientMock(self.secrets)
+        sm = SecretManager(project_id="proj", client=client, ttl_seconds=60)
+
+        secrets = asyncio.run(sm.aprefetch(["neo4j_username", "config"]))
+
+        self.assertEqual(secrets["neo4j_username"], "neo4j")
+        self.assertEqual(sm.access_secret_version("config"), {"region": "us"})
+        self.assertEqual(client.calls, 2)
+        sm.close()
+
+    def test_app_import_is_lazy(self) -> None:
+        # importing the app must not call GCP or import the chat model and Vertex AI SDKs
+        code = (
+            "import sys, main; "
+            "heavy = [m for m in ('google.cloud.secretmanager', 'langchain_google_vertexai', "
+            "'langchain_community', 'vertexai', 'openai') if m in sys.modules]; "
+            "print(heavy)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], "[]")
+
+    def test_stale_value_served_when_refresh_fails(self) -> None:
+        client = SecretClientMock(self.secrets)
+        sm = SecretManager(
+            project_id="proj", client=client, ttl_seconds=0, background_refresh=False
+        )
+
+        sm.access_secret_version("neo4j_username")
+        client.fail = True
+        self.assertEqual(sm.access_secret_version("neo4j_username"), "neo4j")
+        sm.close()
+
+    def test_background_refresh(self) -> None:
+        client = SecretClientMock(dict(self.secrets))
+        sm = SecretManager(project_id="proj", client=client, ttl_seconds=0)
+
+        sm.access_secret_version("neo4j_username")
+        client.secrets["neo4j_username"] = "admin"
+
+        # the stale value is served while the refresh happens in the background
+        self.assertEqual(sm.access_secret_version("neo4j_username"), "neo4j")
+
+        for _ in range(100):
+            if sm._cache[("neo4j_username", "latest")][0] == "admin":
+                break
+            time.sleep(0.01)
+
+        self.assertEqual(sm._cache[("neo4j_username", "latest")][0], "admin")
+        sm.close()
+
+    def test_invalidate(self) -> None:
+        client = SecretClientMock(self.secrets)
+        sm = SecretManager(project_id="proj", client=client, ttl_seconds=60)
+
+        sm.access_secret_version("neo4j_username")
+        sm.invalidate("neo4j_username")
+        sm.access_secret_version("neo4j_username")
+        self.assertEqual(client.calls, 2)
+        sm.close()
+
+    def test_airflow_library_shares_the_cache(self) -> None:
+        airflow_path = os.path.join(
+            os.path.dirname(__file__),
+            "../../../python/airflow/libs/fetcher/secret_cache.py",
+        )
+
+        # the Airflow images are built without the backend, so the copy must be a real file
+        self.assertFalse(os.path.islink(airflow_path))
+        with open(airflow_path) as airflow_copy, open(secret_cache.__file__) as backend_copy:
+            self.assertEqual(airflow_copy.read(), backend_copy.read())
@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+from typing import List
+
+from tools.semantic_cache import SemanticCache
+
+
+class CachedAnswerReaderMock:
+    def __init__(self, answer) -> None:
+        self.answer = answer
+
+    async def retrieve_cached_answer(
+        self,
+        question_embedding: List[float],
+        llm_type: str,
+        similarity_threshold: float,
+        number_of_candidates: int = 5,
+    ):
+        if isinstance(self.answer, Exception):
+            raise self.answer
+        return self.answer
+
+
+class TestSemanticCache(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.answer = {
+            "message_id": "llm-123",
+            "content": "GDS is cool.",
+            "score": 0.99,
+            "context_ids": [],
+        }
+
+    def test_hit_rate(self) -> None:
+        cache = SemanticCache(similarity_threshold=0.95)
+
+        hit = asyncio.run(
+            cache.lookup(CachedAnswerReaderMock(self.answer), [0.1, 0.2], "gemini")
+        )
+        miss = asyncio.run(
+            cache.lookup(CachedAnswerReaderMock(None), [0.1, 0.2], "gemini")
+        )
+
+        self.assertEqual(hit["content"], "GDS is cool.")
+        self.assertIsNone(miss)
+        self.assertEqual(cache.get_stats()["hit_rate"], 0.5)
+
+    def test_errors_are_misses(self) -> None:
+        cache = SemanticCache()
+
+        answer = asyncio.run(
+            cache.lookup(
+                CachedAnswerReaderMock(RuntimeError("no such index")),
+                [0.1, 0.2],
+                "gemini",
+            )
+        )
+
+        self.assertIsNone(answer)
+        self.assertEqual(cache.get_stats()["errors"], 1)
@@ -0,0 +1,189 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from typing import Any, Dict, List
+
+import numpy as np
+
+from tools.retrieval import retrieve_context
+from tools.vector_index import LocalVectorIndex
+
+
+def make_documents(count: int, start: int = 0, dimensions: int = 8) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(start)
+    return [
+        {
+            "index": f"doc-{i:04d}",
+            "url": f"http://{i}",
+            "text": f"text {i}",
+            "embedding": rng.normal(size=dimensions).tolist(),
+            "createTime": 1_000 + i,
+        }
+        for i in range(start, start + count)
+    ]
+
+
+class PagedGraphReaderMock:
+    def __init__(self, documents: List[Dict[str, Any]]) -> None:
+        self.documents = documents
+        self.pages = 0
+
+    async def retrieve_document_embeddings(
+        self, created_after: int = 0, after_index: str = "", limit: int = 1_000
+    ) -> List[Dict[str, Any]]:
+        self.pages += 1
+        remaining = [
+            d
+            for d in self.documents
+            if (d["createTime"], d["index"]) > (created_after, after_index)
+        ]
+        return remaining[:limit]
+
+
+class SlowGraphReaderMock:
+    async def retrieve_context_documents(
+        self, question_embedding: List[float], number_of_context_documents: int = 10
+    ):
+        await asyncio.sleep(1)
+        raise AssertionError("The fallback should have answered first.")
+
+
+class TestLocalVectorIndex(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_search_matches_brute_force(self) -> None:
+        documents = make_documents(50)
+        index = LocalVectorIndex(self.directory.name)
+        index.add_documents(documents)
+
+        query = documents[7]["embedding"]
+        context = index.search(query, k=5)
+
+        matrix = np.asarray([d["embedding"] for d in documents])
+        cosine = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+        expected = [documents[i]["index"] for i in np.argsort(-cosine)[:5]]
+
+        self.assertEqual(context.indices, expected)
+        self.assertEqual(context[0].index, "doc-0007")
+        self.assertAlmostEqual(context[0].score, 1.0, places=5)
+        self.assertEqual(context[0].url, "http://7")
+
+    def test_search_many(self) -> None:
+        documents = make_documents(20)
+        index = LocalVectorIndex(self.directory.name, chunk_size=6)
+        index.add_documents(documents)
+
+        results = index.search_many(
+            [documents[3]["embedding"], documents[15]["embedding"]], k=2
+        )
+
+        self.assertEqual([r[0].index for r in results], ["doc-0003", "doc-0015"])
+
+    def test_int8_quantization(self) -> None:
+        documents = make_documents(50)
+        index = LocalVectorIndex(self.directory.name, dtype="int8")
+        index.add_documents(documents)
+
+        context = index.search(documents[11]["embedding"], k=1)
+
+        self.assertEqual(context.indices, ["doc-0011"])
+        self.assertAlmostEqual(context[0].score, 1.0, places=2)
+
+    def test_incremental_refresh(self) -> None:
+        documents = make_documents(25)
+        reader = PagedGraphReaderMock(documents[:10])
+        index = LocalVectorIndex(self.directory.name)
+
+        self.assertEqual(asyncio.run(index.refresh(reader, page_size=4)), 10)
+        self.assertEqual(index.watermark, {"create_time": 1_009, "index": "doc-0009"})
+
+        reader.documents = documents
+        self.assertEqual(asyncio.run(index.refresh(reader, page_size=4)), 15)
+        self.assertEqual(len(index), 25)
+
+    def test_refresh_does_not_block_the_event_loop(self) -> None:
+        index = LocalVectorIndex(self.directory.name)
+        append = index._append
+
+        def slow_append(documents: List[Dict[str, Any]]) -> None:
+            time.sleep(0.05)
+            append(documents)
+
+        index._append = slow_append
+
+        async def run():
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            ticker = asyncio.create_task(tick())
+            mirrored = await index.refresh(PagedGraphReaderMock(make_documents(8)), page_size=4)
+            ticker.cancel()
+            return mirrored, ticks
+
+        mirrored, ticks = asyncio.run(run())
+
+        self.assertEqual(mirrored, 8)
+        self.assertGreater(ticks, 5)
+
+    def test_existing_document_is_overwritten(self) -> None:
+        documents = make_documents(5)
+        index = LocalVectorIndex(self.directory.name)
+        index.add_documents(documents)
+
+        updated = dict(documents[2], text="new text", createTime=2_000)
+        index.add_documents([updated])
+
+        self.assertEqual(len(index), 5)
+        self.assertEqual(index.search(updated["embedding"], k=1)[0].text, "new text")
+
+    def test_workers_share_the_index(self) -> None:
+        writer_index = LocalVectorIndex(self.directory.name)
+        reader_index = LocalVectorIndex(self.directory.name)
+        self.assertEqual(len(reader_index), 0)
+
+        documents = make_documents(5)
+        writer_index.add_documents(documents)
+
+        self.assertEqual(len(reader_index), 5)
+        self.assertEqual(
+            reader_index.search(documents[4]["embedding"], k=1).indices, ["doc-0004"]
+        )
+
+    def test_empty_index(self) -> None:
+        index = LocalVectorIndex(self.directory.name)
+
+        self.assertEqual(len(index.search([0.1, 0.2], k=3)), 0)
+
+    def test_slow_neo4j_falls_back_to_local_index(self) -> None:
+        documents = make_documents(10)
+        index = LocalVectorIndex(self.directory.name)
+        index.add_documents(documents)
+
+        context = asyncio.run(
+            retrieve_context(
+                reader=SlowGraphReaderMock(),
+                question_embedding=documents[0]["embedding"],
+                retrieval_mode="vector",
+                number_of_documents=3,
+                local_index=index,
+                fallback_timeout=0.05,
+            )
+        )
+
+        self.assertEqual(context[0].index, "doc-0000")
+        self.assertEqual(len(context), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
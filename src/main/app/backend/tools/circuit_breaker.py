@@ -0,0 +1,257 @@
+import asyncio
+import os
+import time
+from functools import lru_cache
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+from tools.metrics import REGISTRY
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BREAKER_TRANSITIONS = REGISTRY.counter(
+    "circuit_breaker_transitions_total",
+    "Circuit breaker state changes.",
+    ["breaker", "state"],
+)
+
+# the deadline of each stage in seconds, which may be overridden with {STAGE}_TIMEOUT_SECONDS
+STAGE_TIMEOUTS = {
+    "embedding": 5.0,
+    "graph_reader": 5.0,
+    "llm": 90.0,
+}
+
+
+class DependencyUnavailableError(Exception):
+    """
+    Raised when a dependency behind a circuit breaker fails or can not be used.
+    """
+
+
+class CircuitOpenError(DependencyUnavailableError):
+    """
+    Raised instead of calling a dependency whose circuit breaker is open.
+    """
+
+
+class DeadlineExceededError(DependencyUnavailableError):
+    """
+    Raised when a dependency does not respond within the deadline of its circuit breaker.
+    """
+
+
+class CircuitBreaker:
+    """
+    Bound the time spent waiting on a dependency and stop calling it while it is failing.
+    Each call must finish within timeout seconds. After failure_threshold consecutive failures the breaker opens
+    and calls are rejected with CircuitOpenError, without waiting on the dependency.
+    After reset_timeout seconds the breaker is half open and lets a single trial call through.
+    The breaker closes if the trial succeeds and opens again if it fails.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float = 5.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejections = 0
+        self.opened = 0
+
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    @property
+    def is_open(self) -> bool:
+        """
+        Whether calls would currently be rejected without reaching the dependency.
+        """
+
+        if self.state == OPEN:
+            return time.monotonic() - self._opened_at < self.reset_timeout
+
+        return self.state == HALF_OPEN and self._trial_in_flight
+
+    async def call(
+        self,
+        work: Callable[[], Awaitable[T]],
+        ignored_exceptions: Tuple[Type[BaseException], ...] = (),
+    ) -> T:
+        """
+        Await work() within the deadline.
+        Failures are raised as DependencyUnavailableError, with the original error as the cause.
+        Ignored exceptions, such as invalid requests, are raised unchanged without counting as failures of the dependency.
+        """
+
+        trial = self._before_call()
+        try:
+            result = await asyncio.wait_for(work(), self.timeout)
+
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._on_failure()
+            raise DeadlineExceededError(
+                f"{self.name} did not respond within {self.timeout} seconds."
+            ) from None
+
+        except ignored_exceptions:
+            raise
+
+        except Exception as err:
+            self._on_failure()
+            raise DependencyUnavailableError(f"{self.name} failed: {err}") from err
+
+        else:
+            self._on_success()
+            return result
+
+        finally:
+            if trial:
+                self._trial_in_flight = False
+
+    async def stream(
+        self,
+        work: Callable[[], AsyncIterator[T]],
+        ignored_exceptions: Tuple[Type[BaseException], ...] = (),
+    ) -> AsyncIterator[T]:
+        """
+        Iterate over work() until it is exhausted or the deadline passes.
+        The deadline covers the whole stream rather than each item.
+        """
+
+        trial = self._before_call()
+        deadline = time.monotonic() + self.timeout
+        iterator = work().__aiter__()
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        iterator.__anext__(), deadline - time.monotonic()
+                    )
+                except StopAsyncIteration:
+                    break
+                yield item
+
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._on_failure()
+            raise DeadlineExceededError(
+                f"{self.name} did not finish streaming within {self.timeout} seconds."
+            ) from None
+
+        except ignored_exceptions:
+            raise
+
+        except Exception as err:
+            self._on_failure()
+            raise DependencyUnavailableError(f"{self.name} failed: {err}") from err
+
+        else:
+            self._on_success()
+
+        finally:
+            if trial:
+                self._trial_in_flight = False
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the state, where 0 is closed, 1 is half open and 2 is open, along with the call counters.
+        """
+
+        return {
+            "state": STATE_VALUES[self.state],
+            "consecutive_failures": self.consecutive_failures,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejections": self.rejections,
+            "opened": self.opened,
+        }
+
+    def _before_call(self) -> bool:
+        """
+        Reject the call if the breaker is open. Returns whether the call is the half open trial.
+        """
+
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(HALF_OPEN)
+
+        if self.state == OPEN or (self.state == HALF_OPEN and self._trial_in_flight):
+            self.rejections += 1
+            raise CircuitOpenError(f"{self.name} is unavailable. The circuit breaker is open.")
+
+        self.calls += 1
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = True
+            return True
+
+        return False
+
+    def _on_success(self) -> None:
+        self.consecutive_failures = 0
+        if self.state != CLOSED:
+            self._transition(CLOSED)
+
+    def _on_failure(self) -> None:
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            if self.state != OPEN:
+                self.opened += 1
+                self._transition(OPEN)
+
+    def _transition(self, state: str) -> None:
+        print(f"circuit breaker {self.name} is {state.replace('_', ' ')}.")
+        self.state = state
+        BREAKER_TRANSITIONS.inc(breaker=self.name, state=state)
+
+
+@lru_cache(maxsize=None)
+def get_circuit_breaker(stage: str, dependency: Optional[str] = None) -> CircuitBreaker:
+    """
+    Retrieve the process-wide circuit breaker of a stage, such as 'embedding', 'graph_reader' or 'llm'.
+    A stage may have a breaker for each dependency, such as each LLM type.
+    The deadline and thresholds are read from {STAGE}_TIMEOUT_SECONDS, {STAGE}_BREAKER_FAILURES and
+    {STAGE}_BREAKER_RESET_SECONDS.
+    """
+
+    prefix = stage.upper()
+    name = stage if dependency is None else f"{stage}_{dependency}"
+    name = name.replace(" ", "_").replace("-", "_").replace(".", "_")
+
+    circuit_breaker = CircuitBreaker(
+        name=name,
+        timeout=float(
+            os.environ.get(f"{prefix}_TIMEOUT_SECONDS", STAGE_TIMEOUTS.get(stage, 5.0))
+        ),
+        failure_threshold=int(os.environ.get(f"{prefix}_BREAKER_FAILURES", 5)),
+        reset_timeout=float(os.environ.get(f"{prefix}_BREAKER_RESET_SECONDS", 30)),
+    )
+    REGISTRY.register_collector(f"circuit_breaker_{name}", circuit_breaker.get_stats)
+    return circuit_breaker
@@ -0,0 +1,189 @@
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from typing import List, Optional, Set
+
+from objects.context import ContextDocument, ContextSet
+
+
+@dataclass(frozen=True)
+class ModelBudget:
+    """
+    The token limits of an LLM.
+    The prompt may use whatever is left of the context window after max_output_tokens.
+    """
+
+    context_window: int
+    max_output_tokens: int
+    tokenizer: str = "estimate"
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.context_window - self.max_output_tokens
+
+
+MODEL_BUDGETS = {
+    "chat-bison 2k": ModelBudget(context_window=5_120, max_output_tokens=1_024),
+    "chat-bison 32k": ModelBudget(context_window=32_768, max_output_tokens=8_192),
+    "gemini": ModelBudget(context_window=32_760, max_output_tokens=2_048),
+    "gpt-4 8k": ModelBudget(
+        context_window=8_192, max_output_tokens=1_024, tokenizer="cl100k_base"
+    ),
+    "gpt-4 32k": ModelBudget(
+        context_window=32_768, max_output_tokens=2_048, tokenizer="cl100k_base"
+    ),
+    "fake": ModelBudget(context_window=8_192, max_output_tokens=1_024),
+}
+
+
+class TokenCounter:
+    """
+    Count tokens with the model family's tokenizer.
+    If the tokenizer is unavailable, then tokens are estimated at four characters each.
+    """
+
+    def __init__(self, tokenizer: str = "estimate") -> None:
+        self.tokenizer = tokenizer
+        self._encoding = None
+        if tokenizer != "estimate":
+            try:
+                import tiktoken
+
+                self._encoding = tiktoken.get_encoding(tokenizer)
+            except Exception as err:
+                print(f"unable to load the {tokenizer} tokenizer. estimating tokens. {err}")
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+
+        return (len(text) + 3) // 4
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Return the longest prefix of the text that fits in max_tokens.
+        """
+
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[:max_tokens])
+
+        return text[: max_tokens * 4]
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(tokenizer: str) -> TokenCounter:
+    return TokenCounter(tokenizer)
+
+
+class ContextPacker:
+    """
+    Select and render the context documents that fit an LLM's prompt budget.
+    Documents are ordered by score, near-duplicates of a higher ranked document are dropped,
+    and the tail is trimmed so the prompt leaves room for the response.
+    """
+
+    def __init__(
+        self,
+        budget: ModelBudget,
+        duplicate_threshold: float = 0.8,
+        min_document_tokens: int = 64,
+    ) -> None:
+        self.budget = budget
+        self.duplicate_threshold = duplicate_threshold
+        self.min_document_tokens = min_document_tokens
+        self.token_counter = get_token_counter(budget.tokenizer)
+
+    def pack(self, context: ContextSet, reserved_tokens: int = 0) -> ContextSet:
+        """
+        Return the documents to use as context, in prompt order.
+        reserved_tokens is the size of the rest of the prompt, such as the template and question.
+        A document that only partly fits is truncated if at least min_document_tokens of it fit.
+        """
+
+        remaining = self.budget.prompt_tokens - reserved_tokens
+        packed: List[ContextDocument] = list()
+        shingles: List[Set[str]] = list()
+
+        for document in self._order_by_score(context):
+            document_shingles = _get_shingles(document.text)
+            if any(
+                _jaccard(document_shingles, s) >= self.duplicate_threshold
+                for s in shingles
+            ):
+                continue
+
+            tokens = self.token_counter.count(
+                render_document(len(packed) + 1, document)
+            )
+            if tokens <= remaining:
+                packed.append(document)
+                shingles.append(document_shingles)
+                remaining -= tokens
+                continue
+
+            # the header and delimiters take a few tokens of their own
+            header_tokens = tokens - self.token_counter.count(document.text)
+            if remaining - header_tokens >= self.min_document_tokens:
+                packed.append(
+                    replace(
+                        document,
+                        text=self.token_counter.truncate(
+                            document.text, remaining - header_tokens
+                        ),
+                    )
+                )
+            break
+
+        return ContextSet(packed)
+
+    def _order_by_score(self, context: ContextSet) -> List[ContextDocument]:
+        # retrieval order is kept unless every document is scored
+        if any(document.score is None for document in context):
+            return list(context)
+
+        return sorted(context, key=lambda document: document.score, reverse=True)
+
+
+def get_context_packer(llm_type: str) -> ContextPacker:
+    """
+    Retrieve a context packer with the LLM's token budget.
+    """
+
+    return ContextPacker(budget=MODEL_BUDGETS.get(llm_type, MODEL_BUDGETS["gpt-4 8k"]))
+
+
+def render_document(position: int, document: ContextDocument) -> str:
+    """
+    Render one context document as a numbered source followed by its text.
+    """
+
+    return f"[{position}] {document.url}\n{document.text}\n---\n"
+
+
+def render_context(context: Optional[ContextSet]) -> str:
+    """
+    Render context documents in a compact delimited format for the prompt.
+    """
+
+    if context is None:
+        return ""
+
+    return "\n" + "".join(
+        render_document(position, document)
+        for position, document in enumerate(context, start=1)
+    )
+
+
+def _get_shingles(text: str, size: int = 3) -> Set[str]:
+    words = re.findall(r"\w+", text.casefold())
+    if len(words) < size:
+        return {" ".join(words)}
+
+    return {" ".join(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if len(a) == 0 and len(b) == 0:
+        return 1.0
+
+    return len(a & b) / len(a | b)
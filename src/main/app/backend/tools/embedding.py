@@ -1,8 +1,11 @@
+import asyncio
+import hashlib
 import random
-from typing import List, Dict, Protocol
-
-from google.cloud import aiplatform
-from vertexai.language_models import TextEmbeddingModel
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Dict, Optional, Protocol, Set, Tuple
 
 
 class EmbeddingServiceProtocol(Protocol):
@@ -12,10 +15,38 @@ class EmbeddingServiceProtocol(Protocol):
         """
         pass
 
+    async def aget_embedding(self, text: str) -> List[float]:
+        """
+        Asynchronously retrieve an embedding of the provided text.
+        """
+        pass
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Retrieve an embedding for each of the provided texts, in order.
+        """
+        pass
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Asynchronously retrieve an embedding for each of the provided texts, in order.
+        """
+        pass
+
 
 class TextEmbeddingService:
-    def __init__(self):
-        self.model = TextEmbeddingModel.from_pretrained("textembedding-gecko@001")
+    def __init__(
+        self,
+        model_name: str = "textembedding-gecko@001",
+        max_texts_per_request: int = 5,
+    ):
+        # the Vertex AI SDK is slow to import, so it is imported when the service is first created
+        from google.cloud import aiplatform
+        from vertexai.language_models import TextEmbeddingModel
+
+        self.model_name = model_name
+        self.max_texts_per_request = max_texts_per_request
+        self.model = TextEmbeddingModel.from_pretrained(model_name)
         # self.credentials = os.getenv('GOOGLE_APPLICATION_CREDENTIALS')
 
         self.aiplatform_client = aiplatform.init()
@@ -26,7 +57,339 @@ class TextEmbeddingService:
         embeddings = self.model.get_embeddings([text])
         return embeddings[0].values
 
+    async def aget_embedding(self, text: str) -> List[float]:
+        embeddings = await self.model.get_embeddings_async([text])
+        return embeddings[0].values
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings = list()
+        for i in range(0, len(texts), self.max_texts_per_request):
+            embeddings.extend(
+                self.model.get_embeddings(texts[i : i + self.max_texts_per_request])
+            )
+        return [e.values for e in embeddings]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        embeddings = list()
+        for i in range(0, len(texts), self.max_texts_per_request):
+            embeddings.extend(
+                await self.model.get_embeddings_async(
+                    texts[i : i + self.max_texts_per_request]
+                )
+            )
+        return [e.values for e in embeddings]
+
 
 class FakeEmbeddingService:
+    model_name = "fake"
+
     def get_embedding(self, text: str) -> List[float]:
         return [random.random() for _ in range(768)]
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        return self.get_embedding(text)
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return [self.get_embedding(text) for text in texts]
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.get_embeddings(texts)
+
+
+class CachedEmbeddingService:
+    """
+    Wrap an embedding service with a bounded in-memory LRU cache and an optional sqlite disk cache.
+    Entries are keyed on the normalized text and the embedding model name.
+    The disk cache survives restarts and may be shared by every worker on a host.
+    The async methods read and write the disk cache in a worker thread, so the event loop does not wait on sqlite.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingServiceProtocol,
+        max_size: int = 10_000,
+        cache_path: Optional[str] = None,
+    ) -> None:
+        self.embedding_service = embedding_service
+        self.model_name = getattr(embedding_service, "model_name", "unknown")
+        self.max_size = max_size
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._memory: OrderedDict[str, List[float]] = OrderedDict()
+        # the memory lock is only held briefly, so the event loop never waits on the disk lock
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk = None
+        if cache_path is not None:
+            self._disk = sqlite3.connect(cache_path, check_same_thread=False)
+            self._disk.execute("pragma journal_mode=wal")
+            self._disk.execute(
+                "create table if not exists embeddings (key text primary key, embedding blob)"
+            )
+            self._disk.commit()
+
+    def get_embedding(self, text: str) -> List[float]:
+        key = self._get_key(text)
+        embedding = self._lookup([key])[0]
+        if embedding is None:
+            embedding = self.embedding_service.get_embedding(text)
+            self._store({key: embedding})
+
+        return embedding
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        key = self._get_key(text)
+        embedding = (await self._alookup([key]))[0]
+        if embedding is None:
+            embedding = await self.embedding_service.aget_embedding(text)
+            await self._astore({key: embedding})
+
+        return embedding
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._get_key(text) for text in texts]
+        embeddings = self._lookup(keys)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        if len(missing) > 0:
+            new_embeddings = self.embedding_service.get_embeddings(
+                [texts[i] for i in missing]
+            )
+            for i, embedding in zip(missing, new_embeddings):
+                embeddings[i] = embedding
+            self._store({keys[i]: embeddings[i] for i in missing})
+
+        return embeddings
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._get_key(text) for text in texts]
+        embeddings = await self._alookup(keys)
+        missing = [i for i, e in enumerate(embeddings) if e is None]
+        if len(missing) > 0:
+            new_embeddings = await self.embedding_service.aget_embeddings(
+                [texts[i] for i in missing]
+            )
+            for i, embedding in zip(missing, new_embeddings):
+                embeddings[i] = embedding
+            await self._astore({keys[i]: embeddings[i] for i in missing})
+
+        return embeddings
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return the cache hit, miss and eviction counters.
+        """
+
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """
+        Close the disk cache.
+        """
+
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+    def _get_key(self, text: str) -> str:
+        normalized_text = " ".join(text.split()).casefold()
+        return hashlib.sha256(
+            f"{self.model_name}\x00{normalized_text}".encode("UTF-8")
+        ).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> List[Optional[List[float]]]:
+        embeddings = self._lookup_memory(keys)
+        missing = [key for key, e in zip(keys, embeddings) if e is None]
+        found = self._lookup_disk(missing) if len(missing) > 0 else dict()
+
+        return self._merge_lookups(keys, embeddings, found)
+
+    async def _alookup(self, keys: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up embeddings without blocking the event loop. Only the disk cache is read in a worker thread.
+        """
+
+        embeddings = self._lookup_memory(keys)
+        missing = [key for key, e in zip(keys, embeddings) if e is None]
+        found = dict()
+        if len(missing) > 0 and self._disk is not None:
+            found = await asyncio.to_thread(self._lookup_disk, missing)
+
+        return self._merge_lookups(keys, embeddings, found)
+
+    def _lookup_memory(self, keys: List[str]) -> List[Optional[List[float]]]:
+        embeddings = list()
+        with self._lock:
+            for key in keys:
+                embedding = self._memory.get(key)
+                if embedding is not None:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                embeddings.append(embedding)
+
+        return embeddings
+
+    def _lookup_disk(self, keys: List[str]) -> Dict[str, List[float]]:
+        with self._disk_lock:
+            if self._disk is None:
+                return dict()
+            found = {
+                key: array("d", row[0]).tolist()
+                for key in keys
+                for row in self._disk.execute(
+                    "select embedding from embeddings where key = ?", (key,)
+                ).fetchall()
+            }
+
+        with self._lock:
+            for key, embedding in found.items():
+                self._remember(key, embedding)
+            self.hits += len(found)
+            self.disk_hits += len(found)
+
+        return found
+
+    def _merge_lookups(
+        self,
+        keys: List[str],
+        embeddings: List[Optional[List[float]]],
+        found: Dict[str, List[float]],
+    ) -> List[Optional[List[float]]]:
+        embeddings = [
+            e if e is not None else found.get(key) for key, e in zip(keys, embeddings)
+        ]
+        with self._lock:
+            self.misses += sum(1 for e in embeddings if e is None)
+
+        return embeddings
+
+    def _store(self, embeddings: Dict[str, List[float]]) -> None:
+        self._store_memory(embeddings)
+        self._store_disk(embeddings)
+
+    async def _astore(self, embeddings: Dict[str, List[float]]) -> None:
+        """
+        Store embeddings without blocking the event loop. Only the disk cache is written in a worker thread.
+        """
+
+        self._store_memory(embeddings)
+        if self._disk is not None:
+            await asyncio.to_thread(self._store_disk, embeddings)
+
+    def _store_memory(self, embeddings: Dict[str, List[float]]) -> None:
+        with self._lock:
+            for key, embedding in embeddings.items():
+                self._remember(key, embedding)
+
+    def _store_disk(self, embeddings: Dict[str, List[float]]) -> None:
+        with self._disk_lock:
+            if self._disk is None:
+                return
+            self._disk.executemany(
+                "insert or replace into embeddings (key, embedding) values (?, ?)",
+                [(key, array("d", e).tobytes()) for key, e in embeddings.items()],
+            )
+            self._disk.commit()
+
+    def _remember(self, key: str, embedding: List[float]) -> None:
+        self._memory[key] = embedding
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+
+class BatchingEmbeddingService:
+    """
+    Coalesce concurrent aget_embedding calls into batched embedding requests.
+    Calls that arrive within max_wait_ms of each other are sent together, up to max_batch_size texts,
+    and each caller receives its own embedding.
+    Synchronous calls are passed straight through to the wrapped service.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingServiceProtocol,
+        max_batch_size: int = 5,
+        max_wait_ms: float = 10.0,
+    ) -> None:
+        self.embedding_service = embedding_service
+        self.model_name = getattr(embedding_service, "model_name", "unknown")
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+
+        self.requests = 0
+        self.batches = 0
+
+        self._pending: List[Tuple[str, asyncio.Future]] = list()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def get_embedding(self, text: str) -> List[float]:
+        return self.embedding_service.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self.embedding_service.get_embeddings(texts)
+
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self.embedding_service.aget_embeddings(texts)
+
+    async def aget_embedding(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        self.requests += 1
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait_ms / 1000, self._flush)
+
+        return await future
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return the number of embedding requests received and batches sent.
+        """
+
+        return {"requests": self.requests, "batches": self.batches}
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        while len(self._pending) > 0:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.create_task(self._embed_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _embed_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        # identical texts in a batch share a single embedding
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+
+        try:
+            embeddings = await self.embedding_service.aget_embeddings(texts)
+        except Exception as err:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(err)
+            return
+
+        embeddings_by_text = dict(zip(texts, embeddings))
+        for text, future in batch:
+            if not future.done():
+                future.set_result(embeddings_by_text[text])
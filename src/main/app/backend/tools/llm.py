@@ -1,22 +1,42 @@
 import os
-from functools import cached_property
-from typing import Optional
+import threading
+from functools import cached_property, lru_cache
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, Optional, Sequence, Tuple
 
-import openai
-from langchain_community.chat_models import AzureChatOpenAI, FakeListChatModel
-
-from langchain_google_vertexai import ChatVertexAI
-
-import pandas as pd
-from pydantic import BaseModel, Field, field_validator, computed_field
+from pydantic import BaseModel, Field, PrivateAttr, field_validator, computed_field
 
+from objects.context import ContextSet
 from objects.question import Question
-from resources.prompts.prompts import prompt_no_context_template, prompt_template
+from resources.prompts.prompts import (
+    conversation_history_template,
+    prompt_no_context_template,
+    prompt_template,
+)
 from resources.valid_models import VALID_MODELS
-from tools.secret_manager import SecretManager
+from tools.circuit_breaker import get_circuit_breaker
+from tools.context_packer import get_context_packer, render_context
+from tools.llm_scheduler import get_llm_scheduler
+from tools.metrics import REGISTRY, record_token_usage, span
+from tools.secret_manager import SecretManager, get_secret_manager
+
+if TYPE_CHECKING:
+    # the chat model SDKs are slow to import, so they are imported when a client is first created
+    from langchain_core.language_models import BaseChatModel
+
+
+# the completion is counted against the tokens per minute quota before it is known
+EXPECTED_COMPLETION_TOKENS = int(os.environ.get("LLM_EXPECTED_COMPLETION_TOKENS", 300))
+
+
+def configure_langsmith(secret_manager: Optional[SecretManager] = None) -> None:
+    """
+    Provide the LangSmith API key for tracing, unless it is already set in the environment.
+    """
 
-sm = SecretManager()
-os.environ["LANGCHAIN_API_KEY"] = sm.access_secret_version("langsmith_api_key")
+    if secret_manager is not None and "LANGCHAIN_API_KEY" not in os.environ:
+        os.environ["LANGCHAIN_API_KEY"] = secret_manager.access_secret_version(
+            "langsmith_api_key"
+        )
 
 
 class LLM(BaseModel):
@@ -29,6 +49,9 @@ class LLM(BaseModel):
         default=0.0, ge=0.0, le=1.0, description="Temperature parameter for the LLM."
     )
 
+    _served_llm_type: Optional[str] = PrivateAttr(default=None)
+    _packed_context: Optional[ContextSet] = PrivateAttr(default=None)
+
     @field_validator("llm_type")
     def validate_llm_type(cls, v: str) -> str:
         if v.lower() not in VALID_MODELS + ["fake"]:
@@ -39,105 +62,410 @@ class LLM(BaseModel):
 
     @computed_field
     @cached_property
-    def llm_instance(self) -> ChatVertexAI | AzureChatOpenAI | FakeListChatModel:
-        return self._init_llm()
-
-    def _init_llm(self):
-        """
-        This function initializes an LLM for conversation.
-        Each time the LLM type is changed, the conversation is reinitialized
-        and history is lost.
-        """
-
-        match self.llm_type:
-            case "fake":
-                return FakeListChatModel(responses=["GDS is cool."])
-            case "chat-bison 2k":
-                return ChatVertexAI(
-                    model_name="chat-bison",
-                    max_output_tokens=1024,  # this is the max allowed
-                    temperature=self.temperature,  # default temp is 0.0
-                    top_p=0.95,  # default is 0.95
-                    top_k=40,  # default is 40
-                )
-            case "chat-bison 32k":
-                return ChatVertexAI(
-                    model_name="chat-bison-32k",
-                    max_output_tokens=8192,  # this is the max allowed
-                    temperature=self.temperature,  # default temp is 0.0
-                    top_p=0.95,  # default is 0.95
-                    top_k=40,  # default is 40
-                )
-            case "gemini":
-                return ChatVertexAI(model_name="gemini-pro")
-            case "gpt-4 8k":
-                # Tokens per Minute Rate Limit (thousands): 10
-                # Rate limit (Tokens per minute): 10000
-                # Rate limit (Requests per minute): 60
-                return AzureChatOpenAI(
-                    openai_api_version=openai.api_version,
-                    openai_api_key=openai.api_key,
-                    openai_api_base=sm.access_secret_version("openai_endpoint"),
-                    deployment_name=sm.access_secret_version("gpt4_8k_name"),
-                    model_name="gpt-4",
-                    temperature=self.temperature,
-                )  # default is 0.7
-                # return OpenAI(api_key=sm.access_secret_version("openai_key_dan"),
-                #                            model="gpt-4",
-                #                            temperature=temperature)
-            case "gpt-4 32k":
-                # Tokens per Minute Rate Limit (thousands): 30
-                # Rate limit (Tokens per minute): 30000
-                # Rate limit (Requests per minute): 180
-                return AzureChatOpenAI(
-                    openai_api_version=openai.api_version,
-                    openai_api_key=openai.api_key,
-                    openai_api_base=sm.access_secret_version("openai_endpoint"),
-                    deployment_name=sm.access_secret_version("gpt4_32k_name"),
-                    model_name="gpt-4-32k",
-                    temperature=self.temperature,
-                )  # default is 0.7
-                # return OpenAI(api_key=sm.access_secret_version("openai_key_dan"),
-                #                            model="gpt-4-32k",
-                #                            temperature=temperature)
-            case _:
-                raise ValueError("Please provide a valid LLM type.")
-
-    def _format_llm_input(self, question: str, context: Optional[pd.DataFrame] = None) -> str:
-        """
-        Format the LLM input and return the input along with the context IDs if they exist.
+    def llm_instance(self) -> Any:
+        return get_llm_client_registry().get_client(self.llm_type, self.temperature)
+
+    @property
+    def served_llm_type(self) -> str:
+        """
+        The LLM type that answered the last request. This is the fallback model if this LLM's queue was too deep.
+        """
+
+        return self._served_llm_type or self.llm_type
+
+    @property
+    def packed_context(self) -> ContextSet:
+        """
+        The context documents sent with the last request, after packing them into the served model's prompt budget.
+        """
+
+        return self._packed_context if self._packed_context is not None else ContextSet()
+
+    def pack_context(
+        self,
+        question: str,
+        context: ContextSet,
+        conversation_history: str = "",
+        llm_type: Optional[str] = None,
+    ) -> ContextSet:
+        """
+        Select the context documents that fit the prompt budget of this LLM, or of llm_type if provided.
+        The conversation history is counted against the budget first.
+        """
+
+        packer = get_context_packer(llm_type or self.llm_type)
+        reserved_tokens = packer.token_counter.count(
+            _format_conversation_history(conversation_history)
+            + prompt_template.format(question=question, context="")
+        )
+
+        return packer.pack(context, reserved_tokens=reserved_tokens)
+
+    def _prepare_llm_input(
+        self,
+        question: Question,
+        context: Optional[ContextSet] = None,
+        llm_type: Optional[str] = None,
+    ) -> Tuple[Optional[ContextSet], str]:
+        """
+        Pack the context into the prompt budget of this LLM, or of llm_type if provided, and format the LLM input.
+        Returns the packed context along with the input.
         """
 
         if context is not None:
-            return prompt_template.format(
-                question=question, context=context[["url", "text"]].to_dict("records")
+            with span("context_packing"):
+                context = self.pack_context(
+                    question.question,
+                    context,
+                    question.conversation_history,
+                    llm_type=llm_type,
+                )
+
+        with span("prompt_formatting"):
+            llm_input = self._format_llm_input(
+                question=question.question,
+                context=context,
+                conversation_history=question.conversation_history,
+            )
+
+        return context, llm_input
+
+    def _format_llm_input(
+        self,
+        question: str,
+        context: Optional[ContextSet] = None,
+        conversation_history: str = "",
+    ) -> str:
+        """
+        Format the LLM input from context that is already packed.
+        The conversation history, if any, precedes the question.
+        """
+
+        if context is not None and len(context) > 0:
+            llm_input = prompt_template.format(
+                question=question, context=render_context(context)
             )
         else:
-            return prompt_no_context_template.format(question=question)
+            llm_input = prompt_no_context_template.format(question=question)
+
+        return _format_conversation_history(conversation_history) + llm_input
 
     def get_response(
         self,
         question: Question,
         user_id: str,
         assistant_id: str,
-        context: Optional[pd.DataFrame] = None,
+        context: Optional[ContextSet] = None,
     ) -> str:
         """
         Get a response from the LLM.
         """
 
-        llm_input = self._format_llm_input(question=question.question, context=context)
+        self._packed_context, llm_input = self._prepare_llm_input(question, context)
 
         print("llm input: ", llm_input)
         # return self.llm_instance.predict(llm_input)
         return self.llm_instance.invoke(
             llm_input,
-            {
-                "metadata": {
-                    "conversation_id": question.conversation_id,
-                    "session_id": question.session_id,
-                    "user_id": user_id,
-                    "assistant_id": assistant_id,
-                }
-            },
+            self._get_run_config(
+                question=question, user_id=user_id, assistant_id=assistant_id
+            ),
+        )
+
+    async def aget_response(
+        self,
+        question: Question,
+        user_id: str,
+        assistant_id: str,
+        context: Optional[ContextSet] = None,
+    ) -> str:
+        """
+        Asynchronously get a response from the LLM.
+        Failures count against the circuit breaker of the model that served the request.
+        """
+
+        llm_type, llm_instance, llm_input = await self._schedule(question, context)
+        print(f"llm input ({llm_type}): ", llm_input)
+        response = await get_circuit_breaker("llm", llm_type).call(
+            lambda: llm_instance.ainvoke(
+                llm_input,
+                self._get_run_config(
+                    question=question, user_id=user_id, assistant_id=assistant_id
+                ),
+            )
         )
+        record_token_usage(
+            llm_type=llm_type,
+            prompt=llm_input,
+            completion=response.content,
+            usage=self._get_token_usage(response),
+        )
+
+        return response
+
+    async def astream_response(
+        self,
+        question: Question,
+        user_id: str,
+        assistant_id: str,
+        context: Optional[ContextSet] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the LLM as it is generated.
+        Failures count against the circuit breaker of the model that served the request.
+        """
+
+        llm_type, llm_instance, llm_input = await self._schedule(question, context)
+        print(f"llm input ({llm_type}): ", llm_input)
+        completion = list()
+        async for chunk in get_circuit_breaker("llm", llm_type).stream(
+            lambda: llm_instance.astream(
+                llm_input,
+                self._get_run_config(
+                    question=question, user_id=user_id, assistant_id=assistant_id
+                ),
+            )
+        ):
+            completion.append(chunk.content)
+            yield chunk.content
+
+        record_token_usage(
+            llm_type=llm_type, prompt=llm_input, completion="".join(completion)
+        )
+
+    async def _schedule(
+        self, question: Question, context: Optional[ContextSet] = None
+    ) -> Tuple[str, "BaseChatModel", str]:
+        """
+        Wait for rate limit capacity and return the LLM type, client and input to send the request to.
+        If this LLM's queue is too deep, then the fallback client is returned
+        along with an input whose retrieved context is packed again for the fallback's prompt budget.
+        """
+
+        packed_context, llm_input = self._prepare_llm_input(question, context)
+
+        tokens = get_context_packer(self.llm_type).token_counter.count(llm_input)
+        with span("llm_queue"):
+            llm_type = await get_llm_scheduler().acquire(
+                self.llm_type, tokens + EXPECTED_COMPLETION_TOKENS
+            )
+        self._served_llm_type = llm_type
+
+        if llm_type == self.llm_type:
+            self._packed_context = packed_context
+            return llm_type, self.llm_instance, llm_input
+
+        self._packed_context, llm_input = self._prepare_llm_input(
+            question, context, llm_type=llm_type
+        )
+        return (
+            llm_type,
+            get_llm_client_registry().get_client(llm_type, self.temperature),
+            llm_input,
+        )
+
+    def _get_token_usage(self, response) -> Optional[Dict[str, int]]:
+        """
+        Read the token usage reported with a response, if the provider reports it.
+        """
+
+        metadata = getattr(response, "response_metadata", None) or dict()
+        return metadata.get("token_usage") or metadata.get("usage_metadata")
+
+    def _get_run_config(
+        self, question: Question, user_id: str, assistant_id: str
+    ) -> Dict[str, Dict[str, str]]:
+        """
+        Build the run config that tags LLM calls with the conversation IDs.
+        """
+
+        return {
+            "metadata": {
+                "conversation_id": question.conversation_id,
+                "session_id": question.session_id,
+                "user_id": user_id,
+                "assistant_id": assistant_id,
+            }
+        }
+
+
+def _format_conversation_history(conversation_history: str) -> str:
+    if conversation_history == "":
+        return ""
+
+    return conversation_history_template.format(
+        conversation_history=conversation_history
+    )
+
+
+def create_llm_client(
+    llm_type: str, temperature: float
+) -> "BaseChatModel":
+    """
+    This function initializes an LLM client for conversation.
+    """
+
+    match llm_type:
+        case "fake":
+            from langchain_community.chat_models import FakeListChatModel
+
+            return FakeListChatModel(responses=["GDS is cool."])
+        case "chat-bison 2k":
+            from langchain_google_vertexai import ChatVertexAI
+
+            return ChatVertexAI(
+                model_name="chat-bison",
+                max_output_tokens=1024,  # this is the max allowed
+                temperature=temperature,  # default temp is 0.0
+                top_p=0.95,  # default is 0.95
+                top_k=40,  # default is 40
+            )
+        case "chat-bison 32k":
+            from langchain_google_vertexai import ChatVertexAI
+
+            return ChatVertexAI(
+                model_name="chat-bison-32k",
+                max_output_tokens=8192,  # this is the max allowed
+                temperature=temperature,  # default temp is 0.0
+                top_p=0.95,  # default is 0.95
+                top_k=40,  # default is 40
+            )
+        case "gemini":
+            from langchain_google_vertexai import ChatVertexAI
+
+            return ChatVertexAI(model_name="gemini-pro")
+        case "gpt-4 8k":
+            from langchain_community.chat_models import AzureChatOpenAI
+
+            sm = get_secret_manager()
+            # Tokens per Minute Rate Limit (thousands): 10
+            # Rate limit (Tokens per minute): 10000
+            # Rate limit (Requests per minute): 60
+            return AzureChatOpenAI(
+                openai_api_version=get_openai_setting("OPENAI_VERSION", "openai_version"),
+                openai_api_key=get_openai_setting("OPENAI_API_KEY", "openai_key"),
+                openai_api_base=sm.access_secret_version("openai_endpoint"),
+                deployment_name=sm.access_secret_version("gpt4_8k_name"),
+                model_name="gpt-4",
+                temperature=temperature,
+            )  # default is 0.7
+            # return OpenAI(api_key=sm.access_secret_version("openai_key_dan"),
+            #                            model="gpt-4",
+            #                            temperature=temperature)
+        case "gpt-4 32k":
+            from langchain_community.chat_models import AzureChatOpenAI
+
+            sm = get_secret_manager()
+            # Tokens per Minute Rate Limit (thousands): 30
+            # Rate limit (Tokens per minute): 30000
+            # Rate limit (Requests per minute): 180
+            return AzureChatOpenAI(
+                openai_api_version=get_openai_setting("OPENAI_VERSION", "openai_version"),
+                openai_api_key=get_openai_setting("OPENAI_API_KEY", "openai_key"),
+                openai_api_base=sm.access_secret_version("openai_endpoint"),
+                deployment_name=sm.access_secret_version("gpt4_32k_name"),
+                model_name="gpt-4-32k",
+                temperature=temperature,
+            )  # default is 0.7
+            # return OpenAI(api_key=sm.access_secret_version("openai_key_dan"),
+            #                            model="gpt-4-32k",
+            #                            temperature=temperature)
+        case _:
+            raise ValueError("Please provide a valid LLM type.")
+
+
+def get_openai_setting(environment_variable: str, secret_id: str) -> str:
+    """
+    Read an OpenAI setting from the environment, or from GCP if it is not set.
+    """
+
+    return os.environ.get(environment_variable) or get_secret_manager().access_secret_version(
+        secret_id
+    )
+
+
+class LLMClientRegistry:
+    """
+    Process-wide registry of chat model clients keyed by LLM type and temperature.
+    Clients are created on first use and then shared by every request, along with their HTTP connection pools.
+    Temperatures are rounded to two decimal places so that the number of clients stays bounded.
+    """
+
+    def __init__(self) -> None:
+        self._clients: Dict[
+            Tuple[str, float], "BaseChatModel"
+        ] = dict()
+        self._lock = threading.Lock()
+
+    def get_client(
+        self, llm_type: str, temperature: float = 0.0
+    ) -> "BaseChatModel":
+        """
+        Retrieve the client for the LLM type and temperature, creating it if this is the first request for it.
+        """
+
+        key = (llm_type.lower(), round(temperature, 2))
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            # another thread may have created the client while this one waited
+            if key not in self._clients:
+                print(f"creating llm client for {key[0]} at temperature {key[1]}...")
+                self._clients[key] = create_llm_client(*key)
+            return self._clients[key]
+
+    def register_client(
+        self,
+        llm_type: str,
+        temperature: float,
+        client: "BaseChatModel",
+    ) -> None:
+        """
+        Use the provided client for the LLM type and temperature, for example a fake model in benchmarks.
+        """
+
+        with self._lock:
+            self._clients[(llm_type.lower(), round(temperature, 2))] = client
+
+    def warmup(
+        self, llm_types: Sequence[str], temperatures: Sequence[float] = (0.0,)
+    ) -> None:
+        """
+        Create the clients for every combination of LLM type and temperature ahead of the first request.
+        Clients that fail to initialize are reported and skipped.
+        """
+
+        for llm_type in llm_types:
+            for temperature in temperatures:
+                try:
+                    self.get_client(llm_type, temperature)
+                except Exception as err:
+                    print(f"failed to warm up {llm_type} llm client: {err}")
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return the number of clients created.
+        """
+
+        return {"clients": len(self._clients)}
+
+    def clear(self) -> None:
+        """
+        Drop every client so that the next request creates a new one.
+        """
+
+        with self._lock:
+            self._clients.clear()
+
+
+@lru_cache(maxsize=None)
+def get_llm_client_registry() -> LLMClientRegistry:
+    """
+    Retrieve the process-wide LLM client registry.
+    """
+
+    registry = LLMClientRegistry()
+    REGISTRY.register_collector("llm_registry", registry.get_stats)
+    return registry
@@ -0,0 +1,239 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional
+
+from tools.metrics import REGISTRY
+
+SCHEDULER_WAIT = REGISTRY.histogram(
+    "llm_scheduler_wait_seconds",
+    "Time LLM requests waited for rate limit capacity.",
+    ["llm_type"],
+)
+SCHEDULER_FALLBACKS = REGISTRY.counter(
+    "llm_scheduler_fallbacks_total",
+    "LLM requests sent to the fallback model because the queue was too deep.",
+    ["llm_type", "fallback"],
+)
+SCHEDULER_TIMEOUTS = REGISTRY.counter(
+    "llm_scheduler_timeouts_total",
+    "LLM requests that could not be scheduled before their deadline.",
+    ["llm_type"],
+)
+
+
+class LLMQueueTimeoutError(Exception):
+    """
+    Raised when an LLM request cannot be sent within the rate limits before its deadline.
+    """
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """
+    The quota of an LLM deployment.
+    """
+
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+# Azure OpenAI deployment quotas. The Vertex AI models are not limited.
+RATE_LIMITS = {
+    "gpt-4 8k": RateLimit(requests_per_minute=60, tokens_per_minute=10_000),
+    "gpt-4 32k": RateLimit(requests_per_minute=180, tokens_per_minute=30_000),
+}
+
+
+class TokenBucket:
+    """
+    A bucket that refills at rate units per second up to capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def get_wait_time(self, amount: float) -> float:
+        """
+        Return the seconds until the amount is available.
+        Amounts over the capacity wait for a full bucket.
+        """
+
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+class DeploymentLimiter:
+    """
+    Admit requests to one LLM deployment within its request and token quotas.
+    Waiting requests are admitted in arrival order.
+    """
+
+    def __init__(self, rate_limit: RateLimit) -> None:
+        self.rate_limit = rate_limit
+        self.requests = TokenBucket(
+            rate=rate_limit.requests_per_minute / 60,
+            capacity=rate_limit.requests_per_minute,
+        )
+        self.tokens = TokenBucket(
+            rate=rate_limit.tokens_per_minute / 60,
+            capacity=rate_limit.tokens_per_minute,
+        )
+        self.queue_depth = 0
+
+        # asyncio.Lock wakes waiters in the order they arrived
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int, deadline: float) -> None:
+        """
+        Wait until one request of the given number of tokens fits the quotas.
+        Raises LLMQueueTimeoutError if that would take past the deadline, a time.monotonic() value.
+        """
+
+        self.queue_depth += 1
+        try:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                raise LLMQueueTimeoutError("The LLM request queue deadline has passed.")
+            try:
+                await asyncio.wait_for(self._lock.acquire(), timeout)
+            except asyncio.TimeoutError:
+                raise LLMQueueTimeoutError(
+                    "Timed out waiting in the LLM request queue."
+                ) from None
+
+            try:
+                wait = max(
+                    self.requests.get_wait_time(1), self.tokens.get_wait_time(tokens)
+                )
+                if time.monotonic() + wait > deadline:
+                    raise LLMQueueTimeoutError(
+                        f"The LLM rate limit allows this request in {round(wait, 2)} seconds, after its deadline."
+                    )
+                await asyncio.sleep(wait)
+                self.requests.consume(1)
+                self.tokens.consume(tokens)
+            finally:
+                self._lock.release()
+
+        finally:
+            self.queue_depth -= 1
+
+
+class LLMScheduler:
+    """
+    Schedule LLM requests within the rate limits of each deployment.
+    Requests wait in a fair queue until the deployment has capacity or their deadline passes.
+    If a model's queue is deeper than max_queue_depth and it has a fallback, then the fallback model is used.
+    """
+
+    def __init__(
+        self,
+        rate_limits: Dict[str, RateLimit] = RATE_LIMITS,
+        fallbacks: Optional[Dict[str, str]] = None,
+        max_queue_depth: int = 20,
+        queue_timeout: float = 30.0,
+    ) -> None:
+        self.fallbacks = fallbacks or dict()
+        self.max_queue_depth = max_queue_depth
+        self.queue_timeout = queue_timeout
+
+        self._limiters = {
+            llm_type: DeploymentLimiter(rate_limit)
+            for llm_type, rate_limit in rate_limits.items()
+        }
+
+    async def acquire(self, llm_type: str, tokens: int) -> str:
+        """
+        Wait for capacity to send a request of the estimated number of tokens.
+        Returns the LLM type to send the request to, which is the fallback model if the queue was too deep.
+        """
+
+        llm_type = self._choose_llm_type(llm_type)
+        limiter = self._limiters.get(llm_type)
+        if limiter is None:
+            return llm_type
+
+        start = time.monotonic()
+        try:
+            await limiter.acquire(tokens, deadline=start + self.queue_timeout)
+        except LLMQueueTimeoutError:
+            SCHEDULER_TIMEOUTS.inc(llm_type=llm_type)
+            raise
+        finally:
+            SCHEDULER_WAIT.observe(time.monotonic() - start, llm_type=llm_type)
+
+        return llm_type
+
+    def get_queue_depth(self, llm_type: str) -> int:
+        limiter = self._limiters.get(llm_type)
+        return limiter.queue_depth if limiter is not None else 0
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Return the queue depth of each rate limited model.
+        """
+
+        return {
+            f"queue_depth_{llm_type.replace(' ', '_').replace('-', '_')}": limiter.queue_depth
+            for llm_type, limiter in self._limiters.items()
+        }
+
+    def _choose_llm_type(self, llm_type: str) -> str:
+        fallback = self.fallbacks.get(llm_type)
+        if (
+            fallback is not None
+            and self.get_queue_depth(llm_type) >= self.max_queue_depth
+            and self.get_queue_depth(fallback) < self.max_queue_depth
+        ):
+            print(f"{llm_type} queue is full. falling back to {fallback}.")
+            SCHEDULER_FALLBACKS.inc(llm_type=llm_type, fallback=fallback)
+            return fallback
+
+        return llm_type
+
+
+def parse_fallbacks(value: Optional[str]) -> Dict[str, str]:
+    """
+    Parse fallbacks of the form "gpt-4 8k=gpt-4 32k,chat-bison 2k=gemini".
+    """
+
+    if not value:
+        return dict()
+
+    pairs = [pair.split("=") for pair in value.split(",")]
+    return {llm_type.strip().lower(): fallback.strip().lower() for llm_type, fallback in pairs}
+
+
+@lru_cache(maxsize=None)
+def get_llm_scheduler() -> LLMScheduler:
+    """
+    Retrieve the process-wide LLM scheduler.
+    The fallbacks, queue depth and queue timeout may be tuned with environment variables.
+    """
+
+    scheduler = LLMScheduler(
+        fallbacks=parse_fallbacks(os.environ.get("LLM_FALLBACKS")),
+        max_queue_depth=int(os.environ.get("LLM_MAX_QUEUE_DEPTH", 20)),
+        queue_timeout=float(os.environ.get("LLM_QUEUE_TIMEOUT_SECONDS", 30)),
+    )
+    REGISTRY.register_collector("llm_scheduler", scheduler.get_stats)
+    return scheduler
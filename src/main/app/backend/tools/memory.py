@@ -0,0 +1,119 @@
+import os
+from functools import lru_cache
+from typing import Protocol
+
+from objects.memory import ConversationMemory
+from resources.prompts.prompts import summary_template
+
+
+class SummarizerProtocol(Protocol):
+    async def summarize(self, summary: str, user: str, assistant: str) -> str:
+        """
+        Fold a conversation turn into the running summary.
+        """
+        pass
+
+
+class ExtractiveSummarizer:
+    """
+    Append an excerpt of each turn to the summary and keep only the newest max_characters of it.
+    This makes no LLM calls.
+    """
+
+    def __init__(self, excerpt_characters: int = 200, max_characters: int = 2_000) -> None:
+        self.excerpt_characters = excerpt_characters
+        self.max_characters = max_characters
+
+    async def summarize(self, summary: str, user: str, assistant: str) -> str:
+        excerpt = (
+            f"User asked: {_shorten(user, self.excerpt_characters)} "
+            f"Assistant answered: {_shorten(assistant, self.excerpt_characters)}"
+        )
+        lines = [line for line in summary.split("\n") if line != ""] + [excerpt]
+        # the oldest excerpts are dropped first
+        while len(lines) > 1 and len("\n".join(lines)) > self.max_characters:
+            lines.pop(0)
+
+        return "\n".join(lines)
+
+
+class LLMSummarizer:
+    """
+    Ask an LLM to fold each turn into the summary.
+    If the LLM call fails, then the turn is summarized extractively.
+    """
+
+    def __init__(self, llm_type: str, max_words: int = 150) -> None:
+        self.llm_type = llm_type
+        self.max_words = max_words
+        self.fallback = ExtractiveSummarizer()
+
+    async def summarize(self, summary: str, user: str, assistant: str) -> str:
+        from tools.llm import get_llm_client_registry
+
+        try:
+            response = await get_llm_client_registry().get_client(self.llm_type).ainvoke(
+                summary_template.format(
+                    max_words=self.max_words,
+                    summary=summary or "None",
+                    user=user,
+                    assistant=assistant,
+                )
+            )
+            return response.content.strip()
+
+        except Exception as err:
+            print(f"failed to summarize the conversation with {self.llm_type}: {err}")
+            return await self.fallback.summarize(summary, user, assistant)
+
+
+async def update_memory(
+    memory: ConversationMemory,
+    user_message: str,
+    assistant_message: str,
+    summarizer: SummarizerProtocol,
+    window_turns: int = 3,
+) -> ConversationMemory:
+    """
+    Add a turn to the recent window. Turns pushed out of the window are folded into the summary,
+    so each update costs the same no matter how long the conversation is.
+    """
+
+    recent_messages = memory.recent_messages + [user_message, assistant_message]
+    summary = memory.summary
+    while len(recent_messages) > window_turns * 2:
+        user, assistant = recent_messages[:2]
+        summary = await summarizer.summarize(summary, user, assistant)
+        recent_messages = recent_messages[2:]
+
+    return ConversationMemory(
+        summary=summary,
+        recent_messages=recent_messages,
+        turn_count=memory.turn_count + 1,
+    )
+
+
+@lru_cache(maxsize=None)
+def get_summarizer() -> SummarizerProtocol:
+    """
+    Retrieve the conversation summarizer.
+    If CONVERSATION_SUMMARY_LLM names an LLM type, then that LLM writes the summaries.
+    """
+
+    llm_type = os.environ.get("CONVERSATION_SUMMARY_LLM")
+    if llm_type:
+        return LLMSummarizer(llm_type=llm_type.lower())
+
+    return ExtractiveSummarizer()
+
+
+def get_window_turns() -> int:
+    return int(os.environ.get("CONVERSATION_WINDOW_TURNS", 3))
+
+
+def _shorten(text: str, max_characters: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_characters:
+        return text
+
+    return text[: max_characters - 3] + "..."
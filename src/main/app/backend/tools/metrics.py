@@ -0,0 +1,307 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_request_id: ContextVar[str] = ContextVar("request_id", default="-")
+_span_listeners: List[Callable[[str, float, str], None]] = list()
+
+
+class Counter:
+    """
+    A monotonically increasing count, partitioned by label values.
+    """
+
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+
+        self._values: Dict[Tuple[str, ...], float] = dict()
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _get_label_values(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(_get_label_values(self.labels, labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+
+        return lines
+
+
+class Histogram:
+    """
+    A distribution of observed values in cumulative buckets, partitioned by label values.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+
+        # bucket counts, sum and count for each set of label values
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float, int]] = dict()
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _get_label_values(self.labels, labels)
+        with self._lock:
+            counts, total, count = self._values.get(
+                key, ([0] * len(self.buckets), 0.0, 0)
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def get_count(self, **labels: str) -> int:
+        value = self._values.get(_get_label_values(self.labels, labels))
+        return value[2] if value is not None else 0
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    bucket_labels = _format_labels(
+                        self.labels + ("le",), key + (str(bound),)
+                    )
+                    lines.append(f"{self.name}_bucket{bucket_labels} {bucket_count}")
+                labels = _format_labels(self.labels + ("le",), key + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the counters and histograms of this process and renders them in the Prometheus text format.
+    Collectors expose the get_stats counters of caches and queues as gauges.
+    """
+
+    def __init__(self, namespace: str = "agent_neo") -> None:
+        self.namespace = namespace
+
+        self._metrics: Dict[str, Counter | Histogram] = dict()
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = dict()
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(f"{self.namespace}_{name}", description, labels))
+
+    def histogram(
+        self,
+        name: str,
+        description: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(
+            Histogram(f"{self.namespace}_{name}", description, labels, buckets)
+        )
+
+    def register_collector(
+        self, name: str, get_stats: Callable[[], Dict[str, float]]
+    ) -> None:
+        """
+        Export every numeric value returned by get_stats as a gauge named {namespace}_{name}_{key}.
+        A collector registered under an existing name replaces it.
+        """
+
+        with self._lock:
+            self._collectors[name] = get_stats
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+
+        lines = list()
+        for metric in metrics:
+            lines.extend(metric.render())
+
+        for name, get_stats in collectors:
+            try:
+                stats = get_stats()
+            except Exception as err:
+                print(f"failed to collect {name} metrics: {err}")
+                continue
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauge = f"{self.namespace}_{name}_{key}"
+                    lines.extend([f"# TYPE {gauge} gauge", f"{gauge} {value}"])
+
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Counter | Histogram) -> Counter | Histogram:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+
+REGISTRY = MetricsRegistry()
+
+REQUESTS = REGISTRY.counter(
+    "requests_total", "HTTP requests by path and status code.", ["path", "status"]
+)
+REQUEST_DURATION = REGISTRY.histogram(
+    "request_duration_seconds", "HTTP request latency by path.", ["path"]
+)
+STAGE_DURATION = REGISTRY.histogram(
+    "stage_duration_seconds", "Latency of each stage of a request.", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "stage_errors_total", "Stages that raised an exception.", ["stage"]
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "LLM tokens by model and kind.", ["llm_type", "kind"]
+)
+
+
+def get_request_id() -> str:
+    """
+    Retrieve the id of the request being handled, or '-' outside of a request.
+    """
+
+    return _request_id.get()
+
+
+def set_request_id(request_id: str):
+    """
+    Set the id of the request being handled. Returns a token to reset it with.
+    """
+
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token) -> None:
+    _request_id.reset(token)
+
+
+def add_span_listener(listener: Callable[[str, float, str], None]) -> None:
+    """
+    Call the listener with the stage, duration and request id of every span, for example to keep raw timings.
+    """
+
+    _span_listeners.append(listener)
+
+
+def remove_span_listener(listener: Callable[[str, float, str], None]) -> None:
+    _span_listeners.remove(listener)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """
+    Time a stage of the current request.
+    The duration is recorded in the stage histogram and logged with the request id.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_DURATION.observe(duration, stage=stage)
+        for listener in _span_listeners:
+            listener(stage, duration, get_request_id())
+        print(f"[{get_request_id()}] {stage}: {round(duration, 4)} seconds.")
+
+
+def record_token_usage(
+    llm_type: str,
+    prompt: str,
+    completion: str,
+    usage: Optional[Dict[str, int]] = None,
+) -> None:
+    """
+    Count the prompt and completion tokens of an LLM call.
+    Reported usage is preferred. Otherwise tokens are estimated at four characters each.
+    """
+
+    usage = usage or dict()
+    prompt_tokens = usage.get("prompt_tokens", usage.get("prompt_token_count"))
+    completion_tokens = usage.get(
+        "completion_tokens", usage.get("candidates_token_count")
+    )
+
+    LLM_TOKENS.inc(
+        prompt_tokens if prompt_tokens is not None else _estimate_tokens(prompt),
+        llm_type=llm_type,
+        kind="prompt",
+    )
+    LLM_TOKENS.inc(
+        completion_tokens
+        if completion_tokens is not None
+        else _estimate_tokens(completion),
+        llm_type=llm_type,
+        kind="completion",
+    )
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    """
+    The nearest-rank percentile of the values.
+    """
+
+    if len(values) == 0:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+def _estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _get_label_values(
+    label_names: Tuple[str, ...], labels: Dict[str, str]
+) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...]) -> str:
+    if len(label_names) == 0:
+        return ""
+
+    pairs = [
+        f'{name}="{_escape(value)}"' for name, value in zip(label_names, label_values)
+    ]
+
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from dataclasses import replace
+from typing import Dict, List, Optional, Sequence
+
+from database.async_communicator import AsyncGraphReader
+from objects.context import ContextDocument, ContextSet
+from tools.vector_index import LocalVectorIndex
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[ContextSet], limit: int = 10, k: int = 60
+) -> ContextSet:
+    """
+    Merge ranked context sets with reciprocal rank fusion.
+    Documents are deduplicated by index and scored by the sum of 1 / (k + rank) over every ranking they appear in.
+    """
+
+    scores: Dict[str, float] = dict()
+    documents: Dict[str, ContextDocument] = dict()
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            scores[document.index] = scores.get(document.index, 0.0) + 1 / (k + rank)
+            documents.setdefault(document.index, document)
+
+    fused = sorted(scores, key=lambda index: scores[index], reverse=True)[:limit]
+
+    return ContextSet(replace(documents[index], score=scores[index]) for index in fused)
+
+
+async def retrieve_context(
+    reader: AsyncGraphReader,
+    question_embedding: List[float],
+    retrieval_mode: str = "vector",
+    number_of_documents: int = 10,
+    local_index: Optional[LocalVectorIndex] = None,
+    fallback_timeout: float = 1.0,
+) -> ContextSet:
+    """
+    Retrieve context documents with the requested retrieval mode.
+    If a local vector index is provided, then it answers vector retrieval when Neo4j is slow or fails.
+    """
+
+    match retrieval_mode:
+        case "vector" if local_index is not None:
+            return await retrieve_vector_context_with_fallback(
+                reader=reader,
+                local_index=local_index,
+                question_embedding=question_embedding,
+                number_of_documents=number_of_documents,
+                fallback_timeout=fallback_timeout,
+            )
+        case "vector":
+            return await reader.retrieve_context_documents(
+                question_embedding=question_embedding,
+                number_of_context_documents=number_of_documents,
+            )
+        case "local" if local_index is not None:
+            return await asyncio.to_thread(
+                local_index.search, question_embedding, number_of_documents
+            )
+        case "local":
+            raise ValueError("The local vector index is not enabled.")
+        case "topic":
+            context = await reader.retrieve_context_documents_by_topic(
+                question_embedding=question_embedding
+            )
+            return context[:number_of_documents]
+        case "hybrid":
+            return await retrieve_hybrid_context(
+                reader=reader,
+                question_embedding=question_embedding,
+                number_of_documents=number_of_documents,
+            )
+        case _:
+            raise ValueError(f"Unknown retrieval mode: {retrieval_mode}.")
+
+
+async def retrieve_hybrid_context(
+    reader: AsyncGraphReader,
+    question_embedding: List[float],
+    number_of_documents: int = 10,
+    number_of_topics: int = 3,
+    documents_per_topic: int = 4,
+) -> ContextSet:
+    """
+    Run vector and topic retrieval concurrently on separate sessions and fuse the results.
+    Total latency is that of the slower query. If one strategy fails, then the other is used alone.
+    """
+
+    timings: Dict[str, float] = dict()
+
+    async def timed(strategy: str, retrieval) -> ContextSet:
+        start = time.perf_counter()
+        context = await retrieval
+        timings[strategy] = round(time.perf_counter() - start, 4)
+        return context
+
+    results = await asyncio.gather(
+        timed(
+            "vector",
+            reader.retrieve_context_documents(
+                question_embedding=question_embedding,
+                number_of_context_documents=number_of_documents,
+            ),
+        ),
+        timed(
+            "topic",
+            reader.retrieve_context_documents_by_topic(
+                question_embedding=question_embedding,
+                number_of_topics=number_of_topics,
+                documents_per_topic=documents_per_topic,
+            ),
+        ),
+        return_exceptions=True,
+    )
+    print(f"hybrid retrieval times: {timings} seconds.")
+
+    rankings = list()
+    for strategy, result in zip(["vector", "topic"], results):
+        if isinstance(result, Exception):
+            print(f"{strategy} retrieval failed: {result}")
+        else:
+            rankings.append(result)
+    if len(rankings) == 0:
+        raise results[0]
+
+    return reciprocal_rank_fusion(rankings, limit=number_of_documents)
+
+
+async def retrieve_vector_context_with_fallback(
+    reader: AsyncGraphReader,
+    local_index: LocalVectorIndex,
+    question_embedding: List[float],
+    number_of_documents: int = 10,
+    fallback_timeout: float = 1.0,
+) -> ContextSet:
+    """
+    Run vector retrieval against Neo4j and fall back to the local vector index
+    if Neo4j fails, takes longer than fallback_timeout seconds or returns nothing.
+    """
+
+    try:
+        context = await asyncio.wait_for(
+            reader.retrieve_context_documents(
+                question_embedding=question_embedding,
+                number_of_context_documents=number_of_documents,
+            ),
+            timeout=fallback_timeout,
+        )
+        if len(context) > 0:
+            return context
+        print("Neo4j returned no context. Falling back to the local vector index.")
+
+    except asyncio.TimeoutError:
+        print(
+            f"Neo4j retrieval exceeded {fallback_timeout} seconds. Falling back to the local vector index."
+        )
+
+    except Exception as err:
+        print(f"Neo4j retrieval failed: {err}. Falling back to the local vector index.")
+
+    return await asyncio.to_thread(
+        local_index.search, question_embedding, number_of_documents
+    )
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import time
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from objects.context import ContextSet
+from tools.metrics import REGISTRY
+
+
+def get_retrieval_key(question_embedding: List[float], strategy: str, **parameters) -> str:
+    """
+    Hash the question embedding, the retrieval strategy and its parameters, such as k.
+    """
+
+    digest = hashlib.sha256(array("d", question_embedding).tobytes())
+    digest.update(
+        f"{strategy}:{sorted(parameters.items())}".encode("utf-8")
+    )
+
+    return digest.hexdigest()
+
+
+class RetrievalCache:
+    """
+    Cache retrieved context in memory with LRU and TTL eviction.
+    Entries belong to an ingestion epoch, which the Airflow Neo4jWriter increments after each document load.
+    The epoch is read from the graph at most every epoch_check_seconds, and the cache is cleared when it changes,
+    so context is never served from before a document refresh for longer than that interval.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1_000,
+        ttl_seconds: float = 600.0,
+        epoch_check_seconds: float = 5.0,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.epoch_check_seconds = epoch_check_seconds
+        self.epoch: Optional[int] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.epoch_errors = 0
+
+        # key -> (expiry time, context)
+        self._entries: OrderedDict[str, Tuple[float, ContextSet]] = OrderedDict()
+        self._epoch_checked_at: Optional[float] = None
+
+    async def get_or_retrieve(
+        self,
+        key: str,
+        retrieve: Callable[[], Awaitable[ContextSet]],
+        get_epoch: Callable[[], Awaitable[int]],
+    ) -> ContextSet:
+        """
+        Return the cached context for the key, or retrieve and cache it.
+        Empty context and retrieval errors are not cached, so the next request retries the graph.
+        """
+
+        await self._check_epoch(get_epoch)
+
+        context = self._lookup(key)
+        if context is not None:
+            self.hits += 1
+            return context
+
+        self.misses += 1
+        epoch = self.epoch
+        context = await retrieve()
+        # context retrieved while the epoch changed may predate the new documents
+        if len(context) > 0 and epoch == self.epoch:
+            self._store(key, context)
+
+        return context
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+        self.invalidations += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the cache counters along with the hit ratio.
+        """
+
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "epoch_errors": self.epoch_errors,
+            "epoch": self.epoch if self.epoch is not None else -1,
+            "hit_ratio": self.hits / lookups if lookups > 0 else 0.0,
+        }
+
+    async def _check_epoch(self, get_epoch: Callable[[], Awaitable[int]]) -> None:
+        now = time.monotonic()
+        if (
+            self._epoch_checked_at is not None
+            and now - self._epoch_checked_at < self.epoch_check_seconds
+        ):
+            return
+
+        # concurrent requests skip the check while one is in flight
+        self._epoch_checked_at = now
+        try:
+            epoch = await get_epoch()
+        except Exception as err:
+            print(f"unable to read the ingestion epoch: {err}")
+            self.epoch_errors += 1
+            return
+
+        if epoch != self.epoch:
+            if self.epoch is not None:
+                print(f"ingestion epoch changed from {self.epoch} to {epoch}. clearing the retrieval cache.")
+                self.invalidate()
+            self.epoch = epoch
+
+    def _lookup(self, key: str) -> Optional[ContextSet]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, context = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+        self._entries.move_to_end(key)
+        return context
+
+    def _store(self, key: str, context: ContextSet) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, context)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+@lru_cache(maxsize=None)
+def get_retrieval_cache() -> Optional[RetrievalCache]:
+    """
+    Retrieve the process-wide retrieval cache, or None if RETRIEVAL_CACHE_SIZE is 0.
+    The TTL and the ingestion epoch check interval may be tuned with environment variables.
+    """
+
+    max_size = int(os.environ.get("RETRIEVAL_CACHE_SIZE", 1_000))
+    if max_size <= 0:
+        return None
+
+    retrieval_cache = RetrievalCache(
+        max_size=max_size,
+        ttl_seconds=float(os.environ.get("RETRIEVAL_CACHE_TTL_SECONDS", 600)),
+        epoch_check_seconds=float(os.environ.get("INGESTION_EPOCH_CHECK_SECONDS", 5)),
+    )
+    REGISTRY.register_collector("retrieval_cache", retrieval_cache.get_stats)
+    return retrieval_cache
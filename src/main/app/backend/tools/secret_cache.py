@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+# this module is vendored into the Airflow library as libs/fetcher/secret_cache.py, since the backend and the
+# Airflow images are built from separate directories. it may only import from the standard library.
+# edit both copies together. the backend tests fail if they differ
+
+
+class CachedSecretManager:
+    """
+    Read secrets from GCP Secret Manager through an in-process cache.
+    Cached values older than the TTL are refreshed in the background while the stale value is served.
+    If a refresh fails, then the stale value continues to be served.
+    Subclasses provide the GCP client, which is anything with an access_secret_version(request) method.
+    """
+
+    def __init__(
+        self,
+        project_id: Optional[str],
+        client: Any,
+        ttl_seconds: Optional[float] = None,
+        background_refresh: bool = True,
+    ) -> None:
+        self.project_id = project_id
+        self.client = client
+        self.ttl_seconds = (
+            ttl_seconds
+            if ttl_seconds is not None
+            else float(os.environ.get("SECRET_CACHE_TTL_SECONDS", 600))
+        )
+        self.background_refresh = background_refresh
+
+        self._cache: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+        self._refreshing: Set[Tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="secret-manager"
+        )
+
+    def access_secret_version(self, secret_id: str, version_id: str = "latest") -> Any:
+        key = (secret_id, version_id)
+
+        with self._lock:
+            entry = self._cache.get(key)
+
+        if entry is None:
+            return self._fetch_and_store(key)
+
+        value, fetched_at = entry
+        if time.monotonic() - fetched_at < self.ttl_seconds:
+            return value
+
+        if self.background_refresh:
+            self._schedule_refresh(key)
+            return value
+
+        try:
+            return self._fetch_and_store(key)
+        except Exception as err:
+            print(f"Failed to refresh secret {secret_id}. Serving stale value. {err}")
+            return value
+
+    def prefetch(
+        self, secret_ids: Iterable[str], version_id: str = "latest"
+    ) -> Dict[str, Any]:
+        """
+        Fetch many secrets concurrently and store them in the cache.
+        Secrets that fail to load are reported and skipped.
+        """
+
+        keys = [(secret_id, version_id) for secret_id in secret_ids]
+        futures = {key: self._executor.submit(self._fetch_and_store, key) for key in keys}
+
+        secrets = dict()
+        for (secret_id, _), future in futures.items():
+            try:
+                secrets[secret_id] = future.result()
+            except Exception as err:
+                print(f"Failed to prefetch secret {secret_id}. {err}")
+
+        return secrets
+
+    async def aprefetch(
+        self, secret_ids: Iterable[str], version_id: str = "latest"
+    ) -> Dict[str, Any]:
+        """
+        Fetch many secrets concurrently without blocking the event loop.
+        """
+
+        return await asyncio.get_running_loop().run_in_executor(
+            None, self.prefetch, list(secret_ids), version_id
+        )
+
+    def invalidate(self, secret_id: Optional[str] = None) -> None:
+        """
+        Remove a secret, or all secrets if no id is provided, from the cache.
+        """
+
+        with self._lock:
+            if secret_id is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == secret_id]:
+                    del self._cache[key]
+
+    def close(self) -> None:
+        """
+        Stop the background refresh workers.
+        """
+
+        self._executor.shutdown(wait=False)
+
+    def _fetch(self, secret_id: str, version_id: str = "latest") -> Any:
+        name = f"projects/{self.project_id}/secrets/{secret_id}/versions/{version_id}"
+        response = self.client.access_secret_version(request={"name": name})
+        secret_data = response.payload.data.decode("UTF-8")
+        try:
+            return json.loads(secret_data)
+        except json.JSONDecodeError:
+            return secret_data
+
+    def _fetch_and_store(self, key: Tuple[str, str]) -> Any:
+        value = self._fetch(*key)
+
+        with self._lock:
+            self._cache[key] = (value, time.monotonic())
+
+        return value
+
+    def _schedule_refresh(self, key: Tuple[str, str]) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        self._executor.submit(self._refresh, key)
+
+    def _refresh(self, key: Tuple[str, str]) -> None:
+        try:
+            self._fetch_and_store(key)
+        except Exception as err:
+            print(f"Failed to refresh secret {key[0]}. Serving stale value. {err}")
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
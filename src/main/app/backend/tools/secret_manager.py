@@ -1,19 +1,64 @@
 import os
-import json
+from functools import lru_cache
+from typing import List, Optional
 
-from google.cloud import secretmanager
+from tools.secret_cache import CachedSecretManager
 
 
-class SecretManager:
-    def __init__(self, project_id: str = None):
-        self.project_id = project_id or os.getenv("GCP_PROJECT_ID")
-        self.client = secretmanager.SecretManagerServiceClient()
+def get_backend_secret_ids() -> List[str]:
+    """
+    The secret ids read by the backend. These are prefetched together at startup.
+    """
 
-    def access_secret_version(self, secret_id, version_id="latest"):
-        name = f"projects/{self.project_id}/secrets/{secret_id}/versions/{version_id}"
-        response = self.client.access_secret_version(request={"name": name})
-        secret_data = response.payload.data.decode("UTF-8")
-        try:
-            return json.loads(secret_data)
-        except json.JSONDecodeError:
-            return secret_data
+    database_type = os.environ.get("DATABASE_TYPE")
+
+    return [
+        "openai_key",
+        "openai_version",
+        "openai_endpoint",
+        "gpt4_8k_name",
+        "gpt4_32k_name",
+        "langsmith_api_key",
+        f"neo4j_{database_type}_uri",
+        f"neo4j_{database_type}_password",
+        "neo4j_username",
+        "neo4j_database",
+        "gcp_region",
+    ]
+
+
+class SecretManager(CachedSecretManager):
+    """
+    Read secrets from GCP Secret Manager through an in-process cache.
+    Cached values older than the TTL are refreshed in the background while the stale value is served.
+    If a refresh fails, then the stale value continues to be served.
+    """
+
+    def __init__(
+        self,
+        project_id: str = None,
+        client=None,
+        ttl_seconds: Optional[float] = None,
+        background_refresh: bool = True,
+    ):
+        if client is None:
+            # the GCP client is slow to import, so it is only imported when it is needed
+            from google.cloud import secretmanager
+
+            client = secretmanager.SecretManagerServiceClient()
+
+        super().__init__(
+            project_id=project_id or os.getenv("GCP_PROJECT_ID"),
+            client=client,
+            ttl_seconds=ttl_seconds,
+            background_refresh=background_refresh,
+        )
+
+
+@lru_cache(maxsize=None)
+def get_secret_manager() -> SecretManager:
+    """
+    Retrieve the process-wide SecretManager so that every caller shares one cache.
+    """
+
+    return SecretManager()
@@ -0,0 +1,63 @@
+from typing import Any, Dict, List, Optional
+
+from database.async_communicator import AsyncGraphReader
+
+
+class SemanticCache:
+    """
+    Reuse the assistant reply to a near-duplicate past question.
+    Only replies to the first question of a conversation, from the same LLM and rated 'Good', are candidates.
+    """
+
+    def __init__(
+        self, similarity_threshold: float = 0.97, number_of_candidates: int = 5
+    ) -> None:
+        self.similarity_threshold = similarity_threshold
+        self.number_of_candidates = number_of_candidates
+
+        self.lookups = 0
+        self.hits = 0
+        self.errors = 0
+
+    async def lookup(
+        self,
+        reader: AsyncGraphReader,
+        question_embedding: List[float],
+        llm_type: str,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached answer for the question embedding, or None on a miss.
+        Lookup errors are treated as misses so the request can continue to the LLM.
+        """
+
+        self.lookups += 1
+
+        try:
+            answer = await reader.retrieve_cached_answer(
+                question_embedding=question_embedding,
+                llm_type=llm_type,
+                similarity_threshold=self.similarity_threshold,
+                number_of_candidates=self.number_of_candidates,
+            )
+        except Exception as err:
+            print(f"semantic cache lookup failed: {err}")
+            self.errors += 1
+            return None
+
+        if answer is not None:
+            self.hits += 1
+            print(f"semantic cache hit. score: {round(answer['score'], 4)}")
+
+        return answer
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Return the lookup, hit and error counters along with the hit rate.
+        """
+
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "errors": self.errors,
+            "hit_rate": self.hits / self.lookups if self.lookups > 0 else 0.0,
+        }
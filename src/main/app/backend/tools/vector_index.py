@@ -0,0 +1,432 @@
+import asyncio
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from database.async_communicator import AsyncGraphReader
+from objects.context import ContextDocument, ContextSet
+from tools.metrics import REGISTRY
+
+_shared_local_vector_index: Optional["LocalVectorIndex"] = None
+_shared_refresh_task: Optional[asyncio.Task] = None
+
+VALID_DTYPES = ["float32", "int8"]
+
+
+class LocalVectorIndex:
+    """
+    An in-process mirror of the Document embeddings in the graph.
+    Unit-normalized embeddings are stored in a memory-mapped float32 or int8 matrix
+    and the url and text of each row are stored in a sqlite side table.
+    Every worker on a host maps the same files, so the matrix is held once in the page cache.
+
+    Files written to the index directory:
+        vectors.bin   the embedding matrix, one row per Document
+        scales.bin    the per-row dequantization scales (int8 only)
+        documents.db  the side table of row, index, url and text
+        meta.json     the row count, dimensions and createTime watermark
+    Rows are appended before meta.json is replaced, so readers only ever map complete rows.
+
+    The mirror only grows. A Document deleted from the graph stays in the index, and a re-embedded Document
+    is only mirrored again if its createTime changes. After deleting or re-embedding Documents,
+    remove the index directory so the next refresh mirrors every Document again.
+    """
+
+    def __init__(self, path: str, dtype: str = "float32", chunk_size: int = 65_536) -> None:
+        if dtype not in VALID_DTYPES:
+            raise ValueError(f"dtype must be one of the following: {str(VALID_DTYPES)}.")
+
+        self.path = path
+        self.dtype = dtype
+        self.chunk_size = chunk_size
+
+        self.searches = 0
+        self.refreshes = 0
+        self.documents_added = 0
+
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.bin")
+        self._scales_path = os.path.join(path, "scales.bin")
+        self._meta_path = os.path.join(path, "meta.json")
+        self._lock_path = os.path.join(path, "refresh.lock")
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            os.path.join(path, "documents.db"), check_same_thread=False
+        )
+        self._db.execute("pragma journal_mode=wal")
+        self._db.execute(
+            "create table if not exists documents (row integer primary key, doc_index text unique, url text, text text)"
+        )
+        self._db.commit()
+
+        self._meta: Dict[str, Any] = self._read_meta()
+        self._meta_mtime: Optional[int] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        self._remap()
+
+    def __len__(self) -> int:
+        self._reload_if_changed()
+        return self._meta["count"]
+
+    @property
+    def watermark(self) -> Dict[str, Any]:
+        """
+        The createTime (epoch millis) and index of the last Document mirrored.
+        """
+
+        return {
+            "create_time": self._meta["create_time"],
+            "index": self._meta["index"],
+        }
+
+    def search(self, question_embedding: List[float], k: int = 10) -> ContextSet:
+        """
+        Find the k Documents most similar to the question embedding.
+        """
+
+        return self.search_many([question_embedding], k=k)[0]
+
+    def search_many(self, question_embeddings: Sequence[List[float]], k: int = 10) -> List[ContextSet]:
+        """
+        Find the k Documents most similar to each question embedding.
+        Every query is scored against a chunk of rows in one matrix product.
+        Scores are (1 + cosine) / 2 to match the Neo4j cosine vector index.
+        """
+
+        self._reload_if_changed()
+        self.searches += len(question_embeddings)
+
+        # a refresh may remap the index while this search runs, so the count is taken from the maps in use
+        vectors, scales = self._vectors, self._scales
+        count = 0 if vectors is None else len(vectors)
+        if scales is not None:
+            count = min(count, len(scales))
+        if count == 0 or k < 1:
+            return [ContextSet() for _ in question_embeddings]
+
+        queries = _normalize(np.asarray(question_embeddings, dtype=np.float32))
+
+        scores = np.empty((count, len(queries)), dtype=np.float32)
+        for start in range(0, count, self.chunk_size):
+            stop = min(start + self.chunk_size, count)
+            chunk = vectors[start:stop].astype(np.float32, copy=False)
+            scores[start:stop] = chunk @ queries.T
+            if scales is not None:
+                scores[start:stop] *= scales[start:stop, None]
+
+        k = min(k, count)
+        results = list()
+        for column in scores.T:
+            rows = np.argpartition(-column, k - 1)[:k]
+            rows = rows[np.argsort(-column[rows], kind="stable")]
+            results.append(
+                self._get_documents(rows.tolist(), ((1 + column[rows]) / 2).tolist())
+            )
+
+        return results
+
+    async def refresh(self, reader: AsyncGraphReader, page_size: int = 1_000) -> int:
+        """
+        Mirror every Document created since the watermark.
+        Documents are read in pages ordered by createTime and index.
+        Each page is written to the index files in a worker thread, so the initial snapshot does not block the event loop.
+        Only one worker on a host refreshes at a time, the others return immediately.
+        Returns the number of Documents mirrored.
+        """
+
+        lock_file = open(self._lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return 0
+
+        refresh_timer_start = time.perf_counter()
+        mirrored = 0
+        try:
+            # another worker may have refreshed since this one last looked
+            await asyncio.to_thread(self._reload_if_changed)
+            while True:
+                page = await reader.retrieve_document_embeddings(
+                    created_after=self._meta["create_time"],
+                    after_index=self._meta["index"],
+                    limit=page_size,
+                )
+                if len(page) == 0:
+                    break
+                await asyncio.to_thread(self._append, page)
+                mirrored += len(page)
+                if len(page) < page_size:
+                    break
+
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+        self.refreshes += 1
+        self.documents_added += mirrored
+        print(
+            f"local vector index refreshed. {mirrored} documents mirrored in "
+            + str(round(time.perf_counter() - refresh_timer_start, 4))
+            + " seconds."
+        )
+
+        return mirrored
+
+    def add_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """
+        Mirror documents that carry index, url, text, embedding and createTime keys.
+        A document whose index is already mirrored is overwritten in place.
+        """
+
+        lock_file = open(self._lock_path, "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._reload_if_changed()
+            self._append(documents)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            lock_file.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Return the index size and search and refresh counters.
+        """
+
+        return {
+            "size": len(self),
+            "dtype": self.dtype,
+            "searches": self.searches,
+            "refreshes": self.refreshes,
+            "documents_added": self.documents_added,
+        }
+
+    def close(self) -> None:
+        """
+        Close the side table and release the memory map.
+        """
+
+        with self._lock:
+            self._vectors = None
+            self._scales = None
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _append(self, documents: List[Dict[str, Any]]) -> None:
+        if len(documents) == 0:
+            return
+
+        embeddings = _normalize(
+            np.asarray([d["embedding"] for d in documents], dtype=np.float32)
+        )
+        if self._meta["dimensions"] is None:
+            self._meta["dimensions"] = embeddings.shape[1]
+        elif embeddings.shape[1] != self._meta["dimensions"]:
+            raise ValueError(
+                f"Expected embeddings with {self._meta['dimensions']} dimensions, got {embeddings.shape[1]}."
+            )
+
+        if self.dtype == "int8":
+            scales = np.maximum(np.abs(embeddings).max(axis=1), 1e-12) / 127
+            vectors = np.round(embeddings / scales[:, None]).astype(np.int8)
+        else:
+            scales = None
+            vectors = embeddings
+
+        count = self._meta["count"]
+        rows = list()
+        with self._lock:
+            for document in documents:
+                existing = self._db.execute(
+                    "select row from documents where doc_index = ?", (document["index"],)
+                ).fetchone()
+                if existing is not None:
+                    rows.append(existing[0])
+                else:
+                    rows.append(count)
+                    count += 1
+                self._db.execute(
+                    "insert or replace into documents (row, doc_index, url, text) values (?, ?, ?, ?)",
+                    (rows[-1], document["index"], document["url"], document["text"]),
+                )
+
+            self._write_rows(self._vectors_path, vectors, rows)
+            if scales is not None:
+                self._write_rows(self._scales_path, scales.astype(np.float32), rows)
+            self._db.commit()
+
+        last = documents[-1]
+        self._meta.update(
+            count=count,
+            create_time=last["createTime"],
+            index=last["index"],
+            dtype=self.dtype,
+        )
+        self._write_meta()
+        self._remap()
+
+    def _write_rows(self, file_path: str, values: np.ndarray, rows: List[int]) -> None:
+        row_bytes = values[0].nbytes
+        with open(file_path, "r+b" if os.path.exists(file_path) else "w+b") as f:
+            for row, value in zip(rows, values):
+                f.seek(row * row_bytes)
+                f.write(value.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _get_documents(self, rows: List[int], scores: List[float]) -> ContextSet:
+        with self._lock:
+            records = self._db.execute(
+                f"select row, url, text, doc_index from documents where row in ({','.join('?' * len(rows))})",
+                rows,
+            ).fetchall()
+
+        by_row = {record[0]: record[1:] for record in records}
+
+        return ContextSet(
+            ContextDocument(
+                url=by_row[row][0], text=by_row[row][1], index=by_row[row][2], score=score
+            )
+            for row, score in zip(rows, scores)
+            if row in by_row
+        )
+
+    def _read_meta(self) -> Dict[str, Any]:
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r") as f:
+                meta = json.load(f)
+            if meta["dtype"] != self.dtype:
+                raise ValueError(
+                    f"The index at {self.path} holds {meta['dtype']} vectors, not {self.dtype}."
+                )
+            return meta
+
+        return {
+            "count": 0,
+            "dimensions": None,
+            "create_time": 0,
+            "index": "",
+            "dtype": self.dtype,
+        }
+
+    def _write_meta(self) -> None:
+        temporary_path = self._meta_path + f".{os.getpid()}.tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(self._meta, f)
+        os.replace(temporary_path, self._meta_path)
+
+    def _reload_if_changed(self) -> None:
+        try:
+            mtime = os.stat(self._meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+
+        if mtime != self._meta_mtime:
+            self._meta = self._read_meta()
+            self._remap()
+
+    def _remap(self) -> None:
+        count = self._meta["count"]
+        dimensions = self._meta["dimensions"]
+        if os.path.exists(self._meta_path):
+            self._meta_mtime = os.stat(self._meta_path).st_mtime_ns
+
+        if count == 0:
+            self._vectors, self._scales = None, None
+            return
+
+        self._vectors = np.memmap(
+            self._vectors_path, dtype=self.dtype, mode="r", shape=(count, dimensions)
+        )
+        self._scales = (
+            np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(count,))
+            if self.dtype == "int8"
+            else None
+        )
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+async def init_shared_local_vector_index(
+    reader: AsyncGraphReader,
+) -> Optional[LocalVectorIndex]:
+    """
+    Open the process-wide local vector index if LOCAL_VECTOR_INDEX_PATH is set,
+    mirror any new Documents and keep refreshing it in the background.
+    The dtype and refresh interval may be tuned with environment variables.
+    """
+
+    global _shared_local_vector_index, _shared_refresh_task
+
+    path = os.environ.get("LOCAL_VECTOR_INDEX_PATH")
+    if path is None:
+        return None
+
+    if _shared_local_vector_index is None:
+        _shared_local_vector_index = LocalVectorIndex(
+            path=path, dtype=os.environ.get("LOCAL_VECTOR_INDEX_DTYPE", "float32")
+        )
+        REGISTRY.register_collector(
+            "local_vector_index", _shared_local_vector_index.get_stats
+        )
+        _shared_refresh_task = asyncio.create_task(
+            _refresh_periodically(
+                _shared_local_vector_index,
+                reader,
+                float(os.environ.get("LOCAL_VECTOR_INDEX_REFRESH_SECONDS", 300)),
+            )
+        )
+
+    return _shared_local_vector_index
+
+
+async def _refresh_periodically(
+    index: LocalVectorIndex, reader: AsyncGraphReader, interval_seconds: float
+) -> None:
+    while True:
+        try:
+            await index.refresh(reader)
+        except Exception as err:
+            print(f"failed to refresh the local vector index: {err}")
+        await asyncio.sleep(interval_seconds)
+
+
+def get_shared_local_vector_index() -> Optional[LocalVectorIndex]:
+    """
+    Retrieve the process-wide local vector index, if it is enabled.
+    """
+
+    return _shared_local_vector_index
+
+
+async def close_shared_local_vector_index() -> None:
+    """
+    Stop refreshing and close the process-wide local vector index.
+    """
+
+    global _shared_local_vector_index, _shared_refresh_task
+
+    if _shared_refresh_task is not None:
+        _shared_refresh_task.cancel()
+        try:
+            await _shared_refresh_task
+        except asyncio.CancelledError:
+            pass
+
+    if _shared_local_vector_index is not None:
+        _shared_local_vector_index.close()
+
+    _shared_local_vector_index = None
+    _shared_refresh_task = None
@@ -1,14 +1,21 @@
 import json
 import base64
-from typing import Optional, Union, Dict
+from typing import Optional, Union, Dict, Any
 from google.oauth2 import service_account
 from google.cloud import secretmanager
 
+from .secret_cache import CachedSecretManager
 
-class SecretManager:
-    def __init__(self, service_account_info: Optional[Union[str, Dict]] = None, project_id: Optional[str] = "sales-eng-agent-neo-project"):
-        self.project_id = project_id
-        if service_account_info:
+
+class SecretManager(CachedSecretManager):
+    """
+    Read secrets from GCP Secret Manager through an in-process cache.
+    The cache is shared with the backend. secret_cache.py is a copy of the backend's tools/secret_cache.py.
+    """
+
+    def __init__(self, service_account_info: Optional[Union[str, Dict]] = None, project_id: Optional[str] = "sales-eng-agent-neo-project",
+                 client: Optional[Any] = None, ttl_seconds: Optional[float] = None, background_refresh: bool = True):
+        if client is None and service_account_info:
             if isinstance(service_account_info, str):
                 # Decode the base64-encoded string
                 decoded_bytes = base64.b64decode(service_account_info)
@@ -16,15 +23,9 @@ class SecretManager:
                 service_account_info = json.loads(decoded_bytes.decode('utf-8'))
 
             credentials = service_account.Credentials.from_service_account_info(service_account_info)
-            self.client = secretmanager.SecretManagerServiceClient(credentials=credentials)
-        else:
-            self.client = secretmanager.SecretManagerServiceClient()
+            client = secretmanager.SecretManagerServiceClient(credentials=credentials)
+        elif client is None:
+            client = secretmanager.SecretManagerServiceClient()
 
-    def access_secret_version(self, secret_id: str, version_id: str = "latest"):
-        name = f"projects/{self.project_id}/secrets/{secret_id}/versions/{version_id}"
-        response = self.client.access_secret_version(request={"name": name})
-        secret_data = response.payload.data.decode("UTF-8")
-        try:
-            return json.loads(secret_data)
-        except json.JSONDecodeError:
-            return secret_data
+        super().__init__(project_id=project_id, client=client, ttl_seconds=ttl_seconds,
+                         background_refresh=background_refresh)
@@ -23,6 +23,19 @@ class Neo4jWriter:
         tx.run(cypher_query, parameters=params)
 
 
+    def bump_ingestion_epoch(self, source: str = 'documents') -> int:
+        """
+        Increment the ingestion epoch after a load so the backend clears its retrieval cache.
+        """
+        query = """
+                MERGE (e:IngestionEpoch {id: $source})
+                SET e.epoch = coalesce(e.epoch, 0) + 1,
+                    e.updateTime = datetime()
+                RETURN e.epoch AS epoch
+                """
+        with self.driver.session(database=self.database) as session:
+            return session.execute_write(lambda tx: tx.run(query, source=source).single()['epoch'])
+
     def build_indexes(self,index_list = List[str]):
         for index in index_list:
             tx_function = lambda tx: self.neo4j_tx_function(tx,[],index)
@@ -0,0 +1,55 @@
+import unittest
+from types import SimpleNamespace
+
+from ..fetcher import SecretManager
+
+
+class FakeSecretClient:
+
+    def __init__(self, secrets):
+        self.secrets = secrets
+        self.calls = 0
+        self.fail = False
+
+    def access_secret_version(self, request):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError('secret manager unavailable.')
+        secret_id = request['name'].split('/')[3]
+        return SimpleNamespace(payload=SimpleNamespace(data=self.secrets[secret_id].encode('UTF-8')))
+
+
+class TestSecretManagerCache(unittest.TestCase):
+
+    def test_cached_lookup(self):
+        client = FakeSecretClient({'NEO4J_USER': 'neo4j'})
+        sm = SecretManager(client=client, ttl_seconds=60)
+
+        self.assertEqual(sm.access_secret_version('NEO4J_USER'), 'neo4j')
+        self.assertEqual(sm.access_secret_version('NEO4J_USER'), 'neo4j')
+        self.assertEqual(client.calls, 1)
+        sm.close()
+
+    def test_prefetch(self):
+        client = FakeSecretClient({'NEO4J_USER': 'neo4j', 'NEO4J_URI': 'neo4j://localhost'})
+        sm = SecretManager(client=client, ttl_seconds=60)
+
+        secrets = sm.prefetch(['NEO4J_USER', 'NEO4J_URI', 'MISSING'])
+        self.assertEqual(set(secrets), {'NEO4J_USER', 'NEO4J_URI'})
+
+        sm.access_secret_version('NEO4J_URI')
+        self.assertEqual(client.calls, 3)
+        sm.close()
+
+    def test_stale_value_served_when_refresh_fails(self):
+        client = FakeSecretClient({'NEO4J_USER': 'neo4j'})
+        sm = SecretManager(client=client, ttl_seconds=0, background_refresh=False)
+
+        sm.access_secret_version('NEO4J_USER')
+        client.fail = True
+        self.assertEqual(sm.access_secret_version('NEO4J_USER'), 'neo4j')
+        sm.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
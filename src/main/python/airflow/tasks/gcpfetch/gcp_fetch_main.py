@@ -11,7 +11,10 @@ if __name__ == '__main__':
 
     gcp_client = storage.Client()
 
-    fetcher = GCPFetcher()
+    fetcher = GCPFetcher(secret_client=secret_manager)
+
+    secret_manager.prefetch(['GCP_SITEMAPS_BUCKET', 'GCP_PRACTITIONERS_GUIDE_SITES_BUCKET',
+                             'GCP_OTHER_ARTICLES_BUCKET', 'GCP_PROCESSED_DOCS'])
 
     sitemaps_bucket = secret_manager.access_secret_version('GCP_SITEMAPS_BUCKET')
     practitioners_bucket = secret_manager.access_secret_version('GCP_PRACTITIONERS_GUIDE_SITES_BUCKET')
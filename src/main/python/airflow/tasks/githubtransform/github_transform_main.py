@@ -9,6 +9,8 @@ if __name__ == '__main__':
     secret_manager = SecretManager()
     storage_client = storage.Client()
 
+    secret_manager.prefetch(['GIT_REPOSITORIES_BUCKET_NAME', 'NEO4J_URI', 'NEO4J_USER', 'NEO4J_PASSWORD'])
+
     git_code_bucket = secret_manager.access_secret_version('GIT_REPOSITORIES_BUCKET_NAME')
     neo4j_uri = secret_manager.access_secret_version('NEO4J_URI')
     neo4j_user = secret_manager.access_secret_version('NEO4J_USER')
@@ -25,6 +27,8 @@ if __name__ == '__main__':
         cypher_query = "CREATE (d:Document:Code {code: $code, embedding: $embedding})"
         neo4j_writer.batch_write(cypher_query, params)
 
+    neo4j_writer.bump_ingestion_epoch()
+
 
 
 
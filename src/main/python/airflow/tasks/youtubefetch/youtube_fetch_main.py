@@ -48,6 +48,7 @@ if __name__ == '__main__':
             """
 
     writer.batch_write(cypher_query=query, params=new_nodes, batch_size=1000)
+    writer.bump_ingestion_epoch()
 
     print("YouTube transcript chunks uploaded to graph successfully.")
 